@@ -24,7 +24,6 @@ csrf = CSRFProtect()
 # -----------------------
 # Access Control Helpers
 # -----------------------
-from .models import User, Shop, SubCounty, Ward, County
 def role_required(*roles):
     def wrapper(view_func):
         @wraps(view_func)
@@ -41,6 +40,7 @@ def shop_access_required(view_func):
     @wraps(view_func)
     def wrapped(*args, **kwargs):
         from flask import current_app
+        from .utils.tenant_context import resolve_shop
 
         if not current_user.is_authenticated:
             return login_manager.unauthorized()
@@ -49,7 +49,9 @@ def shop_access_required(view_func):
         if not shop_id:
             abort(400, "Missing shop_id in route")
 
-        shop = Shop.query.get_or_404(shop_id)
+        shop = resolve_shop(shop_id)
+        if shop is None:
+            abort(404)
 
         if current_user.is_tenant():
             if shop.business_id != current_user.business_id:
@@ -111,7 +113,6 @@ def create_app(config_class=Config):
     # -----------------------
     app.config['SESSION_COOKIE_SECURE'] = True
     app.config['TIME_ZONE'] = 'Africa/Nairobi'
-    app.config['POPULATE_LOCATIONS'] = app.debug  # Auto-populate in dev
 
     # -----------------------
     # Logging Setup
@@ -135,74 +136,14 @@ def create_app(config_class=Config):
 
     login_manager.login_view = 'auth.login'
 
+    from .utils.tenant_context import load_identity, get_tenant_context, resolve_shop
+
     # -----------------------
     # Load User
     # -----------------------
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
-
-    # -----------------------
-    # Address Management Setup
-    # -----------------------
-    def populate_location_data():
-        """Initialize county location data (Mombasa complete, Kilifi partial)"""
-        from pathlib import Path
-        import json
-        
-        data_path = Path(app.root_path) / 'data' / 'county_locations.json'
-        
-        try:
-            with open(data_path) as f:
-                data = json.load(f)
-                
-            with db.session.begin_nested():
-                # Process each county
-                for county_data in data["counties"]:
-                    # Create or get county
-                    county = County.query.filter_by(name=county_data["name"]).first()
-                    if not county:
-                        county = County(name=county_data["name"], code=county_data["code"])
-                        db.session.add(county)
-                        db.session.flush()
-                    
-                    # Process subcounties
-                    for sc_data in county_data["subcounties"]:
-                        subcounty = SubCounty.query.filter_by(
-                            name=sc_data["name"], 
-                            county_id=county.id
-                        ).first()
-                        
-                        if not subcounty:
-                            subcounty = SubCounty(
-                                name=sc_data["name"],
-                                code=sc_data["code"],
-                                county_id=county.id
-                            )
-                            db.session.add(subcounty)
-                            db.session.flush()
-                        
-                        # Process wards
-                        for ward_name in sc_data["wards"]:
-                            if not Ward.query.filter_by(
-                                name=ward_name, 
-                                subcounty_id=subcounty.id
-                            ).first():
-                                db.session.add(Ward(
-                                    name=ward_name,
-                                    subcounty_id=subcounty.id
-                                ))
-            
-            db.session.commit()
-            app.logger.info("Location data populated successfully")
-            app.logger.info(f"Mombasa: 6 subcounties, 30 wards")
-            app.logger.info(f"Kilifi: 1 subcounty (Mtwapa), 3 wards")
-            return True
-            
-        except Exception as e:
-            db.session.rollback()
-            app.logger.error(f"Failed to populate location data: {str(e)}", exc_info=True)
-            return False
+        return load_identity(int(user_id))
 
     # -----------------------
     # Request Handlers
@@ -212,9 +153,10 @@ def create_app(config_class=Config):
         g.business = None
         g.shop = None
 
-        if current_user.is_authenticated:
-            g.business = current_user.business
-            g.shop = current_user.shop
+        context = get_tenant_context()
+        if context:
+            g.business = context.business
+            g.shop = context.shop
 
             # Store shop_id from URL if present
             if 'shops' in request.path:
@@ -226,9 +168,10 @@ def create_app(config_class=Config):
 
     @app.before_request
     def enforce_address_completion():
-        if current_user.is_authenticated:
+        context = get_tenant_context()
+        if context:
             # Only enforce for users who actually need an address
-            if current_user.needs_address() and not current_user.has_address:
+            if context.address_missing:
 
                 # Exempt specific endpoints (e.g., setting address, auth routes, static)
                 exempt_routes = {
@@ -266,16 +209,14 @@ def create_app(config_class=Config):
         business = None
 
         try:
-            if current_user.is_authenticated:
+            context = get_tenant_context()
+            if context:
                 if current_user.is_tenant():
-                    shops = Shop.query.filter_by(
-                        business_id=current_user.business_id,
-                        is_deleted=False
-                    ).all()
-                    business = current_user.business
-                elif current_user.is_admin() and current_user.shop:
-                    shops = [current_user.shop]
-                    business = current_user.shop.business
+                    shops = context.shops
+                    business = context.business
+                elif current_user.is_admin() and context.shop:
+                    shops = [context.shop]
+                    business = context.shop.business
         except SQLAlchemyError as e:
             db.session.rollback()  # ✅ this is crucial
             shops = []
@@ -297,7 +238,7 @@ def create_app(config_class=Config):
         try:
             shop_id = session.get("shop_id")
             if shop_id:
-                current_shop = db.session.get(Shop, shop_id)
+                current_shop = resolve_shop(shop_id)
                 if current_shop and current_shop.is_deleted:
                     current_shop = None  # Don't expose deleted shops
         except SQLAlchemyError as e:
@@ -344,34 +285,46 @@ def create_app(config_class=Config):
 
 
 
-    # Jinja filter to get product image URL
-    def product_image_url(image_path):
+    # Jinja filter to get product image URL: a rendition ('tile', 'thumb',
+    # 'detail') in 'jpg' or 'webp' for pipeline images, else the stored URL
+    def product_image_url(image_path, rendition='tile', ext='jpg'):
+        from .utils.product_images import rendition_url
         if image_path:
+            if image_path.startswith(('http://', 'https://')):
+                return image_path
             filename = image_path.split('/')[-1]
-            return url_for('serve_product_image', filename=filename)
+            return rendition_url(url_for('serve_product_image', filename=filename), rendition, ext)
         else:
             return url_for('static', filename='products/placeholder.jpg')
 
-    # Register the filter globally
+    # WebP rendition of a pipeline image for a <picture> <source>, else None
+    # (the <img> then falls back to product_image_url)
+    def product_image_webp(image_path, rendition='tile'):
+        from .utils.product_images import webp_url
+        if image_path and not image_path.startswith(('http://', 'https://')):
+            filename = image_path.split('/')[-1]
+            return webp_url(url_for('serve_product_image', filename=filename), rendition)
+        return None
+
+    # Register the filters globally
     app.jinja_env.filters['product_image_url'] = product_image_url
+    app.jinja_env.filters['product_image_webp'] = product_image_webp
 
-    # Route to serve uploaded product images
+    # Route to serve uploaded product images. Rendition names are content
+    # hashes, so they are cached for a year without revalidation.
     @app.route('/products/image/<filename>')
     def serve_product_image(filename):
-        return send_from_directory('static/products', filename)
+        from .utils.product_images import image_directory, is_rendition
+        if is_rendition(filename):
+            response = send_from_directory(
+                image_directory(), filename,
+                max_age=app.config.get('PRODUCT_IMAGE_MAX_AGE', 31536000), etag=filename)
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+            return response
+        return send_from_directory(image_directory(), filename)
             
 
-        # -----------------------
-    # Initial Data Population
-    # -----------------------
-    with app.app_context():
-        try:
-            if app.config['POPULATE_LOCATIONS'] and not SubCounty.query.first():
-                if not populate_location_data():
-                    app.logger.warning("Failed to populate initial location data")
-        except Exception as e:
-            app.logger.error(f"Initialization error: {e}")
-
     # -----------------------
     # Register Blueprints
     # -----------------------
@@ -403,4 +356,16 @@ def create_app(config_class=Config):
     for bp, url_prefix in blueprints:
         app.register_blueprint(bp, url_prefix=url_prefix)
 
+    # -----------------------
+    # CLI Commands
+    # -----------------------
+    from .commands import register_commands
+    register_commands(app)
+
+    # Exporter dependencies load on first use; when the app is preloaded
+    # before forking, warm them once so workers share them copy-on-write
+    if app.config.get('PRELOAD_HEAVY_MODULES'):
+        from .reports.documents import preload
+        preload()
+
     return app
\ No newline at end of file
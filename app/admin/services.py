@@ -0,0 +1,280 @@
+"""
+Shop admin dashboard data provider.
+
+Each family of dashboard figures (sales totals, inventory, users) is computed
+with one conditional-aggregate query instead of one query per figure. The
+result is converted to plain data and cached per shop; committed writes to
+the shop's sales, products, categories, stock logs or users drop the entry.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, case, select, and_
+from sqlalchemy.orm import Session, joinedload
+
+from app import db, cache
+from app.models import Sale, Product, Category, StockLog, CartItem, User, Role
+from app.utils.time import shop_today
+from app.utils.low_stock import low_stock_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+CRITICAL_STOCK_LEVEL = 5
+
+# Models whose writes change the admin dashboard of their shop
+INVALIDATING_MODELS = (Sale, Product, Category, StockLog, User)
+
+
+def _cache_key(shop_id):
+    return f"shop:{shop_id}:admin_dashboard"
+
+
+def _sum_if(condition, value):
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+class AdminDashboardProvider:
+
+    @staticmethod
+    def get(shop_id):
+        """
+        Return (dashboard_data, monthly_revenue) for a shop, from cache when
+        the cached entry was built for the shop's current business day.
+        """
+        today = shop_today(shop_id)
+        try:
+            cached = cache.get(_cache_key(shop_id))
+        except Exception as e:
+            logger.error(f"Admin dashboard cache unavailable for shop {shop_id}: {e}")
+            cached = None
+        if cached and cached['day'] == today:
+            return cached['data'], cached['data']['sales_data']['month']
+
+        data = AdminDashboardProvider.build(shop_id, today)
+        try:
+            cache.set(_cache_key(shop_id), {'day': today, 'data': data},
+                      timeout=current_app.config.get('ADMIN_DASHBOARD_TTL', DEFAULT_TTL))
+        except Exception as e:
+            logger.error(f"Failed to cache admin dashboard for shop {shop_id}: {e}")
+        return data, data['sales_data']['month']
+
+    @staticmethod
+    def invalidate(shop_id):
+        try:
+            cache.delete(_cache_key(shop_id))
+        except Exception as e:
+            logger.error(f"Failed to invalidate admin dashboard for shop {shop_id}: {e}")
+
+    @staticmethod
+    def build(shop_id, today):
+        sales_data = AdminDashboardProvider.sales_summary(shop_id, today)
+        labels, values = AdminDashboardProvider.sales_chart(shop_id, today)
+        sales_data['chart_labels'] = labels
+        sales_data['chart_values'] = values
+
+        return {
+            'sales_data': sales_data,
+            'inventory_data': AdminDashboardProvider.inventory_summary(shop_id),
+            'system_data': {'users': AdminDashboardProvider.user_summary(shop_id)},
+            'transactions': AdminDashboardProvider.transactions(shop_id, today),
+            'products': AdminDashboardProvider.products(shop_id, today),
+            'chart_labels': labels,
+            'chart_values': values,
+        }
+
+    @staticmethod
+    def sales_summary(shop_id, today):
+        """Today, yesterday, week, month and all-time revenue plus count in one scan"""
+        yesterday = today - timedelta(days=1)
+        week_ago = today - timedelta(days=7)
+        month_ago = today - timedelta(days=30)
+
+        row = db.session.query(
+            _sum_if(Sale.business_date == today, Sale.total).label('today'),
+            _sum_if(Sale.business_date == yesterday, Sale.total).label('yesterday'),
+            _sum_if(Sale.business_date >= week_ago, Sale.total).label('week'),
+            _sum_if(Sale.business_date >= month_ago, Sale.total).label('month'),
+            func.coalesce(func.sum(Sale.total), 0).label('total_revenue'),
+            func.count(Sale.id).label('transactions'),
+        ).filter(Sale.shop_id == shop_id).first()
+
+        summary = {
+            'today': float(row.today),
+            'yesterday': float(row.yesterday),
+            'week': float(row.week),
+            'month': float(row.month),
+            'total_revenue': float(row.total_revenue),
+            'transactions': row.transactions,
+            'change': 0,
+        }
+        if summary['yesterday'] > 0:
+            summary['change'] = (summary['today'] - summary['yesterday']) / summary['yesterday'] * 100
+        return summary
+
+    @staticmethod
+    def sales_chart(shop_id, today, days=30):
+        """Daily totals for the last `days` days, zero-filled"""
+        start = today - timedelta(days=days - 1)
+        rows = db.session.query(
+            Sale.business_date,
+            func.sum(Sale.total)
+        ).filter(
+            Sale.shop_id == shop_id,
+            Sale.business_date >= start
+        ).group_by(Sale.business_date).all()
+
+        totals = {day: float(total or 0) for day, total in rows}
+        labels, values = [], []
+        for n in range(days):
+            day = start + timedelta(days=n)
+            labels.append(day.strftime('%b %d'))
+            values.append(totals.get(day, 0))
+        return labels, values
+
+    @staticmethod
+    def inventory_summary(shop_id):
+        """Product counts/value, category and stock-log counts in one statement"""
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        category_count = select(func.count(Category.id)).where(
+            Category.shop_id == shop_id).scalar_subquery()
+        recent_logs = select(func.count(StockLog.id)).where(
+            StockLog.shop_id == shop_id, StockLog.date >= week_ago).scalar_subquery()
+
+        row = db.session.query(
+            _count_if(Product.is_low_stock).label('low_stock'),
+            _count_if(and_(Product.is_low_stock, Product.stock <= CRITICAL_STOCK_LEVEL)).label('critical'),
+            func.coalesce(func.sum(Product.stock * Product.valuation_cost), 0).label('total_value'),
+            func.count(Product.id).label('product_count'),
+            category_count.label('category_count'),
+            recent_logs.label('recent_logs'),
+        ).filter(Product.shop_id == shop_id).first()
+
+        low_stock_products = [
+            {
+                'id': p.id,
+                'name': p.name,
+                'stock': p.stock,
+                'image_url': p.image_url,
+                'category': {'name': p.category.name} if p.category else None,
+            }
+            for p in low_stock_query(shop_id).options(joinedload(Product.category)).limit(5)
+        ]
+
+        return {
+            'low_stock': {
+                'count': row.low_stock,
+                'critical': row.critical,
+                'products': low_stock_products,
+            },
+            'total_value': float(row.total_value),
+            'category_count': row.category_count or 0,
+            'product_count': row.product_count,
+            'recent_logs': row.recent_logs or 0,
+        }
+
+    @staticmethod
+    def user_summary(shop_id):
+        row = db.session.query(
+            func.count(User.id).label('total'),
+            _count_if(User.is_active == True).label('active'),
+            _count_if(User.role == Role.ADMIN).label('admins'),
+        ).filter(User.shop_id == shop_id).first()
+        return {'total': row.total, 'active': row.active, 'admins': row.admins}
+
+    @staticmethod
+    def transactions(shop_id, today):
+        month_ago = today - timedelta(days=30)
+        recent = [
+            {
+                'id': sale.id,
+                'date': sale.date,
+                'total': sale.total,
+                'payment_method': sale.payment_method,
+            }
+            for sale in Sale.query.filter_by(shop_id=shop_id).order_by(Sale.date.desc()).limit(5)
+        ]
+        payment_methods = [
+            (method, count, float(total or 0))
+            for method, count, total in db.session.query(
+                Sale.payment_method,
+                func.count(Sale.id),
+                func.sum(Sale.total)
+            ).filter(
+                Sale.shop_id == shop_id,
+                Sale.business_date >= month_ago
+            ).group_by(Sale.payment_method)
+        ]
+        return {'recent': recent, 'payment_methods': payment_methods}
+
+    @staticmethod
+    def products(shop_id, today):
+        month_ago = today - timedelta(days=30)
+        top_rows = db.session.query(
+            Product.id,
+            Product.name,
+            Product.image_url,
+            Category.name.label('category_name'),
+            func.sum(CartItem.quantity).label('total_quantity'),
+            func.sum(CartItem.total_price).label('total_sales')
+        ).join(
+            CartItem, Product.id == CartItem.product_id
+        ).join(
+            Sale, Sale.id == CartItem.sale_id
+        ).outerjoin(
+            Category, Category.id == Product.category_id
+        ).filter(
+            Sale.shop_id == shop_id,
+            Product.shop_id == shop_id,
+            Sale.business_date >= month_ago
+        ).group_by(
+            Product.id, Product.name, Product.image_url, Category.name
+        ).order_by(
+            func.sum(CartItem.quantity).desc()
+        ).limit(5).all()
+
+        # (product, quantity, revenue) rows, the shape the fragment iterates over
+        top_selling = [
+            (
+                {
+                    'id': row.id,
+                    'name': row.name,
+                    'image_url': row.image_url,
+                    'category': {'name': row.category_name} if row.category_name else None,
+                },
+                row.total_quantity or 0,
+                float(row.total_sales or 0),
+            )
+            for row in top_rows
+        ]
+
+        recently_added = [
+            {'id': p.id, 'name': p.name, 'image_url': p.image_url, 'stock': p.stock}
+            for p in Product.query.filter_by(shop_id=shop_id).order_by(
+                Product.created_at.desc()).limit(3)
+        ]
+        return {'top_selling': top_selling, 'recently_added': recently_added}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_shops(session, flush_context):
+    touched = session.info.setdefault('admin_dashboard_touched_shops', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, INVALIDATING_MODELS) and getattr(obj, 'shop_id', None) is not None:
+            touched.add(obj.shop_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_touched_shops(session):
+    for shop_id in session.info.pop('admin_dashboard_touched_shops', None) or ():
+        AdminDashboardProvider.invalidate(shop_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_touched_shops(session):
+    session.info.pop('admin_dashboard_touched_shops', None)
@@ -1,11 +1,12 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app, g, Response, abort
 from flask_login import login_user, logout_user, current_user, login_required
 from sqlalchemy import func
-from app.models import User,  Role, Sale, Product, Category, StockLog, CartItem, Shop, Business, SubCounty, County, Ward, UserAddress
+from app.models import User,  Role, Sale, Product, Category, StockLog, CartItem, Shop, Business, UserAddress
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import date, timedelta, datetime
 from sqlalchemy.exc import SQLAlchemyError
 from app.utils.render import render_htmx
+from app.utils.locations import get_location_directory
 from .forms import RegistrationForm, AddressForm
 from urllib.parse import urlparse, urljoin
 import logging
@@ -337,7 +338,8 @@ def set_address():
     form = AddressForm()
 
     # Always populate county choices
-    form.county.choices = [('', 'Select County')] + [(c.id, c.name) for c in County.query.order_by('name').all()]
+    locations = get_location_directory()
+    form.county.choices = [('', 'Select County')] + [(c.id, c.name) for c in locations.counties]
 
     # Get selected values early from request/form
     selected_county = request.form.get('county') or form.county.data
@@ -346,7 +348,7 @@ def set_address():
     # Populate subcounty choices dynamically before validation
     if selected_county:
         form.subcounty.choices = [('', 'Select Subcounty')] + [
-            (s.id, s.name) for s in SubCounty.query.filter_by(county_id=selected_county).order_by('name').all()
+            (s.id, s.name) for s in locations.subcounties(selected_county)
         ]
     else:
         form.subcounty.choices = [('', 'Select Subcounty')]
@@ -354,7 +356,7 @@ def set_address():
     # Populate ward choices dynamically before validation
     if selected_subcounty:
         form.ward.choices = [('', 'Select Ward')] + [
-            (w.id, w.name) for w in Ward.query.filter_by(subcounty_id=selected_subcounty).order_by('name').all()
+            (w.id, w.name) for w in locations.wards(selected_subcounty)
         ]
     else:
         form.ward.choices = [('', 'Select Ward')]
@@ -401,7 +403,8 @@ def set_address():
 def manage_addresses():
     """Manage all user addresses with dynamic location loading"""
     form = AddressForm()
-    form.county.choices = [('', 'Select County')] + [(c.id, c.name) for c in County.query.order_by('name').all()]
+    locations = get_location_directory()
+    form.county.choices = [('', 'Select County')] + [(c.id, c.name) for c in locations.counties]
     
     if form.validate_on_submit():
         try:
@@ -442,15 +445,15 @@ def manage_addresses():
 @auth_bp.route('/api/counties')
 def get_counties():
     """Get all counties (JSON)"""
-    counties = County.query.order_by('name').all()
-    return jsonify([c.serialize() for c in counties])
+    counties = get_location_directory().counties
+    return jsonify([c._asdict() for c in counties])
 
 @auth_bp.route('/api/subcounties/<int:county_id>')
 @login_required
 def get_subcounties(county_id):
     """Get subcounties for a county (JSON)"""
     try:
-        subcounties = SubCounty.query.filter_by(county_id=county_id).order_by('name').all()
+        subcounties = get_location_directory().subcounties(county_id)
         return jsonify([{
             'id': sc.id,
             'name': sc.name,
@@ -465,7 +468,7 @@ def get_subcounties(county_id):
 def get_wards(subcounty_id):
     """Get wards for a subcounty (JSON)"""
     try:
-        wards = Ward.query.filter_by(subcounty_id=subcounty_id).order_by('name').all()
+        wards = get_location_directory().wards(subcounty_id)
         return jsonify([{
             'id': w.id,
             'name': w.name,
@@ -1,13 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app, abort, g, make_response
 from flask_login import login_user, logout_user, current_user, login_required
 from sqlalchemy import func, case
-from app.models import User, Business, Role, Shop, BusinessStatus, Sale, Product, RegisterSession, CartItem, StockLog
+from app.models import User, Business, Role, Shop, BusinessStatus, Sale, Product, RegisterSession, CartItem, StockLog, ShopDailySales
 from app.bhapos.forms import CreateBusinessForm, CreateTenantForm, CreateShopForm, CreateUserForm
+from app.bhapos.services import PlatformMetricsService
+from app.inventory.services import ReorderPlanService
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import date, timedelta, datetime
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from app import db, csrf
+from app.utils.dashboard import DashboardExecutor
+from app.utils.dashboard_cache import get_fragment, set_fragment
+from app.utils.time import business_today
 import logging
 import re
 
@@ -31,49 +36,42 @@ def superadmin_dashboard():
         flash('Access denied: Superadmin only.', 'danger')
         return redirect(url_for('home.index'))
 
-    # Get counts using single query for performance
-    stats = db.session.query(
-        db.func.count(Business.id).label('total_businesses'),
-        db.func.count(db.distinct(User.id)).filter(User.role == Role.TENANT).label('total_tenants'),
-        db.func.count(Business.id).filter(
-            Business.is_approved == False,
-            Business.is_deleted == False
-        ).label('pending_businesses'),
-        db.func.count(Business.id).filter(
-            Business.status == BusinessStatus.ACTIVE
-        ).label('active_businesses')
-    ).first()
-
-    # Get recent businesses with optimized loading
-    recent_businesses = db.session.query(Business).outerjoin(
-        User, db.and_(
-            User.business_id == Business.id,
-            User.role == Role.TENANT
-        )
-    ).options(
-        db.contains_eager(Business.users, alias=User)
-    ).order_by(
-        Business.created_at.desc()
-    ).limit(5).all()
-
-    # Get business status distribution
-    status_counts = dict(db.session.query(
-        Business.status,
-        db.func.count(Business.id)
-    ).group_by(Business.status).all())
+    # Periodically captured snapshot: one fetch instead of table-wide aggregates
+    snapshot = PlatformMetricsService.get_or_schedule()
+    metrics = snapshot.payload
+    totals = metrics['totals']
 
     return render_template('bhapos/superadmin_dashboard.html',
-        total_businesses=stats.total_businesses,
-        total_tenants=stats.total_tenants,
-        pending_businesses=stats.pending_businesses,
-        active_businesses=stats.active_businesses,
-        recent_businesses=recent_businesses,
-        status_counts=status_counts,
+        total_businesses=totals['businesses'],
+        total_tenants=totals['tenants'],
+        pending_businesses=totals['pending_businesses'],
+        active_businesses=totals['active_businesses'],
+        recent_businesses=metrics['recent_businesses'],
+        status_counts=metrics['businesses_by_status'],
+        metrics=metrics,
+        snapshot_time=snapshot.captured_at,
         BusinessStatus=BusinessStatus,
         now=datetime.utcnow()  
     )
 
 
+@bhapos_bp.route('/superadmin/metrics/refresh', methods=['POST'])
+@login_required
+def refresh_platform_metrics():
+    """Manually capture a fresh platform metrics snapshot"""
+    if not current_user.is_superadmin():
+        abort(403)
+
+    try:
+        PlatformMetricsService.refresh()
+        flash('Platform metrics refreshed.', 'success')
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Platform metrics refresh failed: {e}")
+        flash('Could not refresh platform metrics.', 'danger')
+    return redirect(url_for('bhapos.superadmin_dashboard'))
+
+
 
 @bhapos_bp.route('/users')
 @login_required
@@ -377,16 +375,13 @@ def list_businesses():
     ).paginate(page=page, per_page=per_page, error_out=False)
 
 
-    # Get status counts for filter sidebar
-    status_counts = db.session.query(
-        Business.status,
-        db.func.count(Business.id)
-    ).filter_by(is_deleted=False).group_by(Business.status).all()
+    # Status counts for filter sidebar come from the platform snapshot
+    status_counts = PlatformMetricsService.get_or_schedule().payload['businesses_by_status']
 
     return render_template(
         'bhapos/business_list.html',
         businesses=businesses,
-        status_counts=dict(status_counts),
+        status_counts=status_counts,
         current_filters={
             'status': status,
             'search': search_term,
@@ -401,8 +396,9 @@ def list_businesses():
 @login_required
 def tenant_dashboard():
     """
-    Comprehensive Tenant Dashboard with business performance analytics.
-    Provides key metrics, trends, and insights across all business shops.
+    Tenant Dashboard shell with business performance analytics.
+    Only the business header is rendered here; every section is loaded
+    separately (HTMX) from tenant_dashboard_section and cached on its own.
     """
     # Authorization and business validation
     if not validate_tenant_access(current_user):
@@ -413,31 +409,50 @@ def tenant_dashboard():
         flash('No business associated with your account.', 'warning')
         return redirect(url_for('bhapos.list_businesses'))
 
-    # Get all active shop IDs for the business
-    shop_ids = get_business_shop_ids(business.id)
-    
-    # Time periods for analytics
-    time_periods = get_analytics_time_periods()
-    
-    # Dashboard data sections
-    dashboard_data = {
-        'business_overview': get_business_overview(business, shop_ids),
-        'sales_performance': get_sales_performance(business.id, shop_ids, time_periods),
-        'shop_comparison': get_shop_comparison(business.id, shop_ids),
-        'inventory_insights': get_inventory_insights(business.id),
-        'staff_performance': get_staff_performance(business.id, shop_ids),
-        'recent_activity': get_recent_activity(business.id, shop_ids),
-        'time_periods': time_periods,
-    }
-
     return render_template(
         'bhapos/tenants/tenant_dashboard.html',
-        business=business.serialize(include_related=True),
-        **dashboard_data,
+        business=business,
         current_time=datetime.utcnow()
+    )
 
-        
+
+@bhapos_bp.route('/tenant/dashboard/<section>')
+@login_required
+def tenant_dashboard_section(section):
+    """Render one dashboard section, served from cache when it is still fresh"""
+    if section not in DASHBOARD_SECTIONS:
+        abort(404)
+    if current_user.role != Role.TENANT or not current_user.business_id:
+        abort(403)
+
+    business_id = current_user.business_id
+    html = get_fragment(business_id, section)
+    if html is not None:
+        return html
+
+    register, compose, template = DASHBOARD_SECTIONS[section]
+    shop_ids = get_business_shop_ids(business_id)
+
+    # Independent queries run concurrently; slow or failing ones degrade to placeholders
+    executor = DashboardExecutor()
+    register(executor, business_id, shop_ids, get_analytics_time_periods(business_id))
+    results = executor.run()
+
+    html = render_template(
+        template,
+        business_id=business_id,
+        degraded_sections=executor.degraded,
+        **compose(results, shop_ids)
     )
+    # Degraded renders are not cached so the next request retries the slow query
+    if not executor.degraded:
+        set_fragment(business_id, section, html)
+
+    response = make_response(html)
+    response.headers['Server-Timing'] = executor.server_timing()
+    return response
+
+
 def get_shop_transaction_counts(business_id, shop_ids, days=30):
     """
     Return a dictionary of shop_id -> transaction count for a given business over N days.
@@ -445,23 +460,20 @@ def get_shop_transaction_counts(business_id, shop_ids, days=30):
     if not shop_ids:
         return {}
     
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_date = business_today(business_id) - timedelta(days=days)
     
     try:
         results = db.session.query(
-            Shop.id,
-            func.count(Sale.id).label('transaction_count')
-        ).join(
-            Sale, Sale.shop_id == Shop.id
+            ShopDailySales.shop_id,
+            func.sum(ShopDailySales.transaction_count).label('transaction_count')
         ).filter(
-            Shop.id.in_(shop_ids),
-            Shop.is_deleted == False,
-            Sale.created_at >= start_date,
-            Sale.is_deleted == False
+            ShopDailySales.business_id == business_id,
+            ShopDailySales.shop_id.in_(shop_ids),
+            ShopDailySales.business_date >= start_date
         ).group_by(
-            Shop.id
+            ShopDailySales.shop_id
         ).order_by(
-            func.count(Sale.id).desc()
+            func.sum(ShopDailySales.transaction_count).desc()
         ).all()
         
         return {
@@ -486,20 +498,22 @@ def validate_tenant_access(user):
     return True
 
 def get_business_shop_ids(business_id):
-    """Get all active shop IDs for a business"""
-    return [shop.id for shop in Shop.query.filter_by(
-        business_id=business_id,
-        is_deleted=False
-    ).with_entities(Shop.id).all()]
-
-def get_analytics_time_periods():
-    """Define standard time periods for analytics"""
-    now = datetime.utcnow()
-    today = now.date()
-    thirty_days_ago = now - timedelta(days=30)
-    current_month_start = now.replace(day=1, hour=0, minute=0, second=0)
-    last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
+    """Get all active shop IDs for a business (memoised for the current request)"""
+    resolved = g.setdefault('business_shop_ids', {})
+    if business_id not in resolved:
+        resolved[business_id] = [shop.id for shop in Shop.query.filter_by(
+            business_id=business_id,
+            is_deleted=False
+        ).with_entities(Shop.id).all()]
+    return resolved[business_id]
+
+def get_analytics_time_periods(business_id):
+    """Define standard time periods (inclusive business dates) for analytics"""
+    today = business_today(business_id)
+    thirty_days_ago = today - timedelta(days=30)
+    current_month_start = today.replace(day=1)
     last_month_end = current_month_start - timedelta(days=1)
+    last_month_start = last_month_end.replace(day=1)
     
     return {
         'today': today,
@@ -514,70 +528,159 @@ def get_analytics_time_periods():
 # DATA RETRIEVAL FUNCTIONS
 # ======================
 
-def get_business_overview(business, shop_ids):
+EMPTY_INVENTORY_STATUS = {
+    'total_products': 0,
+    'low_stock': 0,
+    'out_of_stock': 0,
+    'total_inventory': 0,
+    'inventory_value': 0
+}
+
+EMPTY_ATTENDANCE = {
+    'total_staff': 0,
+    'active_today': 0,
+    'on_leave': 0
+}
+
+
+def register_overview_sections(executor, business_id, shop_ids, time_periods):
+    """Headline cards: 30-day sales vs last month, inventory value and counts"""
+    empty = empty_sales_metrics()
+    executor.add('active_users', get_active_user_count, business_id, placeholder=0)
+    executor.add('total_products', get_product_count, business_id, shop_ids, placeholder=0)
+    executor.add('active_sessions', get_active_register_sessions_count, shop_ids, placeholder=0)
+    executor.add('sales_last_30_days', get_sales_metrics, business_id, shop_ids,
+                 time_periods['thirty_days_ago'], placeholder=empty)
+    executor.add('sales_last_month', get_sales_metrics, business_id, shop_ids,
+                 time_periods['last_month_start'], time_periods['last_month_end'], placeholder=empty)
+    executor.add('stock_status', get_inventory_status, business_id, shop_ids,
+                 placeholder=dict(EMPTY_INVENTORY_STATUS))
+
+
+def register_sales_sections(executor, business_id, shop_ids, time_periods):
+    empty = empty_sales_metrics()
+    executor.add('sales_today', get_sales_metrics, business_id, shop_ids,
+                 time_periods['today'], placeholder=empty)
+    executor.add('sales_current_month', get_sales_metrics, business_id, shop_ids,
+                 time_periods['current_month_start'], placeholder=empty)
+    executor.add('sales_trends', get_sales_trends, business_id, shop_ids, placeholder=[])
+    executor.add('payment_methods', get_payment_method_distribution, business_id, shop_ids,
+                 time_periods['thirty_days_ago'], placeholder=[])
+    executor.add('hourly_patterns', get_hourly_sales_patterns, business_id, shop_ids,
+                 time_periods['thirty_days_ago'], placeholder=[])
+
+
+def register_shop_sections(executor, business_id, shop_ids, time_periods):
+    executor.add('top_shops', get_top_performing_shops, business_id, shop_ids, placeholder=[])
+    executor.add('sales_by_shop', get_sales_by_shop, business_id, shop_ids, placeholder=[])
+    executor.add('profit_margins', get_shop_profit_margins, business_id, shop_ids, placeholder=[])
+    executor.add('shop_transactions', get_shop_transaction_counts, business_id, shop_ids, placeholder={})
+
+
+def register_inventory_sections(executor, business_id, shop_ids, time_periods):
+    executor.add('stock_status', get_inventory_status, business_id, shop_ids,
+                 placeholder=dict(EMPTY_INVENTORY_STATUS))
+    executor.add('fast_moving', get_fast_moving_products, business_id, shop_ids,
+                 time_periods['thirty_days_ago'], placeholder=[])
+    executor.add('slow_moving', get_slow_moving_products, business_id, shop_ids,
+                 time_periods['thirty_days_ago'], placeholder=[])
+    executor.add('reorder_needs', get_products_needing_reorder, business_id, shop_ids, placeholder=[])
+
+
+def register_staff_sections(executor, business_id, shop_ids, time_periods):
+    executor.add('top_staff', get_top_performing_staff, business_id, shop_ids,
+                 time_periods['thirty_days_ago'], placeholder=[])
+    executor.add('sales_by_staff', get_sales_by_staff, business_id, shop_ids,
+                 time_periods['thirty_days_ago'], placeholder=[])
+    executor.add('attendance', get_staff_attendance_metrics, business_id, placeholder=dict(EMPTY_ATTENDANCE))
+
+
+def register_activity_sections(executor, business_id, shop_ids, time_periods):
+    executor.add('latest_sales', get_recent_sales, business_id, shop_ids, placeholder=[])
+    executor.add('register_sessions', get_recent_register_sessions, shop_ids, placeholder=[])
+    executor.add('stock_changes', get_recent_stock_changes, business_id, shop_ids, placeholder=[])
+    executor.add('user_activities', get_recent_user_activities, business_id, placeholder=[])
+
+
+def get_business_overview(sections, shop_ids):
     """Get high-level business metrics"""
     return {
-        'total_shops': len(business.active_shops),
-        'active_users': len(business.active_users),
-        'total_products': get_product_count(business.id),
-        'active_sessions': get_active_register_sessions_count(shop_ids),
+        'business_overview': {
+            'total_shops': len(shop_ids),
+            'active_users': sections['active_users'],
+            'total_products': sections['total_products'],
+            'active_sessions': sections['active_sessions'],
+        },
+        'sales_performance': {
+            'last_30_days': sections['sales_last_30_days'],
+            'last_month': sections['sales_last_month'],
+        },
+        'inventory_insights': {
+            'stock_status': sections['stock_status'],
+        },
     }
 
-def get_sales_performance(business_id, shop_ids, time_periods):
+def get_sales_performance(sections, shop_ids):
     """Get comprehensive sales analytics"""
-    return {
-        'today': get_sales_metrics(business_id, shop_ids, time_periods['today']),
-        'last_30_days': get_sales_metrics(business_id, shop_ids, time_periods['thirty_days_ago']),
-        'current_month': get_sales_metrics(
-            business_id, 
-            shop_ids, 
-            time_periods['current_month_start']
-        ),
-        'last_month': get_sales_metrics(
-            business_id, 
-            shop_ids, 
-            time_periods['last_month_start'],
-            time_periods['last_month_end']
-        ),
-        'trends': get_sales_trends(business_id, shop_ids),
-        'payment_methods': get_payment_method_distribution(business_id, shop_ids),
-        'hourly_patterns': get_hourly_sales_patterns(business_id, shop_ids),
-    }
-
-def get_shop_comparison(business_id, shop_ids):
-    return {
-        'top_performing': get_top_performing_shops(business_id, shop_ids),
-        'sales_distribution': get_sales_by_shop(business_id, shop_ids),
-        'profit_margins': get_shop_profit_margins(business_id, shop_ids),
-        'conversion_rates': get_shop_conversion_rates(business_id, shop_ids),
-        'shop_transactions': get_shop_transaction_counts(business_id, shop_ids),
-    }
-
-def get_inventory_insights(business_id):
+    return {'sales_performance': {
+        'today': sections['sales_today'],
+        'current_month': sections['sales_current_month'],
+        'trends': sections['sales_trends'],
+        'payment_methods': sections['payment_methods'],
+        'hourly_patterns': sections['hourly_patterns'],
+    }}
+
+def get_shop_comparison(sections, shop_ids):
+    return {'shop_comparison': {
+        'top_performing': sections['top_shops'],
+        'sales_distribution': sections['sales_by_shop'],
+        'profit_margins': sections['profit_margins'],
+        'conversion_rates': get_shop_conversion_rates(None, shop_ids),
+        'shop_transactions': sections['shop_transactions'],
+    }}
+
+def get_inventory_insights(sections, shop_ids):
     """Get inventory-related metrics"""
-    return {
-        'stock_status': get_inventory_status(business_id),
-        'fast_moving': get_fast_moving_products(business_id),
-        'slow_moving': get_slow_moving_products(business_id),
-        'reorder_needs': get_products_needing_reorder(business_id),
-    }
-
-def get_staff_performance(business_id, shop_ids):
+    return {'inventory_insights': {
+        'stock_status': sections['stock_status'],
+        'fast_moving': sections['fast_moving'],
+        'slow_moving': sections['slow_moving'],
+        'reorder_needs': sections['reorder_needs'],
+    }}
+
+def get_staff_performance(sections, shop_ids):
     """Get staff productivity metrics"""
-    return {
-        'top_performers': get_top_performing_staff(business_id, shop_ids),
-        'sales_by_staff': get_sales_by_staff(business_id, shop_ids),
-        'attendance': get_staff_attendance_metrics(business_id),
-    }
+    return {'staff_performance': {
+        'top_performers': sections['top_staff'],
+        'sales_by_staff': sections['sales_by_staff'],
+        'attendance': sections['attendance'],
+    }}
 
-def get_recent_activity(business_id, shop_ids):
+def get_recent_activity(sections, shop_ids):
     """Get recent business activity"""
-    return {
-        'latest_sales': get_recent_sales(business_id, shop_ids),
-        'register_sessions': get_recent_register_sessions(shop_ids),
-        'stock_changes': get_recent_stock_changes(business_id),
-        'user_activities': get_recent_user_activities(business_id),
-    }
+    return {'recent_activity': {
+        'latest_sales': sections['latest_sales'],
+        'register_sessions': sections['register_sessions'],
+        'stock_changes': sections['stock_changes'],
+        'user_activities': sections['user_activities'],
+    }}
+
+
+# Section name -> (query registration, context builder, fragment template)
+DASHBOARD_SECTIONS = {
+    'overview': (register_overview_sections, get_business_overview,
+                 'bhapos/tenants/dashboard/_overview.html'),
+    'sales': (register_sales_sections, get_sales_performance,
+              'bhapos/tenants/dashboard/_sales.html'),
+    'shops': (register_shop_sections, get_shop_comparison,
+              'bhapos/tenants/dashboard/_shops.html'),
+    'inventory': (register_inventory_sections, get_inventory_insights,
+                  'bhapos/tenants/dashboard/_inventory.html'),
+    'staff': (register_staff_sections, get_staff_performance,
+              'bhapos/tenants/dashboard/_staff.html'),
+    'activity': (register_activity_sections, get_recent_activity,
+                 'bhapos/tenants/dashboard/_activity.html'),
+}
 
 
 # ======================
@@ -585,26 +688,28 @@ def get_recent_activity(business_id, shop_ids):
 # ======================
 
 def get_sales_metrics(business_id, shop_ids, start_date, end_date=None):
-    """Get comprehensive sales metrics for a period"""
+    """Get comprehensive sales metrics for a period (served from the daily rollup)"""
     if not shop_ids:
         return empty_sales_metrics()
     
     query = db.session.query(
-        func.sum(Sale.total).label('total_sales'),
-        func.count(Sale.id).label('transaction_count'),
-        func.avg(Sale.total).label('average_sale'),
-        func.sum(Sale.profit).label('total_profit'),
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin'),
-        func.max(Sale.total).label('largest_sale'),
-        func.min(Sale.total).label('smallest_sale'),
+        func.sum(ShopDailySales.total_sales).label('total_sales'),
+        func.sum(ShopDailySales.transaction_count).label('transaction_count'),
+        (func.sum(ShopDailySales.total_sales) /
+         func.nullif(func.sum(ShopDailySales.transaction_count), 0)).label('average_sale'),
+        func.sum(ShopDailySales.total_profit).label('total_profit'),
+        (func.sum(ShopDailySales.total_profit) /
+         func.nullif(func.sum(ShopDailySales.total_sales), 0) * 100).label('profit_margin'),
+        func.max(ShopDailySales.largest_sale).label('largest_sale'),
+        func.min(ShopDailySales.smallest_sale).label('smallest_sale'),
     ).filter(
-        Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= start_date,
-        Sale.is_deleted == False
+        ShopDailySales.business_id == business_id,
+        ShopDailySales.shop_id.in_(shop_ids),
+        ShopDailySales.business_date >= start_date
     )
     
     if end_date:
-        query = query.filter(Sale.created_at <= end_date)
+        query = query.filter(ShopDailySales.business_date <= end_date)
     
     result = query.first()
     
@@ -615,21 +720,21 @@ def get_sales_trends(business_id, shop_ids):
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = business_today(business_id) - timedelta(days=30)
     
     return db.session.query(
-        func.date(Sale.created_at).label('date'),
-        func.sum(Sale.total).label('total_sales'),
-        func.count(Sale.id).label('transaction_count'),
-        func.sum(Sale.profit).label('total_profit'),
+        ShopDailySales.business_date.label('date'),
+        func.sum(ShopDailySales.total_sales).label('total_sales'),
+        func.sum(ShopDailySales.transaction_count).label('transaction_count'),
+        func.sum(ShopDailySales.total_profit).label('total_profit'),
     ).filter(
-        Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.business_id == business_id,
+        ShopDailySales.shop_id.in_(shop_ids),
+        ShopDailySales.business_date >= thirty_days_ago
     ).group_by(
-        func.date(Sale.created_at)
+        ShopDailySales.business_date
     ).order_by(
-        func.date(Sale.created_at)
+        ShopDailySales.business_date
     ).all()
 
 def get_top_performing_shops(business_id, shop_ids):
@@ -637,53 +742,41 @@ def get_top_performing_shops(business_id, shop_ids):
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = business_today(business_id) - timedelta(days=30)
     
     return db.session.query(
         Shop.id,
         Shop.name,
-        func.sum(Sale.total).label('total_sales'),
-        func.sum(Sale.profit).label('total_profit'),
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin'),
+        func.sum(ShopDailySales.total_sales).label('total_sales'),
+        func.sum(ShopDailySales.total_profit).label('total_profit'),
+        (func.sum(ShopDailySales.total_profit) /
+         func.nullif(func.sum(ShopDailySales.total_sales), 0) * 100).label('profit_margin'),
     ).join(
-        Sale, Sale.shop_id == Shop.id
+        ShopDailySales, ShopDailySales.shop_id == Shop.id
     ).filter(
         Shop.id.in_(shop_ids),
-        Shop.business_id == business_id,
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.business_id == business_id,
+        ShopDailySales.business_date >= thirty_days_ago
     ).group_by(
         Shop.id,
         Shop.name
     ).order_by(
-        func.sum(Sale.total).desc()
+        func.sum(ShopDailySales.total_sales).desc()
     ).limit(5).all()
 
 
-def get_inventory_status(business_id):
+def get_inventory_status(business_id, shop_ids):
     """Get comprehensive inventory status by querying through shops"""
-    # First get all shop IDs for this business
-    shop_ids = [shop.id for shop in Shop.query.filter_by(
-        business_id=business_id,
-        is_deleted=False
-    ).with_entities(Shop.id).all()]
-    
     if not shop_ids:
-        return {
-            'total_products': 0,
-            'low_stock': 0,
-            'out_of_stock': 0,
-            'total_inventory': 0,
-            'inventory_value': 0
-        }
+        return dict(EMPTY_INVENTORY_STATUS)
     
     # Now query products through these shop IDs
     result = db.session.query(
         func.count(Product.id).label('total_products'),
-        func.sum(case((Product.stock <= 10, 1), else_=0)).label('low_stock'),
+        func.sum(case((Product.is_low_stock, 1), else_=0)).label('low_stock'),
         func.sum(case((Product.stock <= 0, 1), else_=0)).label('out_of_stock'),
         func.sum(Product.stock).label('total_inventory'),
-        func.sum(Product.stock * Product.selling_price).label('inventory_value'),
+        func.sum(Product.stock * Product.valuation_cost).label('inventory_value'),  # at weighted average cost
     ).filter(
         Product.shop_id.in_(shop_ids),  # Changed from business_id to shop_id
         Product.is_deleted == False,
@@ -699,18 +792,11 @@ def get_inventory_status(business_id):
     }
 
 
-def get_fast_moving_products(business_id):
+def get_fast_moving_products(business_id, shop_ids, start_date):
     """Get fastest moving products through business shops"""
-    shop_ids = [shop.id for shop in Shop.query.filter_by(
-        business_id=business_id,
-        is_deleted=False
-    ).with_entities(Shop.id).all()]
-    
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
     return db.session.query(
         Product.id.label('product_id'),
         Product.name.label('product_name'),
@@ -721,7 +807,8 @@ def get_fast_moving_products(business_id):
         Sale, Sale.id == CartItem.sale_id
     ).filter(
         Product.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
+        Sale.shop_id.in_(shop_ids),
+        Sale.business_date >= start_date,
         Sale.is_deleted == False,
         Product.is_deleted == False
     ).group_by(
@@ -732,18 +819,11 @@ def get_fast_moving_products(business_id):
     ).limit(5).all()
 
 
-def get_slow_moving_products(business_id):
+def get_slow_moving_products(business_id, shop_ids, start_date):
     """Get slowest moving products through business shops"""
-    shop_ids = [shop.id for shop in Shop.query.filter_by(
-        business_id=business_id,
-        is_deleted=False
-    ).with_entities(Shop.id).all()]
-    
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-
     return db.session.query(
         Product.id.label("product_id"),
         Product.name.label("product_name"),
@@ -754,7 +834,8 @@ def get_slow_moving_products(business_id):
         Sale, Sale.id == CartItem.sale_id
     ).filter(
         Product.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
+        Sale.shop_id.in_(shop_ids),
+        Sale.business_date >= start_date,
         Sale.is_deleted == False,
         Product.is_deleted == False
     ).group_by(
@@ -767,32 +848,21 @@ def get_slow_moving_products(business_id):
 
 
 
-def get_products_needing_reorder(business_id):
+def get_products_needing_reorder(business_id, shop_ids):
     """Get products that need reordering through business shops"""
-    shop_ids = [shop.id for shop in Shop.query.filter_by(
-        business_id=business_id,
-        is_deleted=False
-    ).with_entities(Shop.id).all()]
-    
     if not shop_ids:
         return []
     
-    return db.session.query(Product).filter(
-        Product.shop_id.in_(shop_ids),
-        Product.stock <= Product.low_stock_threshold,
-        Product.is_deleted == False,
-        Product.is_active == True
-    ).limit(5).all()
+    plan = ReorderPlanService.get_plan(shop_ids, 'business', business_id)
+    return ReorderPlanService.urgent_lines(plan)
 
 
 
-def get_top_performing_staff(business_id, shop_ids):
+def get_top_performing_staff(business_id, shop_ids, start_date):
     """Get top performing staff members by sales performance"""
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-
     return db.session.query(
         User.id.label('user_id'),
         User.username.label('username'),
@@ -808,7 +878,7 @@ def get_top_performing_staff(business_id, shop_ids):
     ).filter(
         User.business_id == business_id,
         Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
+        Sale.business_date >= start_date,
         Sale.is_deleted == False,
         User.is_deleted == False
     ).group_by(
@@ -821,13 +891,11 @@ def get_top_performing_staff(business_id, shop_ids):
 
 
 
-def get_sales_by_staff(business_id, shop_ids):
+def get_sales_by_staff(business_id, shop_ids, start_date):
     """Get summarized sales performance per staff member"""
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-
     return db.session.query(
         User.id.label('user_id'),
         User.username,
@@ -838,7 +906,7 @@ def get_sales_by_staff(business_id, shop_ids):
     ).filter(
         User.business_id == business_id,
         Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
+        Sale.business_date >= start_date,
         Sale.is_deleted == False,
         User.is_deleted == False
     ).group_by(
@@ -856,14 +924,10 @@ def get_staff_attendance_metrics(business_id):
     ).all()
     
     if not users:
-        return {
-            'total_staff': 0,
-            'active_today': 0,
-            'on_leave': 0
-        }
+        return dict(EMPTY_ATTENDANCE)
     
     # Placeholder logic - replace with your actual attendance tracking
-    today = datetime.utcnow().date()
+    today = business_today(business_id)
     active_today_count = 0
     
     return {
@@ -875,13 +939,8 @@ def get_staff_attendance_metrics(business_id):
 
 
 
-def get_product_count(business_id):
+def get_product_count(business_id, shop_ids):
     """Get count of active products for a business through its shops"""
-    shop_ids = [shop.id for shop in Shop.query.filter_by(
-        business_id=business_id,
-        is_deleted=False
-    ).with_entities(Shop.id).all()]
-    
     if not shop_ids:
         return 0
         
@@ -892,6 +951,14 @@ def get_product_count(business_id):
     ).scalar() or 0
 
 
+def get_active_user_count(business_id):
+    """Get count of non-deleted users for a business"""
+    return db.session.query(func.count(User.id)).filter(
+        User.business_id == business_id,
+        User.is_deleted == False
+    ).scalar() or 0
+
+
 def get_active_register_sessions_count(shop_ids):
     """Get count of active register sessions"""
     if not shop_ids:
@@ -903,41 +970,40 @@ def get_active_register_sessions_count(shop_ids):
 
 
 
-def get_payment_method_distribution(business_id, shop_ids):
+def get_payment_method_distribution(business_id, shop_ids, start_date):
     """Get sales distribution by payment method"""
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
     return db.session.query(
         Sale.payment_method,
         func.sum(Sale.total).label('total'),
         func.count(Sale.id).label('count'),
     ).filter(
         Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
+        Sale.business_date >= start_date,
         Sale.is_deleted == False
     ).group_by(
         Sale.payment_method
     ).all()
 
-def get_hourly_sales_patterns(business_id, shop_ids):
-    """Get hourly sales patterns (placeholder - implement your business logic)"""
+def get_hourly_sales_patterns(business_id, shop_ids, start_date):
+    """Get hourly sales patterns since start_date"""
     if not shop_ids:
         return []
     
     return db.session.query(
-        func.extract('hour', Sale.created_at).label('hour'),
+        Sale.business_hour.label('hour'),
         func.sum(Sale.total).label('total_sales'),
         func.count(Sale.id).label('transaction_count'),
     ).filter(
         Sale.shop_id.in_(shop_ids),
+        Sale.business_date >= start_date,
         Sale.is_deleted == False
     ).group_by(
-        func.extract('hour', Sale.created_at)
+        Sale.business_hour
     ).order_by(
-        func.extract('hour', Sale.created_at)
+        Sale.business_hour
     ).all()
 
 
@@ -946,7 +1012,7 @@ def get_sales_by_shop(business_id, shop_ids):
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = business_today(business_id) - timedelta(days=30)
 
     return db.session.query(
         Shop.id.label('id'),
@@ -955,17 +1021,17 @@ def get_sales_by_shop(business_id, shop_ids):
         Shop.phone.label('phone'),
         Shop.currency.label('currency'),
         Shop.logo_url.label('logo_url'),
-        func.sum(Sale.total).label('total_sales'),
-        func.sum(Sale.profit).label('total_profit'),
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin')
+        func.sum(ShopDailySales.total_sales).label('total_sales'),
+        func.sum(ShopDailySales.total_profit).label('total_profit'),
+        (func.sum(ShopDailySales.total_profit) /
+         func.nullif(func.sum(ShopDailySales.total_sales), 0) * 100).label('profit_margin')
     ).join(
-        Sale, Sale.shop_id == Shop.id
+        ShopDailySales, ShopDailySales.shop_id == Shop.id
     ).filter(
         Shop.id.in_(shop_ids),
-        Shop.business_id == business_id,
         Shop.is_deleted == False,
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.business_id == business_id,
+        ShopDailySales.business_date >= thirty_days_ago
     ).group_by(
         Shop.id,
         Shop.name,
@@ -976,33 +1042,29 @@ def get_sales_by_shop(business_id, shop_ids):
     ).all()
 
 
-
-
 def get_shop_profit_margins(business_id, shop_ids):
     """Get profit margins by shop"""
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = business_today(business_id) - timedelta(days=30)
 
     return db.session.query(
         Shop.id,
         Shop.name,
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin')
+        (func.sum(ShopDailySales.total_profit) /
+         func.nullif(func.sum(ShopDailySales.total_sales), 0) * 100).label('profit_margin')
     ).join(
-        Sale, Sale.shop_id == Shop.id
-    ).join(
-        Business, Shop.business_id == Business.id  # 🔧 Ensure this join is present
+        ShopDailySales, ShopDailySales.shop_id == Shop.id
     ).filter(
         Shop.id.in_(shop_ids),
-        Business.id == business_id,
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.business_id == business_id,
+        ShopDailySales.business_date >= thirty_days_ago
     ).group_by(
         Shop.id,
         Shop.name
     ).order_by(
-        func.sum(Sale.profit).desc()
+        func.sum(ShopDailySales.total_profit).desc()
     ).all()
 
 
@@ -1035,14 +1097,8 @@ def get_recent_register_sessions(shop_ids, limit=5):
     ).limit(limit).all()
 
 
-def get_recent_stock_changes(business_id):
+def get_recent_stock_changes(business_id, shop_ids):
     """Get recent stock changes through business shops"""
-    # First get all shop IDs for this business
-    shop_ids = [shop.id for shop in Shop.query.filter_by(
-        business_id=business_id,
-        is_deleted=False
-    ).with_entities(Shop.id).all()]
-    
     if not shop_ids:
         return []
     
@@ -0,0 +1,216 @@
+"""
+Platform metrics snapshots for the superadmin views.
+
+The superadmin dashboard reads the latest snapshot in one fetch instead of
+running table-wide GROUP BYs per request. Snapshots are written by
+PlatformMetricsService.refresh(), run from the ``refresh-platform-metrics``
+command, from a background thread when the latest snapshot is older than
+PLATFORM_METRICS_INTERVAL, or from the manual refresh action.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, case
+
+from app import db, cache
+from app.models import (
+    Business, BusinessStatus, Shop, User, Role, ShopDailySales, PlatformMetricsSnapshot
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 15 * 60
+SNAPSHOT_RETENTION_DAYS = 90
+RECENT_BUSINESSES = 5
+
+
+def _growth(current, previous):
+    if not previous:
+        return 100.0 if current else 0.0
+    return round((current - previous) / previous * 100, 1)
+
+
+class PlatformMetricsService:
+
+    @staticmethod
+    def latest():
+        """Most recent snapshot, or None if none has been captured yet."""
+        return PlatformMetricsSnapshot.query.order_by(
+            PlatformMetricsSnapshot.captured_at.desc()
+        ).first()
+
+    @staticmethod
+    def is_stale(snapshot):
+        interval = current_app.config.get('PLATFORM_METRICS_INTERVAL', DEFAULT_INTERVAL)
+        return snapshot is None or snapshot.captured_at < datetime.utcnow() - timedelta(seconds=interval)
+
+    @staticmethod
+    def get_or_schedule():
+        """
+        Return the latest snapshot. A stale one is still returned while a
+        background refresh is started; only the very first call blocks.
+        """
+        snapshot = PlatformMetricsService.latest()
+        if snapshot is None:
+            return PlatformMetricsService.refresh()
+        if PlatformMetricsService.is_stale(snapshot):
+            PlatformMetricsService.schedule_refresh()
+        return snapshot
+
+    @staticmethod
+    def schedule_refresh():
+        """Refresh in a background thread; at most one refresh runs at a time."""
+        if not cache.add('platform_metrics:refresh_lock', 1, timeout=300):
+            return False
+        threading.Thread(
+            target=PlatformMetricsService._refresh_in_background,
+            args=(current_app._get_current_object(),),
+            daemon=True
+        ).start()
+        return True
+
+    @staticmethod
+    def _refresh_in_background(app):
+        with app.app_context():
+            try:
+                PlatformMetricsService.refresh()
+            except Exception as e:
+                logger.error(f"Platform metrics refresh failed: {e}", exc_info=True)
+            finally:
+                cache.delete('platform_metrics:refresh_lock')
+
+    @staticmethod
+    def refresh():
+        """Capture and store a new snapshot, pruning old ones."""
+        snapshot = PlatformMetricsSnapshot(
+            captured_at=datetime.utcnow(),
+            payload=PlatformMetricsService.build_payload()
+        )
+        db.session.add(snapshot)
+        PlatformMetricsSnapshot.query.filter(
+            PlatformMetricsSnapshot.captured_at < datetime.utcnow() - timedelta(days=SNAPSHOT_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        logger.info("Captured platform metrics snapshot")
+        return snapshot
+
+    @staticmethod
+    def build_payload():
+        today = datetime.utcnow().date()
+        month_start = today.replace(day=1)
+        last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+
+        # Businesses: status distribution and new-per-month in one scan
+        status_rows = db.session.query(
+            Business.status,
+            func.count(Business.id),
+            func.sum(case((Business.created_at >= month_start, 1), else_=0)),
+            func.sum(case((Business.created_at.between(last_month_start, month_start), 1), else_=0)),
+            func.sum(case((Business.is_approved == False, 1), else_=0)),
+        ).filter(
+            Business.is_deleted == False
+        ).group_by(Business.status).all()
+
+        businesses_by_status = {status.value: count for status, count, _, _, _ in status_rows if status}
+        new_businesses = sum(row[2] or 0 for row in status_rows)
+        new_businesses_last_month = sum(row[3] or 0 for row in status_rows)
+        pending_businesses = sum(row[4] or 0 for row in status_rows)
+
+        users = db.session.query(
+            func.count(User.id),
+            func.sum(case((User.role == Role.TENANT, 1), else_=0)),
+            func.sum(case((User.created_at >= month_start, 1), else_=0)),
+            func.sum(case((User.created_at.between(last_month_start, month_start), 1), else_=0)),
+        ).filter(User.is_deleted == False).first()
+
+        shops = db.session.query(
+            func.count(Shop.id),
+            func.sum(case((Shop.created_at >= month_start, 1), else_=0)),
+        ).filter(Shop.is_deleted == False).first()
+
+        # GMV per business from the daily rollup
+        window_start = today - timedelta(days=59)
+        current_start = today - timedelta(days=29)
+        gmv_rows = db.session.query(
+            Business.id,
+            Business.name,
+            func.sum(case((ShopDailySales.business_date == today, ShopDailySales.total_sales), else_=0)),
+            func.sum(case((ShopDailySales.business_date >= today - timedelta(days=6), ShopDailySales.total_sales), else_=0)),
+            func.sum(case((ShopDailySales.business_date >= current_start, ShopDailySales.total_sales), else_=0)),
+            func.sum(case((ShopDailySales.business_date < current_start, ShopDailySales.total_sales), else_=0)),
+        ).join(
+            ShopDailySales, ShopDailySales.business_id == Business.id
+        ).filter(
+            ShopDailySales.business_date >= window_start
+        ).group_by(Business.id, Business.name).all()
+
+        gmv_by_business = sorted((
+            {
+                'business_id': business_id,
+                'name': name,
+                'today': float(day or 0),
+                'last_7_days': float(week or 0),
+                'last_30_days': float(current or 0),
+                'previous_30_days': float(previous or 0),
+                'growth': _growth(float(current or 0), float(previous or 0)),
+            }
+            for business_id, name, day, week, current, previous in gmv_rows
+        ), key=lambda row: row['last_30_days'], reverse=True)
+
+        gmv_daily = [
+            {'date': day.isoformat(), 'total': float(total or 0)}
+            for day, total in db.session.query(
+                ShopDailySales.business_date,
+                func.sum(ShopDailySales.total_sales)
+            ).filter(
+                ShopDailySales.business_date >= current_start
+            ).group_by(
+                ShopDailySales.business_date
+            ).order_by(ShopDailySales.business_date).all()
+        ]
+
+        recent = Business.query.filter_by(is_deleted=False).order_by(
+            Business.created_at.desc()
+        ).limit(RECENT_BUSINESSES).all()
+        tenants = dict(db.session.query(User.business_id, User.username).filter(
+            User.business_id.in_([b.id for b in recent]),
+            User.role == Role.TENANT
+        ).all()) if recent else {}
+
+        gmv_30 = sum(row['last_30_days'] for row in gmv_by_business)
+        gmv_prev_30 = sum(row['previous_30_days'] for row in gmv_by_business)
+
+        return {
+            'totals': {
+                'businesses': sum(businesses_by_status.values()),
+                'active_businesses': businesses_by_status.get(BusinessStatus.ACTIVE.value, 0),
+                'pending_businesses': pending_businesses,
+                'tenants': int(users[1] or 0),
+                'users': int(users[0] or 0),
+                'shops': int(shops[0] or 0),
+                'gmv_30_days': gmv_30,
+            },
+            'businesses_by_status': businesses_by_status,
+            'growth': {
+                'new_businesses': int(new_businesses),
+                'business_growth': _growth(new_businesses, new_businesses_last_month),
+                'new_users': int(users[2] or 0),
+                'user_growth': _growth(int(users[2] or 0), int(users[3] or 0)),
+                'new_shops': int(shops[1] or 0),
+                'gmv_growth': _growth(gmv_30, gmv_prev_30),
+            },
+            'gmv_by_business': gmv_by_business,
+            'gmv_daily': gmv_daily,
+            'recent_businesses': [
+                {
+                    'id': b.id,
+                    'name': b.name,
+                    'status': b.status.value if b.status else None,
+                    'created_at': b.created_at.isoformat() if b.created_at else None,
+                    'tenant': tenants.get(b.id),
+                }
+                for b in recent
+            ],
+        }
@@ -0,0 +1,212 @@
+"""Maintenance commands registered on the Flask CLI (``flask <command>``)."""
+import click
+from flask.cli import with_appcontext
+
+
+def register_commands(app):
+
+    @app.cli.command('purge-report-artifacts')
+    @with_appcontext
+    def purge_report_artifacts():
+        """Delete report job artifacts older than the retention period."""
+        from app.reports.jobs import ReportJobService
+        removed = ReportJobService.purge_expired()
+        click.echo(f"Removed {removed} expired report artifacts")
+
+    @app.cli.command('load-locations')
+    @click.option('--path', type=click.Path(exists=True, dir_okay=False), default=None,
+                  help='Locations JSON (default: app/data/county_locations.json).')
+    @with_appcontext
+    def load_locations_command(path):
+        """Insert missing counties, subcounties and wards from the reference JSON."""
+        from app.utils.locations import load_locations
+        inserted = load_locations(path)
+        click.echo(f"Inserted {inserted['counties']} counties, {inserted['subcounties']} subcounties "
+                   f"and {inserted['wards']} wards")
+
+    @app.cli.command('rebuild-basket-index')
+    @click.option('--shop-id', type=int, default=None, help='Rebuild a single shop (default: all active shops).')
+    @with_appcontext
+    def rebuild_basket_index(shop_id):
+        """Recount the market-basket co-occurrence windows (schedule nightly)."""
+        from app.models import Shop
+        from app.sale.services import BasketService
+
+        shop_ids = [shop_id] if shop_id else [
+            s.id for s in Shop.query.filter_by(is_deleted=False, is_active=True).all()
+        ]
+        for sid in shop_ids:
+            BasketService.rebuild_shop(sid)
+            click.echo(f"Rebuilt basket index for shop {sid}")
+
+    @app.cli.command('rebuild-sales-rollup')
+    @click.option('--business-id', type=int, default=None, help='Rebuild one business (default: all).')
+    @click.option('--days', type=int, default=None, help='Only rebuild the last N days (default: full history).')
+    @with_appcontext
+    def rebuild_sales_rollup(business_id, days):
+        """Recompute the per-shop daily sales rollup from the sales table."""
+        from datetime import datetime, timedelta
+        from app import db
+        from app.models import Shop
+        from app.utils.sales_rollup import rebuild_rollup
+
+        shop_ids = None
+        if business_id:
+            shop_ids = [s.id for s in Shop.query.filter_by(business_id=business_id).all()]
+        start_date = datetime.utcnow().date() - timedelta(days=days) if days else None
+
+        rows = rebuild_rollup(db.session.connection(), shop_ids=shop_ids, start_date=start_date)
+        db.session.commit()
+        click.echo(f"Wrote {rows} daily rollup rows")
+
+    @app.cli.command('repair-category-counters')
+    @click.option('--shop-id', type=int, default=None, help='Repair a single shop (default: all shops).')
+    @with_appcontext
+    def repair_category_counters(shop_id):
+        """Recompute the per-category product counters from the products table."""
+        from app import db
+        from app.models import Category
+        from app.utils.category_counters import recount
+
+        category_ids = None
+        if shop_id:
+            category_ids = [c.id for c in Category.query.with_entities(Category.id).filter_by(shop_id=shop_id)]
+        rows = recount(db.session.connection(), category_ids)
+        db.session.commit()
+        click.echo(f"Recounted {rows} categories")
+
+    @app.cli.command('snapshot-stock')
+    @click.option('--shop-id', type=int, default=None, help='Snapshot a single shop (default: all shops).')
+    @click.option('--date', 'snapshot_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help="Business day to snapshot (default: each shop's previous day).")
+    @with_appcontext
+    def snapshot_stock(shop_id, snapshot_date):
+        """Record each product's closing stock and the shop's valuation for a business day (schedule nightly)."""
+        from flask import current_app
+        from app import db
+        from app.models import Shop
+        from app.utils.stock_ledger import snapshot_shop
+
+        shop_ids = [shop_id] if shop_id else [
+            s.id for s in Shop.query.filter_by(is_deleted=False).all()
+        ]
+        failed = 0
+        for sid in shop_ids:
+            try:
+                rows = snapshot_shop(sid, snapshot_date.date() if snapshot_date else None)
+            except Exception as e:
+                # One broken shop must not stop the nightly run for the rest
+                db.session.rollback()
+                current_app.logger.error(f"Stock snapshot failed for shop {sid}: {e}", exc_info=True)
+                click.echo(f"Failed to snapshot shop {sid}: {e}", err=True)
+                failed += 1
+                continue
+            click.echo(f"Snapshotted {rows} products for shop {sid}")
+        if failed:
+            raise click.ClickException(f"{failed} shop(s) could not be snapshotted")
+
+    @app.cli.command('build-product-images')
+    @click.option('--shop-id', type=int, default=None, help='Convert a single shop (default: all shops).')
+    @with_appcontext
+    def build_product_images(shop_id):
+        """Generate renditions for product images uploaded before the image pipeline."""
+        from app import db
+        from app.models import Product
+        from app.utils.product_images import build_missing_renditions
+
+        query = Product.query.filter(Product.image_url.isnot(None))
+        if shop_id:
+            query = query.filter(Product.shop_id == shop_id)
+        converted = build_missing_renditions(query.all())
+        db.session.commit()
+        click.echo(f"Converted {converted} product images")
+
+    @app.cli.command('refresh-platform-metrics')
+    @with_appcontext
+    def refresh_platform_metrics():
+        """Capture a platform metrics snapshot for the superadmin views (schedule via cron)."""
+        from app.bhapos.services import PlatformMetricsService
+        snapshot = PlatformMetricsService.refresh()
+        click.echo(f"Captured platform metrics snapshot at {snapshot.captured_at:%Y-%m-%d %H:%M:%S}")
+
+    @app.cli.command('benchmark-admin-dashboard')
+    @click.option('--shop-id', type=int, required=True)
+    @click.option('--runs', type=int, default=5)
+    @with_appcontext
+    def benchmark_admin_dashboard(shop_id, runs):
+        """Report SQL statement count and time for building a shop's admin dashboard."""
+        import time
+        from sqlalchemy import event
+        from app import db
+        from app.admin.services import AdminDashboardProvider
+        from app.utils.time import shop_today
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.engine
+        today = shop_today(shop_id)
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            timings = []
+            for _ in range(runs):
+                statements.clear()
+                started = time.perf_counter()
+                AdminDashboardProvider.build(shop_id, today)
+                timings.append(time.perf_counter() - started)
+            cold = len(statements)
+
+            AdminDashboardProvider.invalidate(shop_id)
+            AdminDashboardProvider.get(shop_id)
+            statements.clear()
+            AdminDashboardProvider.get(shop_id)
+            warm = len(statements)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+            db.session.remove()
+
+        click.echo(f"Uncached build: {cold} SQL statements, "
+                   f"best {min(timings) * 1000:.1f}ms over {runs} runs")
+        click.echo(f"Cached read: {warm} SQL statements")
+
+    @app.cli.command('profile-startup')
+    @click.option('--budget-ms', type=float, default=None,
+                  help='Fail if app import + create_app exceeds this (default: STARTUP_IMPORT_BUDGET_MS).')
+    @click.option('--top', type=int, default=20, help='Number of modules to list.')
+    def profile_startup(budget_ms, top):
+        """Profile cold-start self import time per module in a fresh interpreter."""
+        import os
+        import subprocess
+        import sys
+        import time
+        from collections import defaultdict
+
+        budget_ms = budget_ms if budget_ms is not None else app.config.get('STARTUP_IMPORT_BUDGET_MS')
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+            cwd=os.path.dirname(app.root_path), capture_output=True, text=True
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise click.ClickException(f"App failed to start:\n{result.stderr[-2000:]}")
+
+        # "import time: self [us] | cumulative | imported package"
+        self_us = defaultdict(int)
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            own, _, name = line[len('import time:'):].split('|', 2)
+            self_us[name.strip()] += int(own)
+
+        import_ms = sum(self_us.values()) / 1000
+        click.echo(f"{'module':<50} {'self ms':>10}")
+        for module, us in sorted(self_us.items(), key=lambda item: item[1], reverse=True)[:top]:
+            click.echo(f"{module:<50} {us / 1000:>10.1f}")
+        click.echo(f"Imports: {import_ms:.1f}ms across {len(self_us)} modules; "
+                   f"interpreter start to app ready: {wall_ms:.1f}ms")
+
+        if budget_ms and import_ms > budget_ms:
+            raise click.ClickException(f"Import time {import_ms:.1f}ms exceeds the {budget_ms:.0f}ms budget")
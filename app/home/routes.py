@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, session, flash, request
+from flask import Blueprint, render_template, redirect, url_for, session, flash, request, make_response, current_app, abort
 from flask_login import current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField
@@ -6,6 +6,7 @@ from wtforms.validators import DataRequired
 import logging
 from app.models import Shop, User, Business
 from app import db
+from app.home.services import resolve_shop_id, get_cached_page, cache_page
 
 # Define the Blueprint
 home_bp = Blueprint('home', __name__)
@@ -25,43 +26,32 @@ def get_shop_from_request():
     Extract shop from subdomain, custom domain, or URL parameter.
     Returns the Shop object or None if no valid shop is found.
     """
-    host = request.headers.get('Host', '')
-    
-    # Check for custom domain
-    from app.models import ShopHomepageSettings
-    homepage_settings = ShopHomepageSettings.query.filter_by(
-        custom_domain=host, 
-        is_active=True
-    ).first()
-    if homepage_settings:
-        return homepage_settings.shop
-    
-    # Check for subdomain
-    if '.' in host:
-        subdomain = host.split('.')[0]
-        if subdomain not in ['www', 'app', 'admin', 'api']:
-            homepage_settings = ShopHomepageSettings.query.filter_by(
-                subdomain=subdomain, 
-                is_active=True
-            ).first()
-            if homepage_settings:
-                return homepage_settings.shop
-    
-    # Check URL parameter for shop-specific access
-    shop_id = request.args.get('shop_id')
-    if shop_id:
-        shop = Shop.query.get(shop_id)
-        if shop and shop.shop_homepage_settings and shop.shop_homepage_settings.is_active:
-            return shop
-    
-    # Check for shop slug-based access
-    shop_slug = request.args.get('shop_slug')
-    if shop_slug:
-        shop = Shop.query.filter_by(slug=shop_slug, is_active=True).first()
-        if shop:
-            return shop
-    
-    return None
+    shop_id = resolve_shop_id(
+        request.headers.get('Host', ''),
+        shop_id=request.args.get('shop_id'),
+        shop_slug=request.args.get('shop_slug')
+    )
+    return db.session.get(Shop, shop_id) if shop_id else None
+
+
+def render_shop_homepage(shop_id):
+    """
+    Render a shop's public homepage. Anonymous visitors get the cached page
+    with an ETag, and a matching If-None-Match is answered with a 304.
+    """
+    if current_user.is_authenticated:
+        return render_template('homepage/custom_shop.html', current_shop=Shop.query.get_or_404(shop_id))
+
+    page = get_cached_page(shop_id)
+    if page is None:
+        shop = Shop.query.get_or_404(shop_id)
+        page = cache_page(shop_id, render_template('homepage/custom_shop.html', current_shop=shop))
+
+    response = make_response(page['html'])
+    response.set_etag(page['etag'])
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config.get('HOMEPAGE_MAX_AGE', 60)}"
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
 
 @home_bp.route('/')
 def index():
@@ -70,10 +60,15 @@ def index():
     form = LoginForm()  # Initialize login form for unauthenticated users
 
     # Check if this is a shop-specific homepage request
-    requested_shop = get_shop_from_request()
-    if requested_shop and not current_user.is_authenticated:
-        logger.debug(f"Serving custom homepage for shop: {requested_shop.name}")
-        return render_template('homepage/custom_shop.html', current_shop=requested_shop)
+    if not current_user.is_authenticated:
+        requested_shop_id = resolve_shop_id(
+            request.headers.get('Host', ''),
+            shop_id=request.args.get('shop_id'),
+            shop_slug=request.args.get('shop_slug')
+        )
+        if requested_shop_id:
+            logger.debug(f"Serving custom homepage for shop: {requested_shop_id}")
+            return render_shop_homepage(requested_shop_id)
 
     # Initialize context for template
     context = {
@@ -176,11 +171,12 @@ def select_shop(shop_id):
 @home_bp.route('/shop/<int:shop_id>/homepage')
 def shop_homepage(shop_id):
     """Public-facing shop homepage"""
-    shop = Shop.query.get_or_404(shop_id)
-    return render_template('homepage/custom_shop.html', current_shop=shop)
+    return render_shop_homepage(shop_id)
 
 @home_bp.route('/shop/<shop_slug>/homepage')
 def shop_homepage_by_slug(shop_slug):
     """Public-facing shop homepage by slug"""
-    shop = Shop.query.filter_by(slug=shop_slug, is_active=True).first_or_404()
-    return redirect(url_for('home.shop_homepage', shop_id=shop.id))
\ No newline at end of file
+    shop_id = resolve_shop_id(None, shop_slug=shop_slug)
+    if not shop_id:
+        abort(404)
+    return redirect(url_for('home.shop_homepage', shop_id=shop_id))
\ No newline at end of file
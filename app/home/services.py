@@ -0,0 +1,171 @@
+"""
+Public shop homepage routing and page cache.
+
+Host, shop_id and slug lookups are cached as shop ids (0 for "no shop"), so
+unknown hosts are negatively cached too. All routing entries carry a global
+routing version that committed writes to homepage settings or shops bump.
+Rendered anonymous homepages are cached per shop under a per-shop content
+version, bumped by writes to the shop, its homepage settings or adverts.
+"""
+import hashlib
+import logging
+import time as time_module
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db, cache
+from app.models import Shop, ShopHomepageSettings, ShopAdvert
+
+logger = logging.getLogger(__name__)
+
+RESERVED_SUBDOMAINS = ('www', 'app', 'admin', 'api')
+DEFAULT_ROUTE_TTL = 3600
+DEFAULT_MISS_TTL = 300
+DEFAULT_PAGE_TTL = 300
+
+ROUTING_MODELS = (Shop, ShopHomepageSettings)
+CONTENT_MODELS = (Shop, ShopHomepageSettings, ShopAdvert)
+
+_ROUTING_VERSION_KEY = "homepage:routing:version"
+
+
+def _content_version_key(shop_id):
+    return f"homepage:shop:{shop_id}:version"
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, str(time_module.time_ns()), timeout=0)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.set(key, str(time_module.time_ns()), timeout=0)
+    except Exception as e:
+        logger.error(f"Failed to bump homepage version {key}: {e}")
+
+
+def _host_lookup(host):
+    settings = ShopHomepageSettings.query.filter_by(custom_domain=host, is_active=True).first()
+    if settings is None and '.' in host:
+        subdomain = host.split('.')[0]
+        if subdomain not in RESERVED_SUBDOMAINS:
+            settings = ShopHomepageSettings.query.filter_by(subdomain=subdomain, is_active=True).first()
+    return settings.shop_id if settings else None
+
+
+def _shop_id_lookup(shop_id):
+    shop = db.session.get(Shop, shop_id)
+    if shop and shop.shop_homepage_settings and shop.shop_homepage_settings.is_active:
+        return shop.id
+    return None
+
+
+def _slug_lookup(slug):
+    shop = Shop.query.filter_by(slug=slug, is_active=True).first()
+    return shop.id if shop else None
+
+
+def _cached_route(kind, value, lookup):
+    """Resolve one routing input to a shop id through the cache (0 = known miss)."""
+    try:
+        key = f"homepage:route:{_get_version(_ROUTING_VERSION_KEY)}:{kind}:{value}"
+        cached = cache.get(key)
+    except Exception as e:
+        logger.error(f"Homepage routing cache unavailable: {e}")
+        return lookup(value)
+    if cached is not None:
+        return cached or None
+
+    shop_id = lookup(value)
+    config = current_app.config
+    try:
+        if shop_id:
+            cache.set(key, shop_id, timeout=config.get('HOMEPAGE_ROUTE_TTL', DEFAULT_ROUTE_TTL))
+        else:
+            cache.set(key, 0, timeout=config.get('HOMEPAGE_MISS_TTL', DEFAULT_MISS_TTL))
+    except Exception as e:
+        logger.error(f"Failed to cache homepage route {kind}={value}: {e}")
+    return shop_id
+
+
+def resolve_shop_id(host, shop_id=None, shop_slug=None):
+    """
+    Shop id addressed by a request: custom domain, then subdomain, then the
+    shop_id and shop_slug query arguments. Returns None if none match.
+    """
+    if host:
+        resolved = _cached_route('host', host, _host_lookup)
+        if resolved:
+            return resolved
+    if shop_id:
+        try:
+            resolved = _cached_route('id', int(shop_id), _shop_id_lookup)
+        except ValueError:
+            resolved = None
+        if resolved:
+            return resolved
+    if shop_slug:
+        return _cached_route('slug', shop_slug, _slug_lookup)
+    return None
+
+
+def get_cached_page(shop_id):
+    """Cached anonymous homepage for a shop as {'html', 'etag'}, or None."""
+    try:
+        version = _get_version(_content_version_key(shop_id))
+        return cache.get(f"homepage:page:{shop_id}:{version}")
+    except Exception as e:
+        logger.error(f"Homepage page cache unavailable for shop {shop_id}: {e}")
+        return None
+
+
+def cache_page(shop_id, html):
+    """Store a rendered anonymous homepage and return it as {'html', 'etag'}."""
+    page = {'html': html, 'etag': hashlib.md5(html.encode('utf-8')).hexdigest()}
+    try:
+        version = _get_version(_content_version_key(shop_id))
+        cache.set(f"homepage:page:{shop_id}:{version}", page,
+                  timeout=current_app.config.get('HOMEPAGE_PAGE_TTL', DEFAULT_PAGE_TTL))
+    except Exception as e:
+        logger.error(f"Failed to cache homepage for shop {shop_id}: {e}")
+    return page
+
+
+# ---------------------------------------------------------------------------
+# Version maintenance
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _collect_homepage_changes(session, flush_context):
+    shops = session.info.setdefault('homepage_touched_shops', set())
+    # Collection-only changes (e.g. a sale appended to shop.sales) don't count
+    dirty = [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    for obj in list(session.new) + dirty + list(session.deleted):
+        if not isinstance(obj, CONTENT_MODELS):
+            continue
+        if isinstance(obj, ROUTING_MODELS):
+            session.info['homepage_routing_changed'] = True
+        shops.add(obj.id if isinstance(obj, Shop) else obj.shop_id)
+        if not isinstance(obj, Shop):
+            shops.update(inspect(obj).attrs.shop_id.history.deleted or ())
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_homepage_versions(session):
+    if session.info.pop('homepage_routing_changed', False):
+        _bump_version(_ROUTING_VERSION_KEY)
+    for shop_id in session.info.pop('homepage_touched_shops', None) or ():
+        if shop_id is not None:
+            _bump_version(_content_version_key(shop_id))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_homepage_changes(session):
+    session.info.pop('homepage_routing_changed', None)
+    session.info.pop('homepage_touched_shops', None)
@@ -4,14 +4,23 @@ from app.models import  Product, Category, Supplier, Expense ,AdjustmentType, St
 from app import socketio
 from app import db, csrf, role_required, shop_access_required, business_access_required
 from decimal import Decimal, InvalidOperation
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, date
 import logging
 from werkzeug.exceptions import BadRequest
 from app.utils.render import render_htmx
-from werkzeug.utils import secure_filename
-import os
+from app.inventory.services import (
+    GoodsReceivedService, GoodsReceivedError, CatalogImportService, ReorderPlanService,
+    StockTakeService, StockTakeError
+)
+from app.reports.services import SalesExportService, EXPORT_FORMATS
+from app.utils import stock_ledger
+from app.utils.low_stock import low_stock_query
+from app.utils.pagination import keyset_paginate, approximate_total, page_size
+from app.utils.product_images import store_product_image, ProductImageError
+from app.utils.valuation import moving_average
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -245,16 +254,10 @@ def delete_category(shop_id, id):
 @role_required(Role.ADMIN, Role.TENANT)
 def products(shop_id):
     search_query = request.args.get('search', '')
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = page_size(request.args.get('per_page'), 10)
 
     shop = g.current_shop
-
-    products_query = Product.query.filter(
-        Product.shop_id == shop.id,
-        Product.name.contains(search_query)
-    )
-    pagination = products_query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = _product_page(shop.id, search_query, per_page)
     products = pagination.items
 
     fragment_template = 'admin/fragments/_product_inventory.html'
@@ -265,9 +268,7 @@ def products(shop_id):
             fragment_template,
             products=products,
             pagination=pagination,
-            page=page,
             per_page=per_page,
-            total_pages=pagination.pages,
             total_items=pagination.total,
             search_query=search_query,
             shop=shop
@@ -278,9 +279,7 @@ def products(shop_id):
         fragment_template=fragment_template,
         products=products,
         pagination=pagination,
-        page=page,
         per_page=per_page,
-        total_pages=pagination.pages,
         total_items=pagination.total,
         search_query=search_query,
         active_page='products',
@@ -294,17 +293,10 @@ def products(shop_id):
 @role_required(Role.ADMIN, Role.TENANT)
 def products_fragment(shop_id):
     search_query = request.args.get('search', '')
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
+    per_page = page_size(request.args.get('per_page'), 10)
 
     shop = g.current_shop
-
-    products_query = Product.query.filter(
-        Product.shop_id == shop.id,
-        Product.name.contains(search_query)
-    )
-
-    pagination = products_query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = _product_page(shop.id, search_query, per_page)
     products = pagination.items
 
     template = (
@@ -316,11 +308,30 @@ def products_fragment(shop_id):
         template,
         products=products,
         pagination=pagination,
+        per_page=per_page,
         search_query=search_query,
         shop=shop
     )
 
 
+def _product_page(shop_id, search_query, per_page):
+    """A page of the shop's products by (name, id), following the request's cursor."""
+    products_query = Product.query.filter(Product.shop_id == shop_id)
+    if search_query:
+        products_query = products_query.filter(Product.name.contains(search_query))
+        total = None  # counters track the whole listing, not searches
+    else:
+        total = approximate_total(
+            'products', shop_id,
+            lambda: Product.query.filter(Product.shop_id == shop_id).count())
+
+    return keyset_paginate(
+        products_query, (Product.name, Product.id), lambda p: (p.name, p.id),
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=per_page, total=total
+    )
+
+
 
 @csrf.exempt
 @inventory_bp.route('/shops/<int:shop_id>/products/new', methods=['POST'])
@@ -626,15 +637,13 @@ def upload_product_image(shop_id, product_id):
     if not image_file:
         return jsonify({'error': 'No image uploaded'}), 400
 
-    filename = secure_filename(image_file.filename)
-    image_path = os.path.join('static', 'products', filename)
-    full_path = os.path.join(current_app.root_path, image_path)
-
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    image_file.save(full_path)
+    try:
+        image_url = store_product_image(image_file.stream)
+    except ProductImageError as e:
+        return jsonify({'error': str(e)}), 400
 
     if is_primary:
-        product.image_url = '/' + image_path.replace('\\', '/')
+        product.image_url = image_url
     else:
         # Assuming you plan to handle multiple images later, store references
         # You could optionally store them in a separate table
@@ -695,14 +704,17 @@ def update_product_stock(product, quantity_to_add, total_amount):
     if quantity_to_add <= 0:
         raise ValueError("Quantity to add must be positive.")
 
+    # A costed batch folds into the weighted average cost of the units on hand and
+    # becomes the last cost price; batches without a cost (returns) leave both alone
+    if total_amount > 0:
+        unit_cost = Decimal(str(total_amount)) / quantity_to_add
+        product.average_cost = moving_average(product.stock, product.valuation_cost, quantity_to_add, unit_cost)
+        product.cost_price = unit_cost
+
     # Update the stock with the quantity being added
+    stock_ledger.set_movement_context(db.session, stock_ledger.RECEIPT, reference_type='restock')
     product.stock += quantity_to_add
 
-    # Update cost price if quantity added is greater than 0
-    if quantity_to_add > 0:
-        new_cost_price = total_amount / quantity_to_add
-        product.cost_price = new_cost_price  # Update cost price in the product
-
     # Log the stock addition as an expense
     new_expense = Expense(
         description=f"Stock added for {product.name}",
@@ -894,6 +906,197 @@ def update_stock_product(shop_id: int, product_id: int):
 
 
 
+@inventory_bp.route('/shops/<int:shop_id>/products/import', methods=['POST'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def import_products(shop_id: int):
+    """Start a CSV/XLSX catalog import; progress arrives as catalog_import_* socket events."""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'message': 'No file uploaded.'}), 400
+    try:
+        import_id = CatalogImportService.start(shop_id, current_user.id, upload)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({
+        'import_id': import_id,
+        'status_url': url_for('inventory.import_products_status', shop_id=shop_id, import_id=import_id)
+    }), 202
+
+
+@inventory_bp.route('/shops/<int:shop_id>/products/import/<import_id>', methods=['GET'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def import_products_status(shop_id: int, import_id: str):
+    """Summary and per-row errors of a catalog import."""
+    status = CatalogImportService.get_status(import_id)
+    if not status or status.get('shop_id') != shop_id:
+        return jsonify({'message': 'Import not found.'}), 404
+    return jsonify(status), 200
+
+
+@inventory_bp.route('/shops/<int:shop_id>/reorder-plan', methods=['GET'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def reorder_plan(shop_id: int):
+    """
+    Today's reorder plan for this shop, or with ?scope=business (tenants) for
+    all of its business's shops. ?format=csv|xlsx downloads it; ?refresh=1
+    rebuilds it.
+    """
+    shop = g.current_shop
+    if request.args.get('scope') == 'business':
+        if not current_user.is_tenant():
+            return jsonify({'message': 'Only tenants can plan across the business.'}), 403
+        shop_ids = SalesExportService.scope_shop_ids(shop, 'business')
+        plan = ReorderPlanService.get_plan(shop_ids, 'business', shop.business_id,
+                                           refresh=request.args.get('refresh') == '1')
+    else:
+        plan = ReorderPlanService.get_plan([shop.id], 'shop', shop.id,
+                                           refresh=request.args.get('refresh') == '1')
+
+    fmt = request.args.get('format')
+    if fmt in EXPORT_FORMATS:
+        response = make_response(ReorderPlanService.export(plan, fmt))
+        response.headers['Content-Type'] = EXPORT_FORMATS[fmt]
+        response.headers['Content-Disposition'] = (
+            f"attachment; filename=reorder_plan_{plan['scope']}_{plan['scope_id']}_{plan['plan_date']}.{fmt}")
+        return response
+
+    return jsonify({key: value for key, value in plan.items() if key != 'cover'}), 200
+
+
+@inventory_bp.route('/shops/<int:shop_id>/goods-received', methods=['POST'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def receive_goods(shop_id: int):
+    """
+    Apply a goods-received note: JSON {"reference": "...", "lines": [{"product_id",
+    "quantity", "total_cost"}, ...]}. All lines are applied in one transaction.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        received = GoodsReceivedService.receive(
+            shop_id, current_user.id, data.get('lines'), reference=data.get('reference')
+        )
+    except GoodsReceivedError as e:
+        return jsonify({'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Goods received failed for shop {shop_id}: {e}")
+        return jsonify({'message': 'Database error. Please try again.'}), 500
+
+    return jsonify({
+        'message': f"Received stock for {len(received)} products.",
+        'products': received
+    }), 200
+
+
+@inventory_bp.route('/shops/<int:shop_id>/stock-takes', methods=['POST'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def start_stock_take(shop_id: int):
+    """Open a stock-take session: JSON {"note": "..."}. One open session per shop."""
+    data = request.get_json(silent=True) or {}
+    try:
+        stock_take = StockTakeService.start(shop_id, current_user.id, note=data.get('note'))
+    except StockTakeError as e:
+        return jsonify({'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Starting stock take failed for shop {shop_id}: {e}")
+        return jsonify({'message': 'Database error. Please try again.'}), 500
+
+    return jsonify({'message': 'Stock take started.', 'stock_take_id': stock_take.id}), 201
+
+
+@inventory_bp.route('/shops/<int:shop_id>/stock-takes/<int:stock_take_id>/counts', methods=['POST'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.CASHIER, Role.TENANT)
+def record_stock_take_counts(shop_id: int, stock_take_id: int):
+    """
+    Stage counts without touching stock: JSON {"mode": "set"|"add", "counts":
+    [{"product_id" | "barcode" | "sku", "quantity"}, ...]}. "set" replaces a
+    product's count, "add" accumulates scans.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        counted = StockTakeService.record_counts(
+            shop_id, stock_take_id, current_user.id, data.get('counts'), mode=data.get('mode', 'set')
+        )
+    except StockTakeError as e:
+        return jsonify({'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Recording stock take counts failed for shop {shop_id}: {e}")
+        return jsonify({'message': 'Database error. Please try again.'}), 500
+
+    return jsonify({'message': f"Recorded counts for {counted} products."}), 200
+
+
+@inventory_bp.route('/shops/<int:shop_id>/stock-takes/<int:stock_take_id>/reconcile', methods=['POST'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def reconcile_stock_take(shop_id: int, stock_take_id: int):
+    """Apply each count's variance against stock at count time; uncounted products are left alone."""
+    try:
+        summary = StockTakeService.reconcile(shop_id, stock_take_id, current_user.id)
+    except StockTakeError as e:
+        return jsonify({'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Reconciling stock take {stock_take_id} failed for shop {shop_id}: {e}")
+        return jsonify({'message': 'Database error. Please try again.'}), 500
+
+    return jsonify({
+        'message': f"Stock take reconciled: {summary['adjusted']} of {summary['counted']} products adjusted.",
+        **summary
+    }), 200
+
+
+@inventory_bp.route('/shops/<int:shop_id>/stock-takes/<int:stock_take_id>/cancel', methods=['POST'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def cancel_stock_take(shop_id: int, stock_take_id: int):
+    try:
+        StockTakeService.cancel(shop_id, stock_take_id)
+    except StockTakeError as e:
+        return jsonify({'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Cancelling stock take {stock_take_id} failed for shop {shop_id}: {e}")
+        return jsonify({'message': 'Database error. Please try again.'}), 500
+
+    return jsonify({'message': 'Stock take cancelled.'}), 200
+
+
+@inventory_bp.route('/shops/<int:shop_id>/stock-takes/<int:stock_take_id>/variance', methods=['GET'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def stock_take_variance(shop_id: int, stock_take_id: int):
+    """Variance report of a stock take, largest value first; ?format=csv downloads it."""
+    try:
+        report = StockTakeService.variance_report(shop_id, stock_take_id)
+    except StockTakeError as e:
+        return jsonify({'message': str(e)}), 404
+
+    if request.args.get('format') == 'csv':
+        response = make_response(StockTakeService.export_report(report))
+        response.headers['Content-Type'] = EXPORT_FORMATS['csv']
+        response.headers['Content-Disposition'] = (
+            f"attachment; filename=stock_take_{stock_take_id}_variance.csv")
+        return response
+
+    return jsonify(report), 200
+
+
 @inventory_bp.route('/shops/<int:shop_id>/api/low-stock-products', methods=['GET'])
 @login_required
 @shop_access_required
@@ -901,20 +1104,15 @@ def update_stock_product(shop_id: int, product_id: int):
 def get_low_stock_products(shop_id):
     shop = g.current_shop
 
-    # Get all categories in this shop
-    category_ids = Category.query.with_entities(Category.id).filter_by(shop_id=shop.id).subquery()
-
-    # Only fetch products belonging to this shop
-    low_stock_products = Product.query.filter(
-        Product.category_id.in_(category_ids),
-        Product.stock < 5
-    ).all()
+    # Each product against its own threshold, read from the low-stock index
+    low_stock_products = low_stock_query(shop.id).all()
 
     products_data = [
         {
             'id': product.id,
             'name': product.name,
             'stock': product.stock,
+            'low_stock_threshold': product.low_stock_threshold,
             'cost_price': product.cost_price,
             'selling_price': product.selling_price
         }
@@ -978,6 +1176,7 @@ def adjust_stock(shop_id, product_id):
                 return redirect(url_for('inventory.adjust_stock', shop_id=shop_id, product_id=product_id))
 
             stock_log = StockLog(
+                shop_id=product.shop_id,
                 product_id=product.id,
                 user_id=current_user.id,
                 previous_stock=product.stock,
@@ -1026,18 +1225,8 @@ def product_details_fragment(shop_id, product_id):
 @shop_access_required
 @role_required(Role.ADMIN, Role.TENANT)
 def stock_logs(shop_id):
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-
-    logs = db.session.query(
-        StockLog,
-        Product.name.label('product_name'),
-        User.username.label('user_name')
-    ).join(Product).join(Category).join(User).filter(
-        Category.shop_id == shop_id
-    ).order_by(StockLog.date.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    per_page = page_size(request.args.get('per_page'), 10)
+    logs = _stock_log_page(shop_id, per_page)
 
     if request.headers.get('HX-Request'):
         return render_template('admin/fragments/_stock_logs_table.html', logs=logs, shop_id=shop_id)
@@ -1050,6 +1239,26 @@ def stock_logs(shop_id):
     )
 
 
+def _stock_log_page(shop_id, per_page):
+    """A page of (log, product name, user name), newest first, following the request's cursor."""
+    query = db.session.query(
+        StockLog,
+        Product.name.label('product_name'),
+        User.username.label('user_name')
+    ).join(Product, StockLog.product_id == Product.id).join(User, StockLog.user_id == User.id).filter(
+        StockLog.shop_id == shop_id
+    )
+    total = approximate_total(
+        'stock_logs', shop_id,
+        lambda: db.session.query(func.count(StockLog.id)).filter(StockLog.shop_id == shop_id).scalar())
+
+    return keyset_paginate(
+        query, (StockLog.date, StockLog.id), lambda row: (row[0].date, row[0].id),
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=per_page, descending=True, total=total
+    )
+
+
 
 @inventory_bp.route('/shops/<int:shop_id>/api/stock-logs', methods=['GET'])
 @login_required
@@ -1057,18 +1266,7 @@ def stock_logs(shop_id):
 @role_required(Role.ADMIN, Role.TENANT)
 def get_stock_logs(shop_id):
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 25, type=int)
-
-        paginated_logs = db.session.query(
-            StockLog,
-            Product.name.label('product_name'),
-            User.username.label('user_name')
-        ).join(Product).join(Category).join(User).filter(
-            Category.shop_id == shop_id
-        ).order_by(StockLog.date.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        paginated_logs = _stock_log_page(shop_id, page_size(request.args.get('per_page'), 25))
 
         logs_data = [{
             'id': log.id,
@@ -1078,14 +1276,14 @@ def get_stock_logs(shop_id):
             'previous_stock': log.previous_stock,
             'new_stock': log.new_stock,
             'adjustment_type': log.adjustment_type.value,
-            'notes': log.notes or ''
+            'notes': log.change_reason or ''
         } for log, product_name, user_name in paginated_logs.items]
 
         return jsonify({
             'logs': logs_data,
             'total': paginated_logs.total,
-            'pages': paginated_logs.pages,
-            'current_page': paginated_logs.page
+            'next_cursor': paginated_logs.next_cursor,
+            'prev_cursor': paginated_logs.prev_cursor
         }), 200
 
     except Exception as e:
@@ -0,0 +1,1148 @@
+"""
+Inventory write services.
+
+GoodsReceivedService applies a delivery of many products as one unit of
+work: the affected product rows are locked and read in one query, stock and
+cost are updated with a single set-based UPDATE, the StockLog and Expense
+rows and the stock ledger movements are bulk inserted, and one coalesced
+socket event is emitted after the commit.
+
+CatalogImportService streams a CSV/XLSX product file in fixed-size chunks:
+categories and suppliers are resolved by name from in-memory maps, each
+chunk is upserted on barcode/SKU with INSERT ... ON CONFLICT and committed,
+row errors are collected, and progress is emitted over the socket.
+
+ReorderPlanService turns a shop's (or business's) recent sales into a daily
+reorder plan grouped by supplier, from two queries and one pass in Python.
+
+StockTakeService stages counts in an open stock-take session and
+reconciles them against live stock in one transaction.
+"""
+import csv
+import io
+import logging
+import math
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import case, update, or_, and_, insert, select, bindparam, cast, literal_column, String, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db, socketio, cache
+from app.utils import stock_ledger, category_counters
+from app.utils.pagination import adjust_total
+from app.utils.valuation import moving_average
+from app.models import (
+    Product, StockLog, Expense, AdjustmentType, Shop, Category, Supplier, UnitType,
+    Sale, CartItem, SaleStatus, StockTake, StockTakeCount, StockTakeStatus
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_LINES = 500
+
+
+class GoodsReceivedError(ValueError):
+    """A goods-received note that cannot be applied; nothing was written."""
+
+
+class GoodsReceivedService:
+
+    @staticmethod
+    def parse_lines(raw_lines):
+        """
+        Validate [{product_id, quantity, total_cost}] and merge repeated
+        products. Returns {product_id: (quantity, total_cost)}.
+        """
+        if not raw_lines:
+            raise GoodsReceivedError("At least one line is required.")
+        if len(raw_lines) > MAX_LINES:
+            raise GoodsReceivedError(f"A goods-received note may have at most {MAX_LINES} lines.")
+
+        lines = {}
+        for number, raw in enumerate(raw_lines, start=1):
+            try:
+                product_id = int(raw['product_id'])
+                quantity = int(raw['quantity'])
+                total_cost = Decimal(str(raw.get('total_cost', 0)))
+            except (KeyError, TypeError, ValueError, InvalidOperation):
+                raise GoodsReceivedError(f"Line {number}: product_id, quantity and total_cost are required.")
+            if quantity <= 0:
+                raise GoodsReceivedError(f"Line {number}: quantity must be a positive integer.")
+            if total_cost < 0:
+                raise GoodsReceivedError(f"Line {number}: total cost cannot be negative.")
+
+            previous_quantity, previous_cost = lines.get(product_id, (0, Decimal('0')))
+            lines[product_id] = (previous_quantity + quantity, previous_cost + total_cost)
+        return lines
+
+    @staticmethod
+    def receive(shop_id, user_id, raw_lines, reference=None):
+        """
+        Apply a goods-received note to a shop and commit. Returns one dict per
+        product with its previous and new stock and cost price.
+        """
+        lines = GoodsReceivedService.parse_lines(raw_lines)
+
+        try:
+            products = db.session.query(
+                Product.id, Product.name, Product.stock, Product.cost_price,
+                Product.valuation_cost.label('valuation_cost')
+            ).filter(
+                Product.shop_id == shop_id,
+                Product.id.in_(lines)
+            ).with_for_update().all()
+
+            missing = set(lines) - {p.id for p in products}
+            if missing:
+                raise GoodsReceivedError(
+                    f"Products not found in this shop: {', '.join(map(str, sorted(missing)))}")
+
+            # Unit cost of this delivery becomes the cost price, as with single restocks;
+            # lines received at no cost leave the cost price alone
+            unit_costs = {
+                product_id: (total_cost / quantity).quantize(Decimal('0.01'))
+                for product_id, (quantity, total_cost) in lines.items() if total_cost > 0
+            }
+            # ...and folds into the weighted average cost of the units on hand
+            average_costs = {
+                p.id: moving_average(p.stock, p.valuation_cost, lines[p.id][0], unit_costs[p.id])
+                for p in products if p.id in unit_costs
+            }
+            values = {'stock': Product.stock + case(
+                {product_id: quantity for product_id, (quantity, _) in lines.items()},
+                value=Product.id
+            )}
+            if unit_costs:
+                values['cost_price'] = case(unit_costs, value=Product.id, else_=Product.cost_price)
+                values['average_cost'] = case(average_costs, value=Product.id, else_=Product.average_cost)
+            db.session.execute(
+                update(Product).where(Product.id.in_(lines)).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+            reason = f"Goods received: {reference}" if reference else "Goods received"
+            db.session.bulk_insert_mappings(StockLog, [
+                {
+                    'shop_id': shop_id,
+                    'product_id': p.id,
+                    'user_id': user_id,
+                    'previous_stock': p.stock,
+                    'new_stock': p.stock + lines[p.id][0],
+                    'adjustment_type': AdjustmentType.addition,
+                    'change_reason': reason[:200],
+                    'log_metadata': {'reference': reference, 'total_cost': str(lines[p.id][1])},
+                }
+                for p in products
+            ])
+            stock_ledger.record_movements(db.session, [
+                {
+                    'shop_id': shop_id,
+                    'product_id': p.id,
+                    'movement_type': stock_ledger.RECEIPT,
+                    'quantity': lines[p.id][0],
+                    'stock_after': p.stock + lines[p.id][0],
+                    'reference_type': 'goods_received',
+                    'user_id': user_id,
+                }
+                for p in products
+            ])
+            db.session.bulk_insert_mappings(Expense, [
+                {
+                    'shop_id': shop_id,
+                    'product_id': p.id,
+                    'description': f"Stock added for {p.name}",
+                    'amount': lines[p.id][1],
+                    'category': "Stock Update",
+                    'quantity': lines[p.id][0],
+                }
+                for p in products if lines[p.id][1] > 0
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        received = [
+            {
+                'id': p.id,
+                'name': p.name,
+                'previous_stock': p.stock,
+                'stock': p.stock + lines[p.id][0],
+                'cost_price': float(unit_costs.get(p.id, p.cost_price) or 0),
+                'average_cost': float(average_costs.get(p.id, p.valuation_cost) or 0),
+            }
+            for p in products
+        ]
+        GoodsReceivedService._after_commit(shop_id, received)
+        return received
+
+    @staticmethod
+    def _after_commit(shop_id, received):
+        # Bulk statements bypass the ORM flush hooks, so drop the dashboards here
+        from app.admin.services import AdminDashboardProvider
+        from app.utils.dashboard_cache import invalidate_sections
+
+        AdminDashboardProvider.invalidate(shop_id)
+        adjust_total('stock_logs', shop_id, len(received))
+        business_id = db.session.query(Shop.business_id).filter(Shop.id == shop_id).scalar()
+        if business_id is not None:
+            invalidate_sections(business_id, ('overview', 'inventory', 'activity'))
+
+        try:
+            socketio.emit('stock_batch_updated', {
+                'shop_id': shop_id,
+                'products': [
+                    {'product_id': r['id'], 'name': r['name'], 'stock': r['stock'], 'cost_price': r['cost_price']}
+                    for r in received
+                ]
+            }, broadcast=True)
+        except Exception as e:
+            logger.error(f"Failed to emit stock batch for shop {shop_id}: {e}")
+
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_STATUS_TTL = 3600
+IMPORT_MAX_REPORTED_ERRORS = 200
+IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+MINIMUM_UNITS = (0.25, 0.5, 1, 2, 3)
+
+# Product columns refreshed when an imported row matches an existing product.
+# Stock is deliberately left alone: stock changes go through goods received
+# or adjustments so they are logged.
+IMPORT_UPDATE_COLUMNS = (
+    'name', 'description', 'cost_price', 'selling_price', 'low_stock_threshold',
+    'category_id', 'supplier_id', 'combination_size', 'combination_price',
+    'combination_unit_price', 'unit', 'minimum_unit', 'image_url', 'is_featured', 'updated_at',
+)
+
+
+def _cell(value):
+    """Normalise a CSV/XLSX cell to a stripped string ('' when empty)."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # barcodes and counts typed as numbers in Excel
+    return str(value).strip()
+
+
+def _iter_rows(path):
+    """Yield (row_number, {header: value}) one row at a time."""
+    if path.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_cell(h).lower().replace(' ', '_') for h in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                if any(v is not None for v in values):
+                    yield number, {h: _cell(v) for h, v in zip(header, values)}
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = [_cell(h).lower().replace(' ', '_') for h in next(reader, [])]
+            for number, values in enumerate(reader, start=2):
+                if any(values):
+                    yield number, {h: _cell(v) for h, v in zip(header, values)}
+
+
+def _validate_row(raw):
+    """
+    Apply the new-product rules to an import row. Returns (data, errors); the
+    category and supplier are still names at this point.
+    """
+    errors = []
+    data = {
+        'name': raw.get('name', ''),
+        'description': raw.get('description', ''),
+        'barcode': raw.get('barcode') or None,
+        'sku': raw.get('sku') or None,
+        'category': raw.get('category', ''),
+        'supplier': raw.get('supplier', ''),
+        'image_url': raw.get('image_url') or None,
+        'is_featured': raw.get('is_featured', '').lower() in ('1', 'true', 'yes'),
+    }
+    for field, label in (('name', 'Name'), ('category', 'Category')):
+        if not data[field]:
+            errors.append(f"{label} is required.")
+
+    numbers = (
+        ('cost_price', 'Cost Price', Decimal, True, None),
+        ('selling_price', 'Selling Price', Decimal, True, None),
+        ('stock', 'Stock', int, True, None),
+        ('low_stock_threshold', 'Low Stock Threshold', int, False, 10),
+        ('combination_size', 'Bundle Size', int, False, None),
+        ('combination_price', 'Bundle Price', Decimal, False, None),
+    )
+    for field, label, kind, required, default in numbers:
+        value = raw.get(field, '')
+        if not value:
+            if required:
+                errors.append(f"{label} is required.")
+            data[field] = default
+            continue
+        try:
+            data[field] = kind(value)
+        except (ValueError, InvalidOperation):
+            errors.append(f"{label} must be a valid number")
+            continue
+        if data[field] < 0:
+            errors.append(f"{label} must be a positive number")
+
+    if bool(data.get('combination_size')) != bool(data.get('combination_price')):
+        errors.append("Both bundle size and price must be provided if either is set")
+    data['combination_unit_price'] = (
+        data['combination_price'] / data['combination_size']
+        if data.get('combination_size') and data.get('combination_price') else None
+    )
+
+    try:
+        data['minimum_unit'] = float(raw.get('minimum_unit') or 1)
+        if data['minimum_unit'] not in MINIMUM_UNITS:
+            errors.append("Minimum unit must be one of: 0.25, 0.5, 1, 2, 3")
+    except ValueError:
+        errors.append("Minimum unit must be a valid number")
+
+    try:
+        data['unit'] = UnitType[raw.get('unit', '').upper()]
+    except KeyError:
+        errors.append(f"Invalid unit. Must be one of: {', '.join(u.name for u in UnitType)}")
+
+    if data['image_url'] and not data['image_url'].startswith(('http://', 'https://')):
+        errors.append("Image URL must start with http:// or https://")
+    return data, errors
+
+
+class CatalogImport:
+    """State of one import run: name maps, seen keys and the running summary."""
+
+    def __init__(self, import_id, shop_id, user_id):
+        self.import_id = import_id
+        self.shop_id = shop_id
+        self.user_id = user_id
+        self.categories = {
+            name.lower(): id_ for id_, name in db.session.query(Category.id, Category.name)
+            .filter(Category.shop_id == shop_id)
+        }
+        self.suppliers = {
+            name.lower(): id_ for id_, name in db.session.query(Supplier.id, Supplier.name)
+            .filter(Supplier.shop_id == shop_id)
+        }
+        self.uncommitted = []  # (kind, key) created in the current chunk's transaction
+        self.seen = {}  # ('barcode'|'sku'|'name', value) -> first row number
+        self.status = {
+            'import_id': import_id,
+            'shop_id': shop_id,
+            'state': 'running',
+            'processed': 0,
+            'created': 0,
+            'updated': 0,
+            'failed': 0,
+            'categories_created': 0,
+            'suppliers_created': 0,
+            'errors': [],
+        }
+
+    def fail_row(self, number, errors):
+        self.status['failed'] += 1
+        if len(self.status['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+            self.status['errors'].append({'row': number, 'errors': errors})
+
+    def resolve(self, kind, name):
+        """Id of the shop's category/supplier with this name, created if missing."""
+        names, model = (self.categories, Category) if kind == 'category' else (self.suppliers, Supplier)
+        key = name.lower()
+        if key not in names:
+            names[key] = db.session.execute(
+                insert(model).values(name=name, shop_id=self.shop_id).returning(model.id)
+            ).scalar()
+            self.uncommitted.append((kind, key))
+        return names[key]
+
+    def names_committed(self):
+        for kind, _ in self.uncommitted:
+            self.status[f"{'categories' if kind == 'category' else 'suppliers'}_created"] += 1
+        self.uncommitted = []
+
+    def names_rolled_back(self):
+        """Forget ids created in a rolled back chunk so later rows create them again."""
+        for kind, key in self.uncommitted:
+            (self.categories if kind == 'category' else self.suppliers).pop(key, None)
+        self.uncommitted = []
+
+
+class CatalogImportService:
+
+    @staticmethod
+    def start(shop_id, user_id, upload):
+        """Spool an uploaded file to disk and import it in the background. Returns the import id."""
+        extension = os.path.splitext(upload.filename or '')[1].lower()
+        if extension not in IMPORT_EXTENSIONS:
+            raise ValueError("Upload a .csv or .xlsx file.")
+
+        fd, path = tempfile.mkstemp(suffix=extension, prefix='catalog-import-')
+        with os.fdopen(fd, 'wb') as f:
+            upload.save(f)
+
+        import_id = uuid.uuid4().hex
+        CatalogImportService._set_status(import_id, {
+            'import_id': import_id, 'shop_id': shop_id, 'state': 'queued', 'processed': 0
+        })
+        threading.Thread(
+            target=CatalogImportService._run_in_background,
+            args=(current_app._get_current_object(), import_id, shop_id, user_id, path),
+            daemon=True
+        ).start()
+        return import_id
+
+    @staticmethod
+    def get_status(import_id):
+        return cache.get(f"catalog_import:{import_id}")
+
+    @staticmethod
+    def _set_status(import_id, status):
+        try:
+            cache.set(f"catalog_import:{import_id}", status, timeout=IMPORT_STATUS_TTL)
+        except Exception as e:
+            logger.error(f"Failed to store catalog import status {import_id}: {e}")
+
+    @staticmethod
+    def _run_in_background(app, import_id, shop_id, user_id, path):
+        with app.app_context():
+            try:
+                CatalogImportService.run(import_id, shop_id, user_id, path)
+            except Exception as e:
+                logger.error(f"Catalog import {import_id} failed: {e}", exc_info=True)
+                CatalogImportService._set_status(import_id, {
+                    'import_id': import_id, 'shop_id': shop_id, 'state': 'failed', 'message': str(e)
+                })
+            finally:
+                os.remove(path)
+
+    @staticmethod
+    def run(import_id, shop_id, user_id, path):
+        """Import a CSV/XLSX file chunk by chunk; returns the final status."""
+        run = CatalogImport(import_id, shop_id, user_id)
+        chunk = []
+        for number, raw in _iter_rows(path):
+            chunk.append((number, raw))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                CatalogImportService._import_chunk(run, chunk)
+                chunk = []
+        if chunk:
+            CatalogImportService._import_chunk(run, chunk)
+
+        run.status['state'] = 'completed'
+        CatalogImportService._set_status(import_id, run.status)
+        CatalogImportService._emit('catalog_import_completed', run)
+
+        from app.admin.services import AdminDashboardProvider
+        from app.utils.dashboard_cache import invalidate_sections
+        AdminDashboardProvider.invalidate(shop_id)
+        business_id = db.session.query(Shop.business_id).filter(Shop.id == shop_id).scalar()
+        if business_id is not None:
+            invalidate_sections(business_id, ('overview', 'inventory'))
+        return run.status
+
+    @staticmethod
+    def _import_chunk(run, chunk):
+        valid = []
+        for number, raw in chunk:
+            data, errors = _validate_row(raw)
+            for kind in ('barcode', 'sku', 'name'):
+                value = data[kind] if kind != 'name' else data['name'].lower()
+                if value and (kind, value) in run.seen:
+                    errors.append(f"Duplicate {kind} '{data[kind]}' (first seen on row {run.seen[(kind, value)]})")
+            if errors:
+                run.fail_row(number, errors)
+                continue
+            for kind in ('barcode', 'sku', 'name'):
+                value = data[kind] if kind != 'name' else data['name'].lower()
+                if value:
+                    run.seen[(kind, value)] = number
+            valid.append((number, data))
+
+        valid = CatalogImportService._check_conflicts(run, valid)
+        created_before, updated_before = run.status['created'], run.status['updated']
+        try:
+            rows = {'barcode': [], 'sku': [], None: []}
+            for number, data in valid:
+                row = {
+                    key: data[key] for key in (
+                        'name', 'description', 'barcode', 'sku', 'cost_price', 'selling_price',
+                        'stock', 'low_stock_threshold', 'combination_size', 'combination_price',
+                        'combination_unit_price', 'unit', 'minimum_unit', 'image_url', 'is_featured')
+                }
+                row.update(
+                    shop_id=run.shop_id,
+                    category_id=run.resolve('category', data['category']),
+                    supplier_id=run.resolve('supplier', data['supplier']) if data['supplier'] else None,
+                    is_active=True,
+                )
+                rows['barcode' if data['barcode'] else 'sku' if data['sku'] else None].append(row)
+
+            # Categories the chunk's existing products leave, recounted with those they join
+            touched = {row['category_id'] for batch in rows.values() for row in batch}
+            codes = {key: [row[key] for row in rows[key]] for key in ('barcode', 'sku')}
+            if codes['barcode'] or codes['sku']:
+                touched.update(category_id for category_id, in db.session.query(Product.category_id).filter(
+                    Product.shop_id == run.shop_id,
+                    or_(Product.barcode.in_(codes['barcode']), Product.sku.in_(codes['sku']))
+                ).distinct())
+
+            for key, batch in rows.items():
+                if batch:
+                    CatalogImportService._upsert(run, key, batch)
+            category_counters.recount(db.session.connection(), touched - {None})
+            db.session.commit()
+            run.names_committed()
+            adjust_total('products', run.shop_id, run.status['created'] - created_before)
+        except Exception as e:
+            db.session.rollback()
+            run.names_rolled_back()
+            run.status['created'], run.status['updated'] = created_before, updated_before
+            logger.error(f"Catalog import {run.import_id}: chunk failed: {e}")
+            for number, _ in valid:
+                run.fail_row(number, ["Could not be saved; please retry this row."])
+
+        run.status['processed'] += len(chunk)
+        CatalogImportService._set_status(run.import_id, run.status)
+        CatalogImportService._emit('catalog_import_progress', run)
+
+    @staticmethod
+    def _check_conflicts(run, valid):
+        """Drop rows whose barcode/SKU belongs to another shop or product, or whose name is taken."""
+        if not valid:
+            return valid
+        barcodes = [d['barcode'] for _, d in valid if d['barcode']]
+        skus = [d['sku'] for _, d in valid if d['sku']]
+        names = [d['name'] for _, d in valid]
+        existing = db.session.query(
+            Product.id, Product.shop_id, Product.barcode, Product.sku, Product.name
+        ).filter(or_(
+            Product.barcode.in_(barcodes),
+            Product.sku.in_(skus),
+            and_(Product.shop_id == run.shop_id, Product.name.in_(names))
+        )).all()
+        by_barcode = {p.barcode: p for p in existing if p.barcode}
+        by_sku = {p.sku: p for p in existing if p.sku}
+        by_name = {p.name: p for p in existing if p.shop_id == run.shop_id}
+
+        accepted = []
+        for number, data in valid:
+            errors = []
+            target = by_barcode.get(data['barcode']) if data['barcode'] else None
+            if target is not None and target.shop_id != run.shop_id:
+                errors.append(f"Barcode {data['barcode']} is already used by another shop.")
+            sku_owner = by_sku.get(data['sku']) if data['sku'] else None
+            if sku_owner is not None:
+                if sku_owner.shop_id != run.shop_id or (data['barcode'] and (target is None or sku_owner.id != target.id)):
+                    errors.append(f"SKU {data['sku']} belongs to another product.")
+                elif target is None:
+                    target = sku_owner
+            name_owner = by_name.get(data['name'])
+            if name_owner is not None and (target is None or name_owner.id != target.id):
+                errors.append("A product with this name already exists in this shop.")
+            if errors:
+                run.fail_row(number, errors)
+            else:
+                accepted.append((number, data))
+        return accepted
+
+    @staticmethod
+    def _upsert(run, key, batch):
+        """INSERT ... ON CONFLICT on barcode or SKU (or plain INSERT for unkeyed rows)."""
+        stmt = pg_insert(Product).values(batch)
+        if key:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[key],
+                # An imported cost price restarts the product's weighted average cost
+                set_={**{column: stmt.excluded[column] for column in IMPORT_UPDATE_COLUMNS},
+                      'average_cost': None},
+                where=Product.shop_id == stmt.excluded.shop_id
+            )
+        results = db.session.execute(
+            stmt.returning(Product.id, Product.stock, literal_column('(xmax = 0)').label('inserted'))
+        ).all()
+        created = [r.id for r in results if r.inserted]
+        stock_ledger.record_movements(db.session, [
+            {
+                'shop_id': run.shop_id,
+                'product_id': r.id,
+                'movement_type': stock_ledger.OPENING,
+                'quantity': r.stock,
+                'stock_after': r.stock,
+                'reference_type': 'catalog_import',
+                'user_id': run.user_id,
+            }
+            for r in results if r.inserted and r.stock
+        ])
+        run.status['created'] += len(created)
+        run.status['updated'] += len(results) - len(created)
+
+        if key is None and created:
+            # Same fallback as single product creation: SKU defaults to the id
+            db.session.execute(
+                update(Product).where(Product.id.in_(created), Product.sku.is_(None))
+                .values(sku=cast(Product.id, String))
+                .execution_options(synchronize_session=False)
+            )
+
+    @staticmethod
+    def _emit(event_name, run):
+        """Send import progress to the importing user only."""
+        try:
+            socketio.emit(event_name, {k: v for k, v in run.status.items() if k != 'errors'},
+                          room=f"user_{run.user_id}")
+        except Exception as e:
+            logger.error(f"Failed to emit {event_name}: {e}")
+
+
+REORDER_HISTORY_DAYS = 56
+REORDER_SMOOTHING = 0.3
+REORDER_WARMUP_DAYS = 7
+REORDER_SERVICE_Z = 1.65  # ~95% cycle service level
+REORDER_PLAN_TTL = 24 * 3600
+
+REORDER_EXPORT_COLUMNS = (
+    ('supplier_name', 'Supplier'),
+    ('shop_name', 'Shop'),
+    ('name', 'Product'),
+    ('sku', 'SKU'),
+    ('stock', 'Stock'),
+    ('daily_demand', 'Daily Demand'),
+    ('days_of_cover', 'Days of Cover'),
+    ('reorder_point', 'Reorder Point'),
+    ('suggested_qty', 'Suggested Qty'),
+    ('unit_cost', 'Unit Cost'),
+    ('order_value', 'Order Value'),
+)
+
+
+class ReorderPlanService:
+    """
+    Daily reorder plan for a shop or a whole business, computed in one pass:
+    one grouped query for daily unit sales of every product over the
+    history window, one for the products themselves, then per product
+    exponentially smoothed demand and error, days of cover, a reorder point
+    covering the lead time at the target service level, and an order-up-to
+    quantity that also covers the review period. Lines are grouped by
+    supplier and the plan is cached for the rest of the day.
+    """
+
+    @staticmethod
+    def _cache_key(scope, scope_id, plan_date):
+        return f"reorder_plan:{scope}:{scope_id}:{plan_date.isoformat()}"
+
+    @staticmethod
+    def get_plan(shop_ids, scope, scope_id, refresh=False):
+        """The cached plan for today, built on first request (or when refresh is set)."""
+        from app.utils.time import shop_today
+
+        plan_date = shop_today(shop_ids[0]) if shop_ids else datetime.utcnow().date()
+        key = ReorderPlanService._cache_key(scope, scope_id, plan_date)
+        if not refresh:
+            try:
+                plan = cache.get(key)
+                if plan is not None:
+                    return plan
+            except Exception as e:
+                logger.error(f"Reorder plan cache unavailable for {scope} {scope_id}: {e}")
+
+        plan = ReorderPlanService.build(shop_ids, plan_date)
+        plan.update(scope=scope, scope_id=scope_id)
+        try:
+            cache.set(key, plan, timeout=REORDER_PLAN_TTL)
+        except Exception as e:
+            logger.error(f"Failed to cache reorder plan for {scope} {scope_id}: {e}")
+        return plan
+
+    @staticmethod
+    def build(shop_ids, plan_date):
+        config = current_app.config
+        lead_time = config.get('REORDER_LEAD_TIME_DAYS', 7)
+        review_period = config.get('REORDER_REVIEW_DAYS', 7)
+        start = plan_date - timedelta(days=REORDER_HISTORY_DAYS)
+
+        # Complete business days only: today's partial sales would read as a dip
+        demand = {}
+        for product_id, day, quantity in db.session.query(
+            CartItem.product_id, Sale.business_date, func.sum(CartItem.quantity)
+        ).join(Sale, CartItem.sale_id == Sale.id).filter(
+            Sale.shop_id.in_(shop_ids),
+            Sale.business_date >= start,
+            Sale.business_date < plan_date,
+            Sale.is_deleted == False,  # noqa: E712
+            Sale.status != SaleStatus.CANCELLED
+        ).group_by(CartItem.product_id, Sale.business_date):
+            demand.setdefault(product_id, {})[(day - start).days] = float(quantity)
+
+        products = db.session.query(
+            Product.id, Product.name, Product.sku, Product.stock, Product.cost_price,
+            Product.created_at, Product.shop_id, Shop.name.label('shop_name'),
+            Product.supplier_id, Supplier.name.label('supplier_name')
+        ).join(Shop, Shop.id == Product.shop_id).outerjoin(
+            Supplier, Supplier.id == Product.supplier_id
+        ).filter(
+            Product.shop_id.in_(shop_ids),
+            Product.is_deleted == False,  # noqa: E712
+            Product.is_active == True  # noqa: E712
+        ).all()
+
+        suppliers, cover = {}, {}
+        for p in products:
+            first_day = 0
+            if p.created_at is not None:
+                first_day = min(max((p.created_at.date() - start).days, 0), REORDER_HISTORY_DAYS)
+            rate, error = _smoothed_demand(demand.get(p.id, {}), first_day, REORDER_HISTORY_DAYS)
+
+            stock = p.stock or 0
+            days_of_cover = round(stock / rate, 1) if rate > 0 else None
+            cover[p.id] = days_of_cover
+            if rate <= 0:
+                continue
+
+            safety_stock = REORDER_SERVICE_Z * error * math.sqrt(lead_time)
+            reorder_point = rate * lead_time + safety_stock
+            if stock > reorder_point:
+                continue
+            suggested = math.ceil(reorder_point + rate * review_period - stock)
+            unit_cost = float(p.cost_price or 0)
+
+            group = suppliers.setdefault(p.supplier_id, {
+                'supplier_id': p.supplier_id,
+                'supplier_name': p.supplier_name or 'No supplier',
+                'lines': [],
+                'total_qty': 0,
+                'total_value': 0.0,
+            })
+            group['lines'].append({
+                'product_id': p.id,
+                'name': p.name,
+                'sku': p.sku,
+                'shop_id': p.shop_id,
+                'shop_name': p.shop_name,
+                'supplier_name': group['supplier_name'],
+                'stock': stock,
+                'daily_demand': round(rate, 2),
+                'days_of_cover': days_of_cover,
+                'reorder_point': math.ceil(reorder_point),
+                'suggested_qty': suggested,
+                'unit_cost': unit_cost,
+                'order_value': round(suggested * unit_cost, 2),
+            })
+            group['total_qty'] += suggested
+            group['total_value'] = round(group['total_value'] + suggested * unit_cost, 2)
+
+        for group in suppliers.values():
+            group['lines'].sort(key=lambda line: line['days_of_cover'])
+
+        return {
+            'plan_date': plan_date.isoformat(),
+            'generated_at': datetime.utcnow().isoformat(),
+            'shop_ids': list(shop_ids),
+            'parameters': {
+                'history_days': REORDER_HISTORY_DAYS,
+                'smoothing': REORDER_SMOOTHING,
+                'lead_time_days': lead_time,
+                'review_days': review_period,
+                'service_z': REORDER_SERVICE_Z,
+            },
+            'suppliers': sorted(suppliers.values(), key=lambda g: g['total_value'], reverse=True),
+            'cover': cover,
+        }
+
+    @staticmethod
+    def urgent_lines(plan, limit=5):
+        """The plan's lines with the least cover, across suppliers."""
+        lines = [line for group in plan['suppliers'] for line in group['lines']]
+        return sorted(lines, key=lambda line: line['days_of_cover'])[:limit]
+
+    @staticmethod
+    def export_rows(plan):
+        yield [header for _, header in REORDER_EXPORT_COLUMNS]
+        for group in plan['suppliers']:
+            for line in group['lines']:
+                yield [line[key] for key, _ in REORDER_EXPORT_COLUMNS]
+
+    @staticmethod
+    def export(plan, fmt):
+        """The plan as CSV or XLSX bytes, one row per suggested order line."""
+        if fmt == 'xlsx':
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet(f"Reorder {plan['plan_date']}")
+            for row in ReorderPlanService.export_rows(plan):
+                sheet.append(row)
+            buffer = io.BytesIO()
+            workbook.save(buffer)
+            return buffer.getvalue()
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(ReorderPlanService.export_rows(plan))
+        return buffer.getvalue().encode('utf-8')
+
+
+def _smoothed_demand(daily, first_day, days):
+    """
+    Simple exponential smoothing over the zero-filled daily series
+    [first_day, days). Returns (level, smoothed absolute error scaled to a
+    standard deviation).
+    """
+    series = [daily.get(day, 0.0) for day in range(first_day, days)]
+    if not series:
+        return 0.0, 0.0
+    warmup = series[:REORDER_WARMUP_DAYS]
+    level = sum(warmup) / len(warmup)
+    error = sum(abs(x - level) for x in warmup) / len(warmup)
+    for x in series[len(warmup):]:
+        error = REORDER_SMOOTHING * abs(x - level) + (1 - REORDER_SMOOTHING) * error
+        level = REORDER_SMOOTHING * x + (1 - REORDER_SMOOTHING) * level
+    # Mean absolute deviation to standard deviation (normal demand)
+    return level, error * 1.25
+
+
+STOCK_TAKE_MAX_COUNTS = 5000
+
+
+class StockTakeError(ValueError):
+    """A stock-take operation that cannot be applied; nothing was written."""
+
+
+class StockTakeService:
+    """
+    Stock-take sessions: counts are staged per session without touching
+    live stock, then reconciled in one transaction. Reconciliation locks
+    the counted products, reads from the ledger what stock each product had
+    when it was counted, stores expected stock and variance for every count
+    and applies the variances to live stock as adjustments (executemany
+    UPDATEs, bulk inserted ledger movements and stock logs). With "add"
+    counts, a product's count time is its last scan.
+    """
+
+    @staticmethod
+    def get_open(shop_id):
+        return StockTake.query.filter_by(shop_id=shop_id, status=StockTakeStatus.OPEN).first()
+
+    @staticmethod
+    def start(shop_id, user_id, note=None):
+        if StockTakeService.get_open(shop_id) is not None:
+            raise StockTakeError("This shop already has an open stock take.")
+        stock_take = StockTake(shop_id=shop_id, started_by=user_id, note=(note or '')[:200] or None)
+        db.session.add(stock_take)
+        db.session.commit()
+        return stock_take
+
+    @staticmethod
+    def _get(shop_id, stock_take_id, lock=False):
+        query = StockTake.query.filter_by(id=stock_take_id, shop_id=shop_id)
+        if lock:
+            query = query.with_for_update()
+        stock_take = query.first()
+        if stock_take is None:
+            raise StockTakeError("Stock take not found.")
+        return stock_take
+
+    @staticmethod
+    def parse_counts(shop_id, raw_counts, mode):
+        """
+        Resolve [{product_id | barcode | sku, quantity}] to {product_id: quantity},
+        merging repeats (summed when adding scans, last one wins when setting).
+        """
+        if mode not in ('set', 'add'):
+            raise StockTakeError("Mode must be 'set' or 'add'.")
+        if not raw_counts:
+            raise StockTakeError("At least one count is required.")
+        if len(raw_counts) > STOCK_TAKE_MAX_COUNTS:
+            raise StockTakeError(f"Send at most {STOCK_TAKE_MAX_COUNTS} counts per request.")
+
+        codes = {str(raw.get(kind)) for raw in raw_counts for kind in ('barcode', 'sku') if raw.get(kind)}
+        by_code = {}
+        if codes:
+            for product_id, barcode, sku in db.session.query(Product.id, Product.barcode, Product.sku).filter(
+                Product.shop_id == shop_id,
+                or_(Product.barcode.in_(codes), Product.sku.in_(codes))
+            ):
+                by_code[('barcode', barcode)] = product_id
+                by_code[('sku', sku)] = product_id
+
+        counts = {}
+        for number, raw in enumerate(raw_counts, start=1):
+            try:
+                quantity = int(raw['quantity'])
+                if raw.get('product_id') is not None:
+                    product_id = int(raw['product_id'])
+                else:
+                    kind = 'barcode' if raw.get('barcode') else 'sku'
+                    product_id = by_code.get((kind, str(raw.get(kind))))
+            except (KeyError, TypeError, ValueError):
+                raise StockTakeError(f"Count {number}: a product and a whole quantity are required.")
+            if product_id is None:
+                raise StockTakeError(f"Count {number}: no product with that barcode/SKU in this shop.")
+            if quantity < 0:
+                raise StockTakeError(f"Count {number}: quantity cannot be negative.")
+            counts[product_id] = counts.get(product_id, 0) + quantity if mode == 'add' else quantity
+
+        known = {row.id for row in db.session.query(Product.id).filter(
+            Product.shop_id == shop_id, Product.id.in_(list(counts)))}
+        missing = set(counts) - known
+        if missing:
+            raise StockTakeError(
+                f"Products not found in this shop: {', '.join(map(str, sorted(missing)))}")
+        return counts
+
+    @staticmethod
+    def record_counts(shop_id, stock_take_id, user_id, raw_counts, mode='set'):
+        """Stage counts with one upsert. Returns the number of products counted in this batch."""
+        try:
+            stock_take = StockTakeService._get(shop_id, stock_take_id)
+            if stock_take.status != StockTakeStatus.OPEN:
+                raise StockTakeError("This stock take is closed.")
+            counts = StockTakeService.parse_counts(shop_id, raw_counts, mode)
+
+            now = datetime.utcnow()
+            stmt = pg_insert(StockTakeCount).values([
+                {
+                    'stock_take_id': stock_take.id,
+                    'product_id': product_id,
+                    'counted': quantity,
+                    'counted_by': user_id,
+                    'counted_at': now,
+                }
+                for product_id, quantity in counts.items()
+            ])
+            counted = stmt.excluded.counted
+            if mode == 'add':
+                counted = StockTakeCount.counted + stmt.excluded.counted
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['stock_take_id', 'product_id'],
+                set_={'counted': counted, 'counted_by': stmt.excluded.counted_by,
+                      'counted_at': stmt.excluded.counted_at, 'updated_at': now}
+            ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(counts)
+
+    @staticmethod
+    def cancel(shop_id, stock_take_id):
+        stock_take = StockTakeService._get(shop_id, stock_take_id)
+        if stock_take.status != StockTakeStatus.OPEN:
+            raise StockTakeError("This stock take is closed.")
+        stock_take.status = StockTakeStatus.CANCELLED
+        db.session.commit()
+        return stock_take
+
+    @staticmethod
+    def _expected_at_count(counts):
+        """
+        {product_id: stock at the moment it was counted} for rows with
+        product_id and counted_at, from the stock ledger. Counts recorded in
+        one request share a timestamp, so this is one ledger read per batch.
+        """
+        batches = {}
+        for row in counts:
+            batches.setdefault(row.counted_at, []).append(row.product_id)
+        expected = {}
+        for counted_at, product_ids in batches.items():
+            for product_id, level in stock_ledger.stock_at(product_ids, counted_at).items():
+                expected[product_id] = int(level)
+        return expected
+
+    @staticmethod
+    def reconcile(shop_id, stock_take_id, user_id):
+        """
+        Apply an open stock take to live stock in one transaction. Each
+        count is compared with the stock at the moment it was taken, and the
+        variance is applied to live stock as an adjustment, so sales and
+        receipts between counting and reconciling are kept. Products that
+        were not counted are left alone. Returns the variance summary.
+        """
+        counts = StockTakeCount.__table__
+        products = Product.__table__
+        try:
+            stock_take = StockTakeService._get(shop_id, stock_take_id, lock=True)
+            if stock_take.status != StockTakeStatus.OPEN:
+                raise StockTakeError("This stock take is closed.")
+
+            # Lock the counted products so sales wait for the adjusted levels
+            rows = db.session.execute(
+                select(counts.c.product_id, counts.c.counted, counts.c.counted_at, products.c.stock)
+                .select_from(counts.join(products, products.c.id == counts.c.product_id))
+                .where(counts.c.stock_take_id == stock_take.id)
+                .with_for_update(of=products)
+            ).all()
+            expected = StockTakeService._expected_at_count(rows)
+
+            variances = [
+                {
+                    'product_id': row.product_id,
+                    'expected': expected.get(row.product_id, row.stock),
+                    'variance': row.counted - expected.get(row.product_id, row.stock),
+                    'stock': row.stock,
+                }
+                for row in rows
+            ]
+            if variances:
+                db.session.execute(
+                    update(counts).where(
+                        counts.c.stock_take_id == stock_take.id,
+                        counts.c.product_id == bindparam('b_product_id')
+                    ).values(expected=bindparam('b_expected'), variance=bindparam('b_variance')),
+                    [{'b_product_id': v['product_id'], 'b_expected': v['expected'], 'b_variance': v['variance']}
+                     for v in variances]
+                )
+
+            changed = []
+            for v in variances:
+                # Stock cannot be adjusted below zero
+                new_stock = max(v['stock'] + v['variance'], 0)
+                if new_stock != v['stock']:
+                    changed.append({**v, 'new_stock': new_stock, 'quantity': new_stock - v['stock']})
+
+            if changed:
+                now = datetime.utcnow()
+                db.session.execute(
+                    update(products).where(products.c.id == bindparam('b_product_id')).values(
+                        stock=products.c.stock + bindparam('b_quantity'), updated_at=now
+                    ),
+                    [{'b_product_id': c['product_id'], 'b_quantity': c['quantity']} for c in changed]
+                )
+                stock_ledger.record_movements(db.session, [
+                    {
+                        'shop_id': shop_id,
+                        'product_id': c['product_id'],
+                        'movement_type': stock_ledger.ADJUSTMENT,
+                        'quantity': c['quantity'],
+                        'stock_after': c['new_stock'],
+                        'reference_type': 'stock_take',
+                        'reference_id': stock_take.id,
+                        'user_id': user_id,
+                    }
+                    for c in changed
+                ])
+                db.session.bulk_insert_mappings(StockLog, [
+                    {
+                        'shop_id': shop_id,
+                        'product_id': c['product_id'],
+                        'user_id': user_id,
+                        'previous_stock': c['stock'],
+                        'new_stock': c['new_stock'],
+                        'adjustment_type': AdjustmentType.inventory_adjustment,
+                        'change_reason': f"Stock take #{stock_take.id}",
+                        'log_metadata': {'stock_take_id': stock_take.id, 'variance': c['variance'],
+                                         'expected_at_count': c['expected']},
+                    }
+                    for c in changed
+                ])
+
+            stock_take.status = StockTakeStatus.RECONCILED
+            stock_take.reconciled_by = user_id
+            stock_take.reconciled_at = datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if changed:
+            StockTakeService._after_commit(shop_id, changed)
+        return {
+            'stock_take_id': stock_take_id,
+            'counted': len(variances),
+            'adjusted': len(changed),
+            'units_over': sum(v['variance'] for v in variances if v['variance'] > 0),
+            'units_short': -sum(v['variance'] for v in variances if v['variance'] < 0),
+        }
+
+    @staticmethod
+    def _after_commit(shop_id, changed):
+        from app.admin.services import AdminDashboardProvider
+        from app.utils.dashboard_cache import invalidate_sections
+
+        AdminDashboardProvider.invalidate(shop_id)
+        adjust_total('stock_logs', shop_id, len(changed))
+        business_id = db.session.query(Shop.business_id).filter(Shop.id == shop_id).scalar()
+        if business_id is not None:
+            invalidate_sections(business_id, ('overview', 'inventory', 'activity'))
+        try:
+            socketio.emit('stock_batch_updated', {
+                'shop_id': shop_id,
+                'products': [{'product_id': c['product_id'], 'stock': c['new_stock']} for c in changed]
+            }, broadcast=True)
+        except Exception as e:
+            logger.error(f"Failed to emit stock take update for shop {shop_id}: {e}")
+
+    @staticmethod
+    def variance_report(shop_id, stock_take_id):
+        """
+        Per-product variance of a stock take, valued at weighted average cost,
+        against the stock at the moment each product was counted (as fixed at
+        reconciliation, or read from the ledger while the session is open).
+        """
+        stock_take = StockTakeService._get(shop_id, stock_take_id)
+        reconciled = stock_take.status == StockTakeStatus.RECONCILED
+
+        rows = db.session.query(
+            StockTakeCount.product_id, StockTakeCount.counted, StockTakeCount.counted_at,
+            StockTakeCount.expected, Product.name, Product.sku, Product.stock,
+            Product.valuation_cost.label('unit_cost')
+        ).join(Product, Product.id == StockTakeCount.product_id).filter(
+            StockTakeCount.stock_take_id == stock_take.id
+        ).order_by(Product.name).all()
+        at_count = {} if reconciled else StockTakeService._expected_at_count(rows)
+
+        lines, total_value = [], 0.0
+        for row in rows:
+            expected = row.expected if reconciled else at_count.get(row.product_id, row.stock)
+            variance = row.counted - (expected or 0)
+            value = round(variance * float(row.unit_cost or 0), 2)
+            total_value += value
+            lines.append({
+                'product_id': row.product_id,
+                'name': row.name,
+                'sku': row.sku,
+                'expected': expected,
+                'counted': row.counted,
+                'variance': variance,
+                'variance_value': value,
+            })
+        lines.sort(key=lambda line: abs(line['variance_value']), reverse=True)
+
+        uncounted = db.session.query(func.count(Product.id)).filter(
+            Product.shop_id == shop_id,
+            Product.is_deleted == False,  # noqa: E712
+            Product.is_active == True,  # noqa: E712
+            ~Product.id.in_(select(StockTakeCount.product_id).where(
+                StockTakeCount.stock_take_id == stock_take.id))
+        ).scalar()
+
+        return {
+            'stock_take_id': stock_take.id,
+            'status': stock_take.status.value,
+            'started_at': stock_take.created_at.isoformat() if stock_take.created_at else None,
+            'reconciled_at': stock_take.reconciled_at.isoformat() if stock_take.reconciled_at else None,
+            'counted': len(lines),
+            'with_variance': sum(1 for line in lines if line['variance']),
+            'uncounted_products': uncounted or 0,
+            'variance_value': round(total_value, 2),
+            'lines': lines,
+        }
+
+    @staticmethod
+    def export_report(report):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Product', 'SKU', 'Expected', 'Counted', 'Variance', 'Variance Value'])
+        for line in report['lines']:
+            writer.writerow([line['name'], line['sku'], line['expected'], line['counted'],
+                             line['variance'], line['variance_value']])
+        return buffer.getvalue().encode('utf-8')
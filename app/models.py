@@ -333,6 +333,13 @@ class Shop(BaseModel, BusinessScopedMixin):
         uselist=False,
         cascade='all, delete-orphan'
     )
+    product_affinities = db.relationship('ProductAffinity', back_populates='shop', cascade="all, delete-orphan", lazy='dynamic')
+    basket_window_stats = db.relationship('BasketWindowStat', back_populates='shop', cascade="all, delete-orphan", lazy='dynamic')
+    shop_daily_sales = db.relationship('ShopDailySales', back_populates='shop', cascade="all, delete-orphan", lazy='dynamic')
+    stock_movements = db.relationship('StockMovement', back_populates='shop', cascade="all, delete-orphan", lazy='dynamic')
+    stock_snapshots = db.relationship('StockSnapshot', back_populates='shop', cascade="all, delete-orphan", lazy='dynamic')
+    inventory_valuations = db.relationship('InventoryValuation', back_populates='shop', cascade="all, delete-orphan", lazy='dynamic')
+    stock_takes = db.relationship('StockTake', back_populates='shop', cascade="all, delete-orphan", lazy='dynamic')
     shop_adverts = db.relationship(  # Renamed from adverts to shop_adverts
         'ShopAdvert',
         back_populates='shop',
@@ -864,9 +871,14 @@ class Category(BaseModel, ShopScopedMixin):
     is_active = db.Column(Boolean, default=True)
     position = db.Column(Integer, default=0)
     image_url = db.Column(String(255))
+
+    # Product counters maintained by app.utils.category_counters
+    total_product_count = db.Column(Integer, nullable=False, default=0, server_default=text("0"))
+    active_product_count = db.Column(Integer, nullable=False, default=0, server_default=text("0"))
+    in_stock_product_count = db.Column(Integer, nullable=False, default=0, server_default=text("0"))
     
-    # Relationship with explicit back_populates
-    products = db.relationship('Product', back_populates='category', lazy='selectin')
+    # Relationship with explicit back_populates; loaded only where products are shown
+    products = db.relationship('Product', back_populates='category', lazy='select')
 
     
     __table_args__ = (
@@ -875,11 +887,16 @@ class Category(BaseModel, ShopScopedMixin):
 
     @property
     def active_products(self):
-        return [p for p in self.products if p.is_active and p.stock > 0]
+        """Active, in-stock products, read from the database"""
+        return Product.query.filter(
+            Product.category_id == self.id,
+            Product.is_active == True,
+            Product.stock > 0
+        ).order_by(Product.name).all()
 
     @property
     def product_count(self):
-        return len(self.active_products)
+        return self.in_stock_product_count or 0
 
 
     def serialize(self, include_products=False):
@@ -890,6 +907,8 @@ class Category(BaseModel, ShopScopedMixin):
             'position': self.position,
             'image_url': self.image_url,
             'product_count': self.product_count,
+            'active_product_count': self.active_product_count or 0,
+            'total_product_count': self.total_product_count or 0,
             'shop_id': self.shop_id
         }
         
@@ -945,6 +964,10 @@ class Sale(BaseModel, ShopScopedMixin):
     register_session_id = db.Column(Integer, db.ForeignKey('register_sessions.id'), nullable=True)
     user_id = db.Column(Integer, db.ForeignKey('users.id'))
 
+    # Local business day/hour in the shop's timezone, set on insert (see set_sale_business_time)
+    business_date = db.Column(db.Date, nullable=True)
+    business_hour = db.Column(db.SmallInteger, nullable=True)
+
     # Relationships
     cart_items = relationship('CartItem', back_populates='sale')
     user = relationship('User')
@@ -953,6 +976,7 @@ class Sale(BaseModel, ShopScopedMixin):
         db.Index('ix_sale_total', 'total'),
         db.Index('ix_sale_date', 'date'),
         db.Index('ix_sale_shop_date', 'shop_id', 'date'),
+        db.Index('ix_sale_shop_business_date', 'shop_id', 'business_date', 'business_hour'),
         db.Index('ix_sale_session', 'register_session_id'),
         db.Index('ix_sale_user', 'user_id'),
         db.Index('ix_sale_payment', 'payment_method'),
@@ -973,6 +997,7 @@ class Sale(BaseModel, ShopScopedMixin):
         return {
             'id': self.id,
             'date': self.date.strftime("%Y-%m-%d %H:%M:%S"),
+            'business_date': self.business_date.isoformat() if self.business_date else None,
             'total': self.total,
             'profit': self.profit,
             'payment_method': self.payment_method,
@@ -1023,6 +1048,22 @@ class Sale(BaseModel, ShopScopedMixin):
         return f'<Sale id={self.id}, total={self.total}, date={self.date.strftime("%Y-%m-%d %H:%M:%S")}>'
 
 
+@event.listens_for(Sale, 'before_insert')
+@event.listens_for(Sale, 'before_update')
+def set_sale_business_time(mapper, connection, target):
+    """Stamp business_date/business_hour from the UTC sale date in the shop's timezone."""
+    from app.utils.time import get_shop_timezone, to_business_time
+
+    if target.date is None:
+        target.date = datetime.utcnow()
+    elif target.business_date is not None and not sa.inspect(target).attrs.date.history.has_changes():
+        return
+
+    local = to_business_time(target.date, get_shop_timezone(target.shop_id, connection))
+    target.business_date = local.date()
+    target.business_hour = local.hour
+
+
 class CartItem(BaseModel, ShopScopedMixin):
     __tablename__ = 'cart_items'
 
@@ -1129,6 +1170,7 @@ class Product(BaseModel, ShopScopedMixin):
     
     # Pricing Information
     cost_price = Column(Numeric(10, 2), nullable=False, default=0.00, server_default=text("0.00"))
+    average_cost = Column(Numeric(12, 4), nullable=True)  # moving average, see app.utils.valuation
     selling_price = Column(Numeric(10, 2), nullable=False, default=0.00, server_default=text("0.00"))
     stock = Column(Integer, nullable=False, default=0, server_default=text("0"))
     low_stock_threshold = Column(Integer, default=10, server_default=text("10"))
@@ -1168,8 +1210,11 @@ class Product(BaseModel, ShopScopedMixin):
         Index('ix_product_shop_supplier', 'shop_id', 'supplier_id'),
         Index('ix_product_shop_active', 'shop_id', 'is_active'),
         Index('ix_product_shop_stock', 'shop_id', 'stock'),
+        Index('ix_product_shop_low_stock', 'shop_id', 'stock',
+              postgresql_where=text('stock < low_stock_threshold')),
         Index('ix_product_shop_combo', 'shop_id', 'combination_size'),
         Index('ix_product_search', 'shop_id', 'name', 'barcode', 'sku'),
+        Index('ix_product_shop_name_id', 'shop_id', 'name', 'id'),  # keyset pages
     )
 
     # === Validations ===
@@ -1228,6 +1273,11 @@ class Product(BaseModel, ShopScopedMixin):
         """Check if stock is below threshold"""
         return (self.stock or 0) < (self.low_stock_threshold or 0)
 
+    @is_low_stock.expression
+    def is_low_stock(cls):
+        # Matches the predicate of ix_product_shop_low_stock
+        return cls.stock < cls.low_stock_threshold
+
     @hybrid_property
     def is_combo(self):
         """Check if product has combination pricing"""
@@ -1245,10 +1295,19 @@ class Product(BaseModel, ShopScopedMixin):
             }
         return float(self.selling_price)
 
+    @hybrid_property
+    def valuation_cost(self):
+        """Weighted average unit cost; the cost price until the first costed receipt"""
+        return self.average_cost if self.average_cost is not None else self.cost_price
+
+    @valuation_cost.expression
+    def valuation_cost(cls):
+        return func.coalesce(cls.average_cost, cls.cost_price)
+
     @hybrid_property
     def total_value(self):
-        """Calculate total inventory value"""
-        return float(self.cost_price * Decimal(self.stock))
+        """Inventory value at weighted average cost"""
+        return float(Decimal(self.valuation_cost or 0) * Decimal(self.stock or 0))
 
     # === Business Methods ===
     def update_stock(self, quantity, note=None, user_id=None):
@@ -1411,6 +1470,10 @@ class StockLog(BaseModel, ShopScopedMixin):
     
     product = db.relationship('Product', back_populates='stock_logs')
     user = db.relationship('User', back_populates='stock_logs')
+
+    __table_args__ = (
+        db.Index('ix_stock_logs_shop_date_id', 'shop_id', 'date', 'id'),  # keyset pages
+    )
     
     def __repr__(self):
         return f"<StockLog(product_id={self.product_id}, previous_stock={self.previous_stock}, new_stock={self.new_stock})>"
@@ -1457,6 +1520,191 @@ class PriceChange(BaseModel, ShopScopedMixin):
         db.session.add(record)
         return record
     
+class ProductAffinity(BaseModel, ShopScopedMixin):
+    """
+    One cell of a shop's sparse product co-occurrence matrix for a rolling
+    window. Pairs are stored in both directions so "bought with X" is a single
+    indexed read; the diagonal (product_id == related_product_id) holds the
+    number of baskets containing the product.
+    """
+    __tablename__ = 'product_affinities'
+
+    window_days = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    related_product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    pair_count = db.Column(db.Integer, nullable=False, default=0)
+    support = db.Column(db.Float, nullable=False, default=0.0)
+    confidence = db.Column(db.Float, nullable=False, default=0.0)
+    lift = db.Column(db.Float, nullable=False, default=0.0)
+
+    related_product = db.relationship('Product', foreign_keys=[related_product_id])
+
+    __table_args__ = (
+        db.UniqueConstraint('shop_id', 'window_days', 'product_id', 'related_product_id',
+                            name='uq_affinity_shop_window_pair'),
+        db.Index('ix_affinity_lookup', 'shop_id', 'window_days', 'product_id', 'pair_count'),
+    )
+
+    def serialize(self):
+        return {
+            'product_id': self.product_id,
+            'related_product_id': self.related_product_id,
+            'window_days': self.window_days,
+            'pair_count': self.pair_count,
+            'support': self.support,
+            'confidence': self.confidence,
+            'lift': self.lift
+        }
+
+
+class BasketWindowStat(BaseModel, ShopScopedMixin):
+    """Total basket count behind a shop's co-occurrence window."""
+    __tablename__ = 'basket_window_stats'
+
+    window_days = db.Column(db.Integer, nullable=False)
+    basket_count = db.Column(db.Integer, nullable=False, default=0)
+    rebuilt_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('shop_id', 'window_days', name='uq_basket_window_shop'),
+    )
+
+
+class ShopDailySales(BaseModel, ShopScopedMixin):
+    """
+    Per-(business, shop, business day) sales rollup, kept in step with every
+    sales write so multi-shop dashboards aggregate a handful of rows per day
+    instead of scanning sales.
+    """
+    __tablename__ = 'shop_daily_sales'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id'), nullable=True)  # NULL outside a business
+    business_date = db.Column(db.Date, nullable=False)
+    total_sales = db.Column(db.Float, nullable=False, default=0.0)
+    total_profit = db.Column(db.Float, nullable=False, default=0.0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    largest_sale = db.Column(db.Float, nullable=True)
+    smallest_sale = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('shop_id', 'business_date', name='uq_shop_daily_sales_day'),
+        db.Index('ix_shop_daily_sales_business_date', 'business_id', 'business_date'),
+    )
+
+
+class PlatformMetricsSnapshot(BaseModel):
+    """Periodically captured platform-wide metrics read by the superadmin views."""
+    __tablename__ = 'platform_metrics_snapshots'
+
+    captured_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    payload = db.Column(db.JSON, nullable=False)
+
+
+class StockMovement(BaseModel, ShopScopedMixin):
+    """
+    Append-only stock ledger: one signed row per stock change of a product
+    (sale, settlement, receipt, adjustment, transfer, opening balance), with
+    the stock level it left behind.
+    """
+    __tablename__ = 'stock_movements'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    movement_type = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Numeric(12, 3), nullable=False)
+    stock_after = db.Column(db.Numeric(12, 3), nullable=False)
+    reference_type = db.Column(db.String(20), nullable=True)
+    reference_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_stock_movements_product_time', 'product_id', 'occurred_at'),
+        db.Index('ix_stock_movements_shop_time', 'shop_id', 'occurred_at'),
+    )
+
+
+class StockSnapshot(BaseModel, ShopScopedMixin):
+    """Stock of a product at the close of a shop's business day (as_of, UTC)."""
+    __tablename__ = 'stock_snapshots'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    as_of = db.Column(db.DateTime, nullable=False)
+    stock = db.Column(db.Numeric(12, 3), nullable=False)
+    unit_cost = db.Column(db.Numeric(12, 4), nullable=True)  # valuation cost when first snapshotted
+
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'snapshot_date', name='uq_stock_snapshot_day'),
+        db.Index('ix_stock_snapshots_product_as_of', 'product_id', 'as_of'),
+        db.Index('ix_stock_snapshots_shop_date', 'shop_id', 'snapshot_date'),
+    )
+
+
+class InventoryValuation(BaseModel, ShopScopedMixin):
+    """
+    A shop's closing inventory at weighted average cost for one business
+    day, written with the day's stock snapshots. Business figures are the
+    sum of its shops' rows for the day.
+    """
+    __tablename__ = 'inventory_valuations'
+
+    business_id = db.Column(db.Integer, db.ForeignKey('businesses.id'), nullable=True)  # NULL outside a business
+    valuation_date = db.Column(db.Date, nullable=False)
+    stock_units = db.Column(db.Numeric(14, 3), nullable=False, default=0)
+    stock_value = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    product_count = db.Column(db.Integer, nullable=False, default=0)  # products in stock
+
+    __table_args__ = (
+        db.UniqueConstraint('shop_id', 'valuation_date', name='uq_inventory_valuation_day'),
+        db.Index('ix_inventory_valuations_business_date', 'business_id', 'valuation_date'),
+    )
+
+
+class StockTakeStatus(enum.Enum):
+    OPEN = "open"
+    RECONCILED = "reconciled"
+    CANCELLED = "cancelled"
+
+
+class StockTake(BaseModel, ShopScopedMixin):
+    """
+    A stock count. Counts are staged in stock_take_counts while the session
+    is open and only reach Product.stock when it is reconciled.
+    """
+    __tablename__ = 'stock_takes'
+
+    status = db.Column(SQLAlchemyEnum(StockTakeStatus), nullable=False, default=StockTakeStatus.OPEN)
+    note = db.Column(db.String(200), nullable=True)
+    started_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    reconciled_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+    counts = db.relationship('StockTakeCount', back_populates='stock_take', cascade="all, delete-orphan", lazy='dynamic')
+
+    __table_args__ = (
+        db.Index('ix_stock_takes_shop_status', 'shop_id', 'status'),
+    )
+
+
+class StockTakeCount(BaseModel):
+    """Counted quantity of one product in a stock take; expected/variance are fixed at reconciliation."""
+    __tablename__ = 'stock_take_counts'
+
+    stock_take_id = db.Column(db.Integer, db.ForeignKey('stock_takes.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    counted = db.Column(db.Integer, nullable=False)
+    counted_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    counted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expected = db.Column(db.Integer, nullable=True)
+    variance = db.Column(db.Integer, nullable=True)
+
+    stock_take = db.relationship('StockTake', back_populates='counts')
+
+    __table_args__ = (
+        db.UniqueConstraint('stock_take_id', 'product_id', name='uq_stock_take_count_product'),
+    )
+
+
 class County(BaseModel):
     __tablename__ = 'counties'
     
@@ -0,0 +1,293 @@
+"""
+Background report jobs.
+
+Heavy exports (PDF/Excel documents, large sales-line exports) are built in a
+separate process pool instead of inside the request. Job state lives in the
+shared cache; finished artifacts are written to local storage and expire
+after REPORT_ARTIFACT_RETENTION seconds. Identical (shop, report, params)
+submissions are deduplicated onto the same job for as long as no sale on the
+report's days has changed: the fingerprint includes each covered (shop, day)
+watermark, so a re-submit after new sales builds a fresh artifact. A job
+still running after REPORT_JOB_TIMEOUT seconds (its worker died) is marked
+failed and the next identical submission builds it again. Everyone who
+submitted a job gets a report_job_completed event in their user_<id> room.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import cache, socketio
+
+logger = logging.getLogger(__name__)
+
+REPORT_TYPES = {
+    'daily_pdf': 'pdf',
+    'daily_excel': 'xlsx',
+    'sales_csv': 'csv',
+    'sales_xlsx': 'xlsx',
+}
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+DEFAULT_RETENTION = 24 * 3600
+DEFAULT_JOB_TIMEOUT = 1800
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker_app = None
+
+
+def _job_key(job_id):
+    return f"report_job:{job_id}"
+
+
+def _dedupe_key(digest):
+    return f"report_job:dedupe:{digest}"
+
+
+def _storage_dir(app):
+    path = app.config.get('REPORT_ARTIFACT_DIR') or os.path.join(app.instance_path, 'report_artifacts')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _retention(app):
+    return app.config.get('REPORT_ARTIFACT_RETENTION', DEFAULT_RETENTION)
+
+
+# ---------------------------------------------------------------------------
+# Worker process side
+# ---------------------------------------------------------------------------
+
+def _init_worker():
+    """Each pool process gets its own app (and therefore its own DB engine)."""
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app()
+
+
+def build_report_artifact(shop_id, shop_ids, report, params, path):
+    """Build a report artifact into path. Must run inside an app context."""
+    from app.utils.calculations.report_calculations import generate_daily_report_data
+    from app.reports.services import SalesExportService
+
+    if report in ('daily_pdf', 'daily_excel'):
+        from app.reports.documents import build_daily_report_pdf, build_daily_report_excel
+
+        report_date = datetime.strptime(params['date'], '%Y-%m-%d').date()
+        report_data = generate_daily_report_data(shop_id, report_date)
+        builder = build_daily_report_pdf if report == 'daily_pdf' else build_daily_report_excel
+        with open(path, 'wb') as fh:
+            fh.write(builder(report_data, report_date))
+        return
+
+    start_date = datetime.strptime(params['start'], '%Y-%m-%d').date()
+    end_date = datetime.strptime(params['end'], '%Y-%m-%d').date()
+    fmt = REPORT_TYPES[report]
+    mode = 'w' if fmt == 'csv' else 'wb'
+    with open(path, mode, newline='' if fmt == 'csv' else None) as fh:
+        for chunk in SalesExportService.stream(shop_ids, start_date, end_date, params['columns'], fmt):
+            fh.write(chunk)
+
+
+def _run_job(job_id, shop_id, shop_ids, report, params, storage_dir):
+    filename = f"{job_id}.{REPORT_TYPES[report]}"
+    final_path = os.path.join(storage_dir, filename)
+    tmp_path = f"{final_path}.part"
+    with _worker_app.app_context():
+        try:
+            build_report_artifact(shop_id, shop_ids, report, params, tmp_path)
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return filename
+
+
+# ---------------------------------------------------------------------------
+# Web process side
+# ---------------------------------------------------------------------------
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=app.config.get('REPORT_JOB_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+    return _executor
+
+
+class ReportJobService:
+
+    @staticmethod
+    def report_days(report, params):
+        """The business days a report's content is drawn from."""
+        if report in ('daily_pdf', 'daily_excel'):
+            return [datetime.strptime(params['date'], '%Y-%m-%d').date()]
+        start_date = datetime.strptime(params['start'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(params['end'], '%Y-%m-%d').date()
+        return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    @staticmethod
+    def fingerprint(shop_id, shop_ids, report, params):
+        """
+        Dedupe key of a submission. Includes the day watermark of every
+        (shop, day) the report covers, so it changes as soon as a sale on one
+        of those days is committed and a finished job is never reused stale.
+        """
+        from app.utils.report_cache import get_day_watermarks
+
+        days = ReportJobService.report_days(report, params)
+        covered = [shop_id] if report in ('daily_pdf', 'daily_excel') else sorted(shop_ids)
+        watermarks = {}
+        for covered_id in covered:
+            shop_marks = get_day_watermarks(covered_id, days)
+            watermarks[covered_id] = [shop_marks[day] for day in days]
+        payload = json.dumps([shop_id, report, params, watermarks], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get(job_id):
+        """The job dict, with a running job past REPORT_JOB_TIMEOUT marked failed."""
+        job = cache.get(_job_key(job_id))
+        if job and job['status'] == JOB_RUNNING and job.get('started_at'):
+            app = current_app._get_current_object()
+            timeout = app.config.get('REPORT_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+            started_at = datetime.fromisoformat(job['started_at'])
+            if datetime.utcnow() - started_at > timedelta(seconds=timeout):
+                logger.warning(f"Report job {job_id} still running after {timeout}s; marking it failed")
+                job['status'] = JOB_FAILED
+                job['error'] = 'Report build timed out'
+                job['finished_at'] = datetime.utcnow().isoformat()
+                ReportJobService._save(job, app)
+        return job
+
+    @staticmethod
+    def _save(job, app):
+        cache.set(_job_key(job['id']), job, timeout=_retention(app))
+
+    @staticmethod
+    def artifact_path(job):
+        """Absolute path of a finished job's artifact, or None if it is gone."""
+        if not job or job.get('status') != JOB_DONE or not job.get('artifact'):
+            return None
+        path = os.path.join(_storage_dir(current_app), job['artifact'])
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def submit(shop_id, shop_ids, report, params, user):
+        """
+        Queue a report build for user, or return the existing job for
+        identical params (adding user to the users it notifies).
+        Returns the job dict.
+        """
+        if report not in REPORT_TYPES:
+            raise ValueError(f"Unknown report type: {report}")
+
+        app = current_app._get_current_object()
+        ReportJobService.purge_expired(throttle=True)
+
+        digest = ReportJobService.fingerprint(shop_id, shop_ids, report, params)
+        existing_id = cache.get(_dedupe_key(digest))
+        if existing_id:
+            existing = ReportJobService.get(existing_id)
+            if existing and existing['status'] in (JOB_QUEUED, JOB_RUNNING):
+                notify = existing.setdefault('notify_user_ids', [])
+                if user.id not in notify:
+                    notify.append(user.id)
+                    ReportJobService._save(existing, app)
+                return existing
+            if existing and ReportJobService.artifact_path(existing):
+                return existing
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'shop_id': shop_id,
+            'business_id': user.business_id,
+            'scope': params.get('scope', 'shop'),
+            'submitted_by': user.id,
+            'notify_user_ids': [user.id],
+            'report': report,
+            'params': params,
+            'status': JOB_QUEUED,
+            'artifact': None,
+            'error': None,
+            'created_at': datetime.utcnow().isoformat(),
+            'started_at': None,
+            'finished_at': None
+        }
+        ReportJobService._save(job, app)
+        cache.set(_dedupe_key(digest), job['id'], timeout=_retention(app))
+
+        future = _get_executor(app).submit(
+            _run_job, job['id'], shop_id, shop_ids, report, params, _storage_dir(app)
+        )
+        job['status'] = JOB_RUNNING
+        job['started_at'] = datetime.utcnow().isoformat()
+        ReportJobService._save(job, app)
+        future.add_done_callback(lambda f: ReportJobService._on_done(app, job['id'], f))
+        return job
+
+    @staticmethod
+    def _on_done(app, job_id, future):
+        with app.app_context():
+            job = cache.get(_job_key(job_id))
+            if not job:
+                return
+            try:
+                job['artifact'] = future.result()
+                job['status'] = JOB_DONE
+            except Exception as e:
+                logger.error(f"Report job {job_id} failed: {e}", exc_info=True)
+                job['status'] = JOB_FAILED
+                job['error'] = str(e)
+            job['finished_at'] = datetime.utcnow().isoformat()
+            ReportJobService._save(job, app)
+
+            for user_id in job.get('notify_user_ids', ()):
+                socketio.emit('report_job_completed', {
+                    'job_id': job_id,
+                    'shop_id': job['shop_id'],
+                    'report': job['report'],
+                    'status': job['status'],
+                }, room=f"user_{user_id}")
+
+    @staticmethod
+    def purge_expired(throttle=False):
+        """
+        Delete stored artifacts older than the retention period.
+        With throttle=True this runs at most once an hour per cache.
+        """
+        app = current_app._get_current_object()
+        if throttle and not cache.add('report_job:purge_lock', 1, timeout=3600):
+            return 0
+
+        cutoff = time.time() - _retention(app)
+        storage = _storage_dir(app)
+        removed = 0
+        for name in os.listdir(storage):
+            path = os.path.join(storage, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"Could not purge report artifact {name}: {e}")
+        if removed:
+            logger.info(f"Purged {removed} expired report artifacts")
+        return removed
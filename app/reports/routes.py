@@ -1,12 +1,29 @@
-from flask import request, Blueprint, render_template, current_app, flash, redirect, url_for, jsonify, g
+from flask import request, Blueprint, render_template, current_app, flash, redirect, url_for, jsonify, g, Response, stream_with_context, abort, session, make_response, send_file
 from datetime import datetime, timedelta
-from flask_login import login_required
+from flask_login import login_required, current_user
 from sqlalchemy.exc import SQLAlchemyError
-from app import db, csrf, shop_access_required
-from app.models import Product, StockLog, Category, Sale
-from app.utils.calculations.product_calculations import *
-from app.utils.calculations.report_calculations import *
-from app.utils.calculations.report_calculations import MonthlySalesAnalyzer
+from app import db, csrf, shop_access_required, role_required
+from sqlalchemy import func, and_
+from app.models import Product, StockLog, Category, Sale, Role, Shop, CartItem, PriceChange
+from app.reports.services import SalesExportService, EXPORT_FORMATS
+from app.reports.documents import build_daily_report_pdf, build_daily_report_excel
+from app.reports.jobs import ReportJobService, REPORT_TYPES
+from app.utils.time import shop_today
+from app.utils.render import render_htmx
+from app.utils.calculations.product_calculations import (
+    calculate_avg_profit_margin, calculate_margin_trend, calculate_revenue_trend,
+    calculate_sales_trend, calculate_total_revenue, calculate_total_units_sold,
+    get_analytics_months, get_avg_days_between_sales, get_avg_monthly_usage,
+    get_avg_quantity_per_order, get_best_selling_month, get_frequently_bought_with,
+    get_max_stock_observed, get_peak_sales_day, get_price_change_count,
+    get_price_change_dates, get_price_history, get_repeat_purchase_rate,
+    get_revenue_by_month, get_revenue_growth, get_sales_by_day_of_week,
+    get_sales_growth, get_stock_cover_days, get_stockout_count,
+    get_suggested_price, get_units_sold_by_month
+)
+from app.utils.calculations.report_calculations import (
+    generate_daily_report_data, generate_weekly_report_context, MonthlySalesAnalyzer
+)
 
 import logging
 
@@ -42,7 +59,7 @@ def product_report(shop_id, product_id):
         'suggested_price': get_suggested_price(product_id),
         'avg_quantity_per_order': get_avg_quantity_per_order(product_id, time_period),
         'repeat_purchase_rate': get_repeat_purchase_rate(product_id, time_period),
-        'frequently_bought_with': get_frequently_bought_with(product_id, time_period),
+        'frequently_bought_with': get_frequently_bought_with(product_id, time_period, shop_id=shop_id),
         'months': get_analytics_months(product_id),
         'units_sold_by_month': get_units_sold_by_month(product_id),
         'revenue_by_month': get_revenue_by_month(product_id),
@@ -214,15 +231,15 @@ def product_sales_table(shop_id, product_id):
 @shop_access_required
 def todays_total_sales(shop_id):
     """Fetch today's total sales and number of transactions for this shop."""
-    today = datetime.today().date()
+    today = shop_today(shop_id)
 
     try:
         total_sales, total_transactions = db.session.query(
             func.coalesce(func.sum(Sale.total), 0),
             func.count(Sale.id)
         ).filter(
-            func.date(Sale.date) == today,
-            Sale.shop_id == shop_id  
+            Sale.shop_id == shop_id,
+            Sale.business_date == today
         ).first()
 
         return jsonify({
@@ -241,12 +258,13 @@ def todays_total_sales(shop_id):
 @shop_access_required
 def daily_sales_report(shop_id):
     try:
-        date_str = request.args.get('date', datetime.today().strftime('%Y-%m-%d'))
+        today = shop_today(shop_id)
+        date_str = request.args.get('date', today.strftime('%Y-%m-%d'))
         report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
 
-        if report_date > datetime.today().date():
+        if report_date > today:
             raise ValueError("Future dates not allowed")
-        if report_date < (datetime.today() - timedelta(days=730)).date():
+        if report_date < today - timedelta(days=730):
             raise ValueError("Date too far in the past")
 
     except ValueError as e:
@@ -257,12 +275,7 @@ def daily_sales_report(shop_id):
         flash(str(e), "danger")
         return redirect(url_for('reports.daily_sales_report', shop_id=shop_id))
 
-    cache_key = f"shop:{shop_id}:daily_report:{report_date}"
-    if request.headers.get("HX-Request"):
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
-
+    # Day partials are cached (and invalidated) in app.utils.report_cache
     report_data = generate_daily_report_data(shop_id=shop_id, report_date=report_date)
 
     # JSON response
@@ -271,19 +284,19 @@ def daily_sales_report(shop_id):
             **report_data,
             'sales': [
                 {
-                    "id": sale.id,
-                    "user": sale.user.username if sale.user else None,
-                    "total": float(sale.total),
-                    "profit": float(sale.profit or 0),
-                    "payment_method": sale.payment_method,
-                    "date": sale.date.strftime('%Y-%m-%d %H:%M:%S'),
+                    "id": sale['id'],
+                    "user": sale['user']['username'] if sale['user'] else None,
+                    "total": sale['total'],
+                    "profit": sale['profit'],
+                    "payment_method": sale['payment_method'],
+                    "date": sale['date'].strftime('%Y-%m-%d %H:%M:%S'),
                     "items": [
                         {
-                            "product": item.product.name,
-                            "quantity": item.quantity,
-                            "total_price": float(item.total_price)
+                            "product": item['product']['name'],
+                            "quantity": float(item['quantity']),
+                            "total_price": item['total_price']
                         }
-                        for item in sale.cart_items
+                        for item in sale['cart_items']
                     ]
                 }
                 for sale in report_data.get("sales", [])
@@ -365,385 +378,165 @@ def monthly_sales_analytics(shop_id):
         return redirect(url_for('reports.daily_sales_report', shop_id=shop_id))
 
 
+@reports_bp.route('/shops/<int:shop_id>/reports/export/sales', methods=['GET'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def export_sales_lines(shop_id):
+    """
+    Stream every sale line in a date range as CSV or XLSX.
+    Query args: start, end (YYYY-MM-DD), format (csv|xlsx),
+    columns (comma separated ids), scope (shop|business).
+    """
+    try:
+        today = datetime.today().strftime('%Y-%m-%d')
+        start_date = datetime.strptime(request.args.get('start', today), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end', today), '%Y-%m-%d').date()
+        if start_date > end_date:
+            raise ValueError("Start date must be before end date")
 
-from flask import make_response, request, current_app
-from flask_login import login_required
-from io import BytesIO
-from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
-    HRFlowable, KeepTogether
-)
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch, mm
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-# Register professional fonts (fallback to Helvetica if not available)
-try:
-    pdfmetrics.registerFont(TTFont('Roboto', 'Roboto-Regular.ttf'))
-    pdfmetrics.registerFont(TTFont('Roboto-Bold', 'Roboto-Bold.ttf'))
-    pdfmetrics.registerFont(TTFont('Roboto-Light', 'Roboto-Light.ttf'))
-except:
-    pass  # Fallback to default fonts
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
 
-@reports_bp.route('/reports/daily/export-pdf', methods=['GET'])
+        columns = SalesExportService.parse_columns(request.args.get('columns'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    scope = request.args.get('scope', 'shop')
+    if scope == 'business' and not current_user.is_tenant():
+        abort(403, "Only the business owner can export across shops.")
+
+    shop_ids = SalesExportService.scope_shop_ids(g.current_shop, scope)
+    logger.info(f"Sales export by {current_user.username}: shops={shop_ids} {start_date}..{end_date} {fmt}")
+
+    body = SalesExportService.stream(shop_ids, start_date, end_date, columns, fmt)
+    filename = f"sales_{scope}_{shop_id}_{start_date}_{end_date}.{fmt}"
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@csrf.exempt
+@reports_bp.route('/shops/<int:shop_id>/reports/jobs', methods=['POST'])
 @login_required
-def export_daily_report_pdf():
-    try:
-        # Date handling
-        date_str = request.args.get('date', datetime.today().strftime('%Y-%m-%d'))
-        report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        formatted_date = report_date.strftime("%A, %B %d, %Y").upper()
-        
-        # Data generation
-        report_data = generate_daily_report_data(report_date)
-        summary = report_data.get('summary', {})
-        
-        # PDF setup with tighter margins
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=letter,
-            leftMargin=15*mm,
-            rightMargin=15*mm,
-            topMargin=10*mm,
-            bottomMargin=15*mm,
-            title=f"Daily Sales Report - {formatted_date}"
-        )
-        elements = []
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def submit_report_job(shop_id):
+    """Queue a report build in the background; identical requests share a job."""
+    data = request.get_json(silent=True) or request.form
+    report = data.get('report')
+    today = datetime.today().strftime('%Y-%m-%d')
 
-        # Custom Styles
-        styles = getSampleStyleSheet()
-        
-        # Title style
-        styles.add(ParagraphStyle(
-            name='ReportTitle',
-            fontName='Helvetica-Bold',
-            fontSize=16,
-            alignment=TA_CENTER,
-            spaceAfter=6,
-            textColor=colors.HexColor("#2c3e50")
-        ))
-        
-        # Date style
-        styles.add(ParagraphStyle(
-            name='ReportDate',
-            fontName='Helvetica',
-            fontSize=10,
-            alignment=TA_CENTER,
-            spaceAfter=18,
-            textColor=colors.HexColor("#7f8c8d")
-        ))
-        
-        # Section header style
-        styles.add(ParagraphStyle(
-            name='SectionHeader',
-            fontName='Helvetica-Bold',
-            fontSize=12,
-            textColor=colors.HexColor("#3498db"),
-            spaceAfter=8,
-            underlineWidth=1,
-            underlineColor=colors.HexColor("#3498db"),
-            underlineOffset=-3
-        ))
-        
-        # Table header style
-        styles.add(ParagraphStyle(
-            name='TableHeader',
-            fontName='Helvetica-Bold',
-            fontSize=9,
-            alignment=TA_CENTER,
-            textColor=colors.white
-        ))
-        
-        # Body text style
-        styles.add(ParagraphStyle(
-            name='RBodyText',
-            fontName='Helvetica',
-            fontSize=9,
-            leading=11,
-            spaceAfter=6
-        ))
-        
-        # Footer style
-        styles.add(ParagraphStyle(
-            name='FooterText',
-            fontName='Helvetica-Oblique',
-            fontSize=8,
-            textColor=colors.HexColor("#95a5a6"),
-            alignment=TA_CENTER
-        ))
-
-        # Report Header
-        elements.append(Paragraph("DAILY SALES REPORT", styles['ReportTitle']))
-        elements.append(Paragraph(formatted_date, styles['ReportDate']))
-        elements.append(HRFlowable(width="80%", thickness=0.5, lineCap='round', 
-                                 color=colors.HexColor("#bdc3c7"), spaceAfter=18))
-
-        # SECTION 1: Summary (Card-style layout)
-        elements.append(Paragraph("PERFORMANCE SUMMARY", styles['SectionHeader']))
-        
-        summary_data = [
-            ("TOTAL SALES", f"Ksh {summary.get('total_sales', 0):,.2f}", "#2ecc71"),
-            ("TOTAL TRANSACTIONS", f"{summary.get('total_transactions', 0):,}", "#3498db"),
-            ("AVG SALE", f"Ksh {summary.get('avg_sale', 0):,.2f}", "#9b59b6"),
-            ("TOTAL PROFIT", f"Ksh {summary.get('total_profit', 0):,.2f}", "#e74c3c")
-        ]
-        
-        summary_cards = []
-        for title, value, color in summary_data:
-            card = Table([
-                [Paragraph(title, ParagraphStyle(
-                    name='CardTitle',
-                    fontName='Helvetica-Bold',
-                    fontSize=9,
-                    textColor=colors.white,
-                    alignment=TA_CENTER
-                ))],
-                [Paragraph(value, ParagraphStyle(
-                    name='CardValue',
-                    fontName='Helvetica-Bold',
-                    fontSize=11,
-                    textColor=colors.white,
-                    alignment=TA_CENTER
-                ))]
-            ], colWidths=[2.25*inch], rowHeights=[0.3*inch, 0.4*inch])
-            
-            card.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(color)),
-                ('BOX', (0, 0), (-1, -1), 0.5, colors.white),
-                ('ROUNDEDCORNERS', [4, 4, 4, 4]),
-            ]))
-            summary_cards.append(card)
-        
-        # Arrange cards in 2x2 grid
-        summary_grid = Table([
-            [summary_cards[0], summary_cards[1]],
-            [summary_cards[2], summary_cards[3]]
-        ], colWidths=[2.5*inch, 2.5*inch], rowHeights=[0.8*inch, 0.8*inch])
-        
-        elements.append(KeepTogether(summary_grid))
-        elements.append(Spacer(1, 0.3*inch))
+    try:
+        if report not in REPORT_TYPES:
+            raise ValueError(f"Unknown report type: {report}")
 
-        # SECTION 2: Payment Methods
-        payments = report_data.get('payment_methods', {})
-        elements.append(Paragraph("PAYMENT METHODS", styles['SectionHeader']))
-        
-        if payments:
-            payment_data = [["METHOD", "AMOUNT (Ksh)"]]
-            payment_data.extend([
-                [method.upper(), Paragraph(f"{amount:,.2f}", ParagraphStyle(
-                    name='RightAlign',
-                    fontName='Helvetica',
-                    fontSize=9,
-                    alignment=TA_RIGHT
-                ))] 
-                for method, amount in payments.items()
-            ])
-            
-            payment_table = Table(
-                payment_data,
-                colWidths=[4*inch, 2*inch],
-                repeatRows=1
-            )
-            
-            payment_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
-            ]))
-            
-            elements.append(payment_table)
+        scope = 'shop'
+        if report.startswith('daily_'):
+            params = {'date': datetime.strptime(data.get('date', today), '%Y-%m-%d').strftime('%Y-%m-%d')}
         else:
-            elements.append(Paragraph("No payment data available.", styles['RBodyText']))
-        
-        elements.append(Spacer(1, 0.3*inch))
+            start_date = datetime.strptime(data.get('start', today), '%Y-%m-%d').date()
+            end_date = datetime.strptime(data.get('end', today), '%Y-%m-%d').date()
+            if start_date > end_date:
+                raise ValueError("Start date must be before end date")
+            scope = data.get('scope', 'shop')
+            params = {
+                'start': start_date.isoformat(),
+                'end': end_date.isoformat(),
+                'columns': SalesExportService.parse_columns(data.get('columns')),
+                'scope': scope
+            }
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if scope == 'business' and not current_user.is_tenant():
+        abort(403, "Only the business owner can export across shops.")
+
+    shop_ids = SalesExportService.scope_shop_ids(g.current_shop, scope)
+    job = ReportJobService.submit(shop_id, shop_ids, report, params, current_user)
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': url_for('reports.report_job_status', shop_id=shop_id, job_id=job['id'])
+    }), 202
+
+
+def _get_job_or_404(shop_id, job_id):
+    """
+    A job of this shop the current user may see. Business-scope exports span
+    every shop of the business, so only its tenant (or the submitter) gets them.
+    """
+    job = ReportJobService.get(job_id)
+    if not job or job['shop_id'] != shop_id:
+        abort(404)
+    if job.get('scope', 'shop') == 'business' and job.get('submitted_by') != current_user.id:
+        if not (current_user.is_tenant() and current_user.business_id == job.get('business_id')):
+            abort(404)
+    return job
+
+
+@reports_bp.route('/shops/<int:shop_id>/reports/jobs/<job_id>', methods=['GET'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def report_job_status(shop_id, job_id):
+    job = _get_job_or_404(shop_id, job_id)
 
-        # SECTION 3: Top Selling Products
-        top_products = report_data.get('product_performance', [])
-        elements.append(Paragraph("TOP SELLING PRODUCTS", styles['SectionHeader']))
-        
-        if top_products:
-            product_data = [["PRODUCT", "QTY", "REVENUE (Ksh)"]]
-            product_data.extend([
-                [product, 
-                 str(data['quantity']), 
-                 Paragraph(f"{data['revenue']:,.2f}", ParagraphStyle(
-                     name='RightAlign',
-                     fontName='Helvetica',
-                     fontSize=9,
-                     alignment=TA_RIGHT
-                 ))] 
-                for product, data in top_products
-            ])
-            
-            product_table = Table(
-                product_data,
-                colWidths=[3.5*inch, 1.25*inch, 1.25*inch],
-                repeatRows=1
-            )
-            
-            product_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
-            ]))
-            
-            elements.append(product_table)
-        else:
-            elements.append(Paragraph("No product sales recorded.", styles['RBodyText']))
-        
-        elements.append(Spacer(1, 0.3*inch))
+    payload = {k: job[k] for k in ('id', 'report', 'params', 'status', 'error', 'created_at', 'finished_at')}
+    if ReportJobService.artifact_path(job):
+        payload['download_url'] = url_for('reports.download_report_job', shop_id=shop_id, job_id=job_id)
+    return jsonify(payload)
 
-        # SECTION 4: Low Stock Products
-        from app.models import Product  # Import as needed, adjust path
-        
-        elements.append(Paragraph("LOW STOCK ALERTS", styles['SectionHeader']))
-        low_stock_threshold = 10
-        critical_stock_threshold = 5
-
-        low_stock_products = Product.query.filter(
-            Product.stock <= low_stock_threshold
-        ).order_by(Product.stock.asc()).limit(10).all()
-
-        if low_stock_products:
-            low_stock_data = [["PRODUCT", "STOCK", "REORDER LEVEL", "CATEGORY"]]
-            for p in low_stock_products:
-                stock_style = 'Helvetica-Bold' if p.stock <= critical_stock_threshold else 'Helvetica'
-                stock_color = colors.red if p.stock <= critical_stock_threshold else colors.black
-                
-                low_stock_data.append([
-                    p.name,
-                    Paragraph(str(p.stock), ParagraphStyle(
-                        name='StockAlert',
-                        fontName=stock_style,
-                        fontSize=9,
-                        textColor=stock_color,
-                        alignment=TA_CENTER
-                    )),
-                    str(getattr(p, 'reorder_level', 10)),
-                    p.category.name if p.category else "N/A"
-                ])
-
-            stock_table = Table(
-                low_stock_data,
-                colWidths=[2.5*inch, 0.75*inch, 1*inch, 1.25*inch],
-                repeatRows=1
-            )
-            
-            stock_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
-            ]))
-            
-            elements.append(stock_table)
-        else:
-            elements.append(Paragraph("All products are sufficiently stocked.", styles['RBodyText']))
-        
-        elements.append(Spacer(1, 0.3*inch))
 
-        # SECTION 5: Staff Performance
-        staff_performance = report_data.get('staff_performance', [])
-        elements.append(Paragraph("STAFF PERFORMANCE", styles['SectionHeader']))
-        
-        if staff_performance:
-            staff_data = [["STAFF MEMBER", "TRANSACTIONS", "SALES (Ksh)"]]
-            staff_data.extend([
-                [staff, 
-                 str(data['sales']), 
-                 Paragraph(f"{data['amount']:,.2f}", ParagraphStyle(
-                     name='RightAlign',
-                     fontName='Helvetica',
-                     fontSize=9,
-                     alignment=TA_RIGHT
-                 ))] 
-                for staff, data in staff_performance
-            ])
-            
-            staff_table = Table(
-                staff_data,
-                colWidths=[3*inch, 1.5*inch, 1.5*inch],
-                repeatRows=1
-            )
-            
-            staff_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
-            ]))
-            
-            elements.append(staff_table)
-        else:
-            elements.append(Paragraph("No staff performance data available.", styles['RBodyText']))
-        
-        elements.append(Spacer(1, 0.3*inch))
+@reports_bp.route('/shops/<int:shop_id>/reports/jobs/<job_id>/download', methods=['GET'])
+@login_required
+@shop_access_required
+@role_required(Role.ADMIN, Role.TENANT)
+def download_report_job(shop_id, job_id):
+    job = _get_job_or_404(shop_id, job_id)
+
+    path = ReportJobService.artifact_path(job)
+    if not path:
+        abort(404, "Report is not ready or has expired")
+
+    ext = REPORT_TYPES[job['report']]
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=f"{job['report']}_{shop_id}_{job_id[:8]}.{ext}"
+    )
 
-        # SECTION 6: Hourly Trends
-        hourly_trends = report_data.get('hourly_trends', [])
-        elements.append(Paragraph("HOURLY SALES TRENDS", styles['SectionHeader']))
-        
-        if hourly_trends:
-            hourly_data = [["HOUR", "SALES (Ksh)"]]
-            hourly_data.extend([
-                [hour, 
-                 Paragraph(f"{amount:,.2f}", ParagraphStyle(
-                     name='RightAlign',
-                     fontName='Helvetica',
-                     fontSize=9,
-                     alignment=TA_RIGHT
-                 ))] 
-                for hour, amount in hourly_trends
-            ])
-            
-            hourly_table = Table(
-                hourly_data,
-                colWidths=[3*inch, 3*inch],
-                repeatRows=1
-            )
-            
-            hourly_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
-            ]))
-            
-            elements.append(hourly_table)
-        else:
-            elements.append(Paragraph("No hourly sales data available.", styles['RBodyText']))
-        
-        # Footer
-        elements.append(Spacer(1, 0.5*inch))
-        elements.append(HRFlowable(width="100%", thickness=0.5, lineCap='round', 
-                                 color=colors.HexColor("#bdc3c7"), spaceAfter=6))
-        elements.append(Paragraph(
-            f"Generated on {datetime.now().strftime('%Y-%m-%d at %H:%M:%S')} • © {datetime.now().year} Nawiri Enterprise",
-            styles['FooterText']
-        ))
-
-        # Build and return PDF
-        doc.build(elements)
-        buffer.seek(0)
-        response = make_response(buffer.read())
+
+
+
+def _resolve_export_shop_id():
+    """The legacy export URLs carry no shop; use ?shop_id or the shop in session."""
+    shop_id = request.args.get('shop_id', type=int) or session.get('shop_id')
+    if not shop_id:
+        abort(400, "No shop selected")
+    shop = Shop.query.get_or_404(shop_id)
+    if current_user.is_tenant():
+        allowed = shop.business_id == current_user.business_id
+    else:
+        allowed = current_user.shop_id == shop.id
+    if not allowed:
+        abort(403)
+    return shop.id
+
+
+@reports_bp.route('/reports/daily/export-pdf', methods=['GET'])
+@login_required
+def export_daily_report_pdf():
+    shop_id = _resolve_export_shop_id()
+    try:
+        date_str = request.args.get('date', datetime.today().strftime('%Y-%m-%d'))
+        report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+
+        report_data = generate_daily_report_data(shop_id, report_date)
+        response = make_response(build_daily_report_pdf(report_data, report_date))
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = (
             f'attachment; filename=daily_sales_report_{report_date}.pdf'
@@ -755,270 +548,16 @@ def export_daily_report_pdf():
         return str(e), 500
 
 
-
-
-from flask import make_response, request, current_app
-from flask_login import login_required
-from io import BytesIO
-from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import (
-    Font, Alignment, PatternFill, Border, Side, NamedStyle
-)
-from openpyxl.utils import get_column_letter
-from openpyxl.drawing.image import Image as ExcelImage
-import os
-
 @reports_bp.route('/reports/daily/export-excel', methods=['GET'])
 @login_required
 def export_daily_report_excel():
+    shop_id = _resolve_export_shop_id()
     try:
         date_str = request.args.get('date', datetime.today().strftime('%Y-%m-%d'))
         report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        formatted_date = report_date.strftime("%B %d, %Y")
-
-        report_data = generate_daily_report_data(report_date)
-
-        # Create workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Daily Report"
-        
-        # Set default column width
-        for col in range(1, 10):
-            ws.column_dimensions[get_column_letter(col)].width = 20
-
-        # Create styles
-        header_font = Font(name='Calibri', bold=True, size=12, color='FFFFFF')
-        header_fill = PatternFill(start_color='3498DB', end_color='3498DB', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        thin_border = Border(left=Side(style='thin'), 
-                           right=Side(style='thin'), 
-                           top=Side(style='thin'), 
-                           bottom=Side(style='thin'))
-        
-        title_style = NamedStyle(name="title_style")
-        title_style.font = Font(name='Calibri', bold=True, size=14)
-        title_style.alignment = Alignment(horizontal='center')
-        
-        section_style = NamedStyle(name="section_style")
-        section_style.font = Font(name='Calibri', bold=True, size=12, color='3498DB')
-        section_style.alignment = Alignment(horizontal='left')
-        
-        currency_style = NamedStyle(name="currency_style")
-        currency_style.number_format = '"Ksh" #,##0.00'
-        currency_style.alignment = Alignment(horizontal='right')
-        
-        # Add styles to workbook
-        wb.add_named_style(title_style)
-        wb.add_named_style(section_style)
-        wb.add_named_style(currency_style)
-
-       
-
-        # Report title
-        ws['A3'] = "DAILY SALES REPORT"
-        ws['A3'].style = title_style
-        ws.merge_cells('A3:D3')
-        
-        ws['A4'] = formatted_date
-        ws['A4'].font = Font(name='Calibri', italic=True)
-        ws.merge_cells('A4:D4')
-        
-        current_row = 6
-
-        # SECTION 1: Summary
-        summary = report_data.get('summary', {})
-        ws.cell(row=current_row, column=1, value="PERFORMANCE SUMMARY").style = section_style
-        current_row += 1
-        
-        summary_headers = ["Metric", "Value"]
-        ws.append(summary_headers)
-        
-        for cell in ws[current_row]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        summary_data = [
-            ["Total Sales", summary.get('total_sales', 0)],
-            ["Total Transactions", summary.get('total_transactions', 0)],
-            ["Average Sale", summary.get('avg_sale', 0)],
-            ["Total Profit", summary.get('total_profit', 0)]
-        ]
-        
-        for row in summary_data:
-            ws.append(row)
-            ws.cell(row=current_row+1, column=2).style = currency_style
-        
-        # Apply borders to summary data
-        for row in ws.iter_rows(min_row=current_row, max_row=current_row+3, min_col=1, max_col=2):
-            for cell in row:
-                cell.border = thin_border
-        
-        current_row += 5
-
-        # SECTION 2: Payment Methods
-        payments = report_data.get('payment_methods', {})
-        ws.cell(row=current_row, column=1, value="PAYMENT METHODS").style = section_style
-        current_row += 1
-        
-        payment_headers = ["Method", "Amount (Ksh)"]
-        ws.append(payment_headers)
-        
-        for cell in ws[current_row]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        for method, amount in payments.items():
-            ws.append([method.capitalize(), amount])
-            ws.cell(row=current_row+1, column=2).style = currency_style
-            current_row += 1
-        
-        # Apply borders to payment data
-        for row in ws.iter_rows(min_row=current_row-len(payments), max_row=current_row, min_col=1, max_col=2):
-            for cell in row:
-                cell.border = thin_border
-        
-        current_row += 2
-
-        # SECTION 3: Top Selling Products
-        top_products = report_data.get('product_performance', [])
-        ws.cell(row=current_row, column=1, value="TOP SELLING PRODUCTS").style = section_style
-        current_row += 1
-        
-        product_headers = ["Product", "Quantity", "Revenue (Ksh)"]
-        ws.append(product_headers)
-        
-        for cell in ws[current_row]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        for product, data in top_products:
-            ws.append([product, data['quantity'], data['revenue']])
-            ws.cell(row=current_row+1, column=3).style = currency_style
-            current_row += 1
-        
-        # Apply borders to product data
-        for row in ws.iter_rows(min_row=current_row-len(top_products), max_row=current_row, min_col=1, max_col=3):
-            for cell in row:
-                cell.border = thin_border
-        
-        current_row += 2
-
-        # SECTION 4: Low Stock Products
-        from app.models import Product
-        ws.cell(row=current_row, column=1, value="LOW STOCK ALERTS").style = section_style
-        current_row += 1
-        
-        low_stock_headers = ["Product", "Stock", "Reorder Level", "Category"]
-        ws.append(low_stock_headers)
-        
-        for cell in ws[current_row]:
-            cell.font = header_font
-            cell.fill = PatternFill(start_color='E74C3C', end_color='E74C3C', fill_type='solid')
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        low_stock_threshold = 10
-        critical_stock_threshold = 5
-        low_stock_products = Product.query.filter(
-            Product.stock <= low_stock_threshold
-        ).order_by(Product.stock.asc()).limit(10).all()
-
-        for p in low_stock_products:
-            ws.append([
-                p.name,
-                p.stock,
-                getattr(p, 'reorder_level', 10),
-                p.category.name if p.category else "N/A"
-            ])
-            # Highlight critical stock in red
-            if p.stock <= critical_stock_threshold:
-                ws.cell(row=current_row+1, column=2).font = Font(color='E74C3C', bold=True)
-            current_row += 1
-        
-        # Apply borders to stock data
-        for row in ws.iter_rows(min_row=current_row-len(low_stock_products), max_row=current_row, min_col=1, max_col=4):
-            for cell in row:
-                cell.border = thin_border
-        
-        current_row += 2
 
-        # SECTION 5: Staff Performance
-        staff_performance = report_data.get('staff_performance', [])
-        ws.cell(row=current_row, column=1, value="STAFF PERFORMANCE").style = section_style
-        current_row += 1
-        
-        staff_headers = ["Staff Member", "Transactions", "Sales (Ksh)"]
-        ws.append(staff_headers)
-        
-        for cell in ws[current_row]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        for staff, data in staff_performance:
-            ws.append([staff, data['sales'], data['amount']])
-            ws.cell(row=current_row+1, column=3).style = currency_style
-            current_row += 1
-        
-        # Apply borders to staff data
-        for row in ws.iter_rows(min_row=current_row-len(staff_performance), max_row=current_row, min_col=1, max_col=3):
-            for cell in row:
-                cell.border = thin_border
-        
-        current_row += 2
-
-        # SECTION 6: Hourly Trends
-        hourly_trends = report_data.get('hourly_trends', [])
-        ws.cell(row=current_row, column=1, value="HOURLY SALES TRENDS").style = section_style
-        current_row += 1
-        
-        hourly_headers = ["Hour", "Sales (Ksh)"]
-        ws.append(hourly_headers)
-        
-        for cell in ws[current_row]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        for hour, amount in hourly_trends:
-            ws.append([hour, amount])
-            ws.cell(row=current_row+1, column=2).style = currency_style
-            current_row += 1
-        
-        # Apply borders to hourly data
-        for row in ws.iter_rows(min_row=current_row-len(hourly_trends), max_row=current_row, min_col=1, max_col=2):
-            for cell in row:
-                cell.border = thin_border
-        
-        # Footer
-        current_row += 2
-        ws.cell(row=current_row, column=1, 
-                value=f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        ws.cell(row=current_row, column=1).font = Font(italic=True, color='7F8C8D')
-        
-        ws.cell(row=current_row, column=4, value="Confidential")
-        ws.cell(row=current_row, column=4).font = Font(italic=True, color='7F8C8D')
-        ws.cell(row=current_row, column=4).alignment = Alignment(horizontal='right')
-
-        # Freeze headers
-        ws.freeze_panes = 'A7'
-
-        # Save to buffer
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-
-        response = make_response(buffer.read())
+        report_data = generate_daily_report_data(shop_id, report_date)
+        response = make_response(build_daily_report_excel(report_data, report_date))
         response.headers['Content-Type'] = (
             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
@@ -1029,4 +568,4 @@ def export_daily_report_excel():
 
     except Exception as e:
         current_app.logger.error(f"Excel generation error: {str(e)}")
-        return str(e), 500
\ No newline at end of file
+        return str(e), 500
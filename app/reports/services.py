@@ -0,0 +1,163 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+
+from app import db
+from app.models import Sale, CartItem, Product, Category, User, Shop
+
+logger = logging.getLogger(__name__)
+
+
+# Column id -> (header, SQL expression). Order here is the default export order.
+EXPORT_COLUMNS = OrderedDict([
+    ('sale_id', ('Sale ID', Sale.id)),
+    ('date', ('Date (UTC)', Sale.date)),
+    ('business_date', ('Business Date', Sale.business_date)),
+    ('business_hour', ('Hour', Sale.business_hour)),
+    ('shop', ('Shop', Shop.name)),
+    ('cashier', ('Cashier', User.username)),
+    ('payment_method', ('Payment Method', Sale.payment_method)),
+    ('status', ('Status', Sale.status)),
+    ('customer_name', ('Customer', Sale.customer_name)),
+    ('product', ('Product', Product.name)),
+    ('sku', ('SKU', Product.sku)),
+    ('barcode', ('Barcode', Product.barcode)),
+    ('category', ('Category', Category.name)),
+    ('quantity', ('Quantity', CartItem.quantity)),
+    ('unit_price', ('Unit Price', CartItem.unit_price)),
+    ('discount', ('Discount %', CartItem.discount)),
+    ('line_total', ('Line Total', CartItem.total_price)),
+    ('cost_price', ('Current Cost Price', Product.cost_price)),
+    ('sale_total', ('Sale Total', Sale.total)),
+])
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class SalesExportService:
+    """Streams sale lines for a date range without materialising the result set."""
+
+    BATCH_SIZE = 1000
+    CHUNK_SIZE = 64 * 1024
+
+    @staticmethod
+    def parse_columns(raw):
+        """
+        Validate a comma separated column list.
+        Returns the selected column ids (all columns when raw is empty).
+        """
+        if not raw:
+            return list(EXPORT_COLUMNS.keys())
+        columns = [c.strip() for c in raw.split(',') if c.strip()]
+        unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+        return columns
+
+    @staticmethod
+    def scope_shop_ids(shop, scope):
+        """Resolve the shops covered by an export: the shop itself or its whole business."""
+        if scope == 'business':
+            return [row.id for row in db.session.query(Shop.id).filter(
+                Shop.business_id == shop.business_id,
+                Shop.is_deleted == False
+            )]
+        return [shop.id]
+
+    @staticmethod
+    def build_query(shop_ids, start_date, end_date, columns):
+        """Sale-line query for [start_date, end_date] (inclusive) over the given shops."""
+        expressions = [EXPORT_COLUMNS[c][1].label(c) for c in columns]
+        return (
+            db.session.query(*expressions)
+            .select_from(CartItem)
+            .join(Sale, CartItem.sale_id == Sale.id)
+            .join(Product, CartItem.product_id == Product.id)
+            .outerjoin(Category, Product.category_id == Category.id)
+            .outerjoin(User, Sale.user_id == User.id)
+            .join(Shop, Sale.shop_id == Shop.id)
+            .filter(
+                Sale.shop_id.in_(shop_ids),
+                Sale.business_date >= start_date,
+                Sale.business_date <= end_date,
+                Sale.is_deleted == False
+            )
+            .order_by(Sale.business_date, Sale.date, Sale.id, CartItem.id)
+            .yield_per(SalesExportService.BATCH_SIZE)
+        )
+
+    @staticmethod
+    def _cell(value):
+        if hasattr(value, 'value'):  # Enum columns
+            return value.value
+        return value
+
+    @staticmethod
+    def stream_csv(query, columns):
+        """Yield CSV text chunks, flushing roughly every BATCH_SIZE rows."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([EXPORT_COLUMNS[c][0] for c in columns])
+
+        for count, row in enumerate(query, start=1):
+            writer.writerow([
+                value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else SalesExportService._cell(value)
+                for value in row
+            ])
+            if count % SalesExportService.BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        yield buffer.getvalue()
+
+    @staticmethod
+    def stream_xlsx(query, columns):
+        """
+        Write rows with openpyxl's write-only workbook (rows are flushed to a
+        temp file as they are appended) and stream the finished file.
+        """
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Sales')
+
+        header = []
+        for c in columns:
+            cell = WriteOnlyCell(ws, value=EXPORT_COLUMNS[c][0])
+            cell.font = Font(bold=True)
+            header.append(cell)
+        ws.append(header)
+
+        for row in query:
+            ws.append([SalesExportService._cell(value) for value in row])
+
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            wb.save(path)
+            with open(path, 'rb') as fh:
+                while True:
+                    chunk = fh.read(SalesExportService.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def stream(shop_ids, start_date, end_date, columns, fmt):
+        """Return a generator producing the export body in the requested format."""
+        query = SalesExportService.build_query(shop_ids, start_date, end_date, columns)
+        if fmt == 'xlsx':
+            return SalesExportService.stream_xlsx(query, columns)
+        return SalesExportService.stream_csv(query, columns)
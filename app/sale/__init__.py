@@ -1,10 +1,10 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, request
 from . import controllers, sockets
 from .schemas import ReceiptSchema, ProductSearchSchema
 from app import  shop_access_required, role_required, csrf
 from ..models import Role
 from flask_login import login_required
-from .services import SalesService
+from .services import SalesService, BasketService
 from .controllers import (
     SalesController,
     TransactionController,
@@ -105,6 +105,25 @@ def get_pos_data(shop_id):
         return jsonify({'error': 'Failed to load POS data'}), 500
 
 
+@api_bp.route('/pos/suggestions')
+@login_required
+@shop_access_required
+@role_required(Role.CASHIER, Role.ADMIN, Role.TENANT)
+def get_basket_suggestions(shop_id):
+    """Upsell suggestions for the current cart (?product_ids=1,2,3)"""
+    try:
+        product_ids = [int(pid) for pid in request.args.get('product_ids', '').split(',') if pid.strip()]
+    except ValueError:
+        return jsonify({'error': 'Invalid product_ids'}), 400
+
+    try:
+        limit = min(request.args.get('limit', 5, type=int), 20)
+        return jsonify({'suggestions': BasketService.suggest_for_basket(shop_id, product_ids, limit)})
+    except Exception as e:
+        current_app.logger.error(f"Basket suggestion error: {str(e)}")
+        return jsonify({'error': 'Failed to load suggestions'}), 500
+
+
 @api_bp.route('/shop-info')
 @login_required
 @shop_access_required
@@ -24,6 +24,7 @@ from .schemas import (
 )
 
 from app import shop_access_required, role_required, csrf, db 
+from app.utils.product_images import rendition_url, webp_url
 from app.models import Role, Shop, Category, Product, Sale, CartItem
 import logging
 logger = logging.getLogger(__name__)
@@ -253,7 +254,8 @@ class TransactionController(MethodView):
                 'quantity': decimal_to_float(item.quantity),
                 'unit_price': decimal_to_float(price_details['unit_price']),
                 'current_price': decimal_to_float(item.product.selling_price) if item.product else decimal_to_float(item.unit_price),
-                'image_url': item.product.image_url if item.product else None,
+                'image_url': rendition_url(item.product.image_url, 'thumb') if item.product else None,
+                'image_webp': webp_url(item.product.image_url, 'thumb') if item.product else None,
                 'subtotal': subtotal,
                 'is_combo': price_details['is_combo'],
                 'combo_details': price_details['combo_details'],
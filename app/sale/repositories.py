@@ -3,10 +3,11 @@ from sqlalchemy import func, desc, and_, or_
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from .. import db
-from ..models import Product, Category, Sale, CartItem, SaleStatus
+from ..models import Product, Category, Sale, CartItem, SaleStatus, ProductAffinity, BasketWindowStat
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload, with_loader_criteria
 from decimal import Decimal, InvalidOperation
+from sqlalchemy.dialects import postgresql, sqlite
 
 class ProductRepository:
 
@@ -402,3 +403,169 @@ class SaleRepository:
                 .all()
             )
 
+
+
+class BasketRepository:
+    """Storage for the per-shop product co-occurrence index."""
+
+    @staticmethod
+    def _insert(model):
+        dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+        return dialect.insert(model.__table__)
+
+    @staticmethod
+    def get_basket_product_ids(sale_id: int) -> List[int]:
+        """Distinct products in a sale."""
+        rows = db.session.query(CartItem.product_id).filter(
+            CartItem.sale_id == sale_id
+        ).distinct().all()
+        return [row.product_id for row in rows]
+
+    @staticmethod
+    def increment_pairs(shop_id: int, window_days: int, cells: Dict[tuple, int]) -> None:
+        """Add counts to (product_id, related_product_id) cells, creating them as needed."""
+        if not cells:
+            return
+        now = datetime.utcnow()
+        stmt = BasketRepository._insert(ProductAffinity)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['shop_id', 'window_days', 'product_id', 'related_product_id'],
+            set_={
+                'pair_count': ProductAffinity.__table__.c.pair_count + stmt.excluded.pair_count,
+                'updated_at': now
+            }
+        )
+        db.session.execute(stmt, [
+            {
+                'shop_id': shop_id,
+                'window_days': window_days,
+                'product_id': a,
+                'related_product_id': b,
+                'pair_count': count,
+                'support': 0.0,
+                'confidence': 0.0,
+                'lift': 0.0,
+                'is_deleted': False,
+                'created_at': now,
+                'updated_at': now
+            }
+            for (a, b), count in cells.items()
+        ])
+
+    @staticmethod
+    def increment_baskets(shop_id: int, window_days: int, count: int = 1) -> None:
+        now = datetime.utcnow()
+        stmt = BasketRepository._insert(BasketWindowStat)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['shop_id', 'window_days'],
+            set_={
+                'basket_count': BasketWindowStat.__table__.c.basket_count + stmt.excluded.basket_count,
+                'updated_at': now
+            }
+        )
+        db.session.execute(stmt, {
+            'shop_id': shop_id,
+            'window_days': window_days,
+            'basket_count': count,
+            'is_deleted': False,
+            'created_at': now,
+            'updated_at': now
+        })
+
+    @staticmethod
+    def get_basket_total(shop_id: int, window_days: int) -> int:
+        return db.session.query(BasketWindowStat.basket_count).filter_by(
+            shop_id=shop_id, window_days=window_days
+        ).scalar() or 0
+
+    @staticmethod
+    def get_cells(shop_id: int, window_days: int, product_ids: List[int]) -> List[ProductAffinity]:
+        """All cells between the given products (including the diagonal)."""
+        return ProductAffinity.query.filter(
+            ProductAffinity.shop_id == shop_id,
+            ProductAffinity.window_days == window_days,
+            ProductAffinity.product_id.in_(product_ids),
+            ProductAffinity.related_product_id.in_(product_ids)
+        ).all()
+
+    @staticmethod
+    def count_window_pairs(shop_id: int, since: datetime):
+        """
+        Recount the co-occurrence matrix from sales since `since`.
+        Returns (basket_count, [(product_id, related_product_id, pair_count), ...]).
+        """
+        baskets = (
+            db.session.query(CartItem.sale_id.label('sale_id'), CartItem.product_id.label('product_id'))
+            .join(Sale, CartItem.sale_id == Sale.id)
+            .filter(
+                Sale.shop_id == shop_id,
+                Sale.date >= since,
+                Sale.is_deleted == False
+            )
+            .distinct()
+            .subquery()
+        )
+        basket_count = db.session.query(func.count(func.distinct(baskets.c.sale_id))).scalar() or 0
+
+        left = baskets.alias('left_items')
+        right = baskets.alias('right_items')
+        pairs = (
+            db.session.query(left.c.product_id, right.c.product_id, func.count())
+            .join(right, left.c.sale_id == right.c.sale_id)
+            .group_by(left.c.product_id, right.c.product_id)
+            .all()
+        )
+        return basket_count, pairs
+
+    @staticmethod
+    def replace_window(shop_id: int, window_days: int, basket_count: int, mappings: List[Dict]) -> None:
+        """Swap a window's matrix for freshly computed cells."""
+        now = datetime.utcnow()
+        ProductAffinity.query.filter_by(shop_id=shop_id, window_days=window_days).delete(synchronize_session=False)
+        if mappings:
+            db.session.bulk_insert_mappings(ProductAffinity, mappings)
+
+        stat = BasketWindowStat.query.filter_by(shop_id=shop_id, window_days=window_days).first()
+        if not stat:
+            stat = BasketWindowStat(shop_id=shop_id, window_days=window_days)
+            db.session.add(stat)
+        stat.basket_count = basket_count
+        stat.rebuilt_at = now
+
+    @staticmethod
+    def get_related(shop_id: int, product_id: int, window_days: int, limit: int) -> List[ProductAffinity]:
+        """Top co-purchased products for one product (single indexed read)."""
+        return (
+            ProductAffinity.query
+            .options(joinedload(ProductAffinity.related_product))
+            .filter(
+                ProductAffinity.shop_id == shop_id,
+                ProductAffinity.window_days == window_days,
+                ProductAffinity.product_id == product_id,
+                ProductAffinity.related_product_id != product_id
+            )
+            .order_by(ProductAffinity.pair_count.desc(), ProductAffinity.lift.desc())
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def get_suggestions(shop_id: int, product_ids: List[int], window_days: int, limit: int):
+        """Products most associated with a basket, excluding what is already in it."""
+        score = func.sum(ProductAffinity.lift * ProductAffinity.confidence)
+        return (
+            db.session.query(Product, score.label('score'))
+            .join(ProductAffinity, ProductAffinity.related_product_id == Product.id)
+            .filter(
+                ProductAffinity.shop_id == shop_id,
+                ProductAffinity.window_days == window_days,
+                ProductAffinity.product_id.in_(product_ids),
+                ~ProductAffinity.related_product_id.in_(product_ids),
+                Product.is_active == True,
+                Product.stock > 0
+            )
+            .group_by(Product.id)
+            .order_by(score.desc())
+            .limit(limit)
+            .all()
+        )
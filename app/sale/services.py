@@ -1,16 +1,20 @@
 from flask_login import current_user
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import product as cartesian
 from decimal import Decimal, ROUND_UP
 from typing import List, Dict, Optional
-from flask import request, session
+from flask import request, session, current_app
 from .. import db, socketio
-from .repositories import ProductRepository, CategoryRepository, SaleRepository
+from .repositories import ProductRepository, CategoryRepository, SaleRepository, BasketRepository
 from ..models import Shop, Sale, CartItem, Category, Product, Tax, SaleStatus
 from sqlalchemy.sql import bindparam
 from app.utils.pricing import PricingUtil
 import threading
 from sqlalchemy.orm import joinedload, with_loader_criteria
-from app.utils.time import get_kenya_today_range
+from app.utils.time import get_kenya_today_range, shop_today
+from app.utils import sales_rollup  # noqa: F401  registers the daily rollup flush hook
+from app.utils import stock_ledger
+from app.utils.product_images import rendition_url, webp_url
 from sqlalchemy import and_, func, case
 import logging
 import logging
@@ -23,12 +27,20 @@ from functools import lru_cache
 logger = logging.getLogger(__name__)
 
 
-def run_checkout_tasks(sale_id: int, shop_id: int, user_id: int, total: float, item_count: int):
+def run_checkout_tasks(app, sale_id: int, shop_id: int, user_id: int, total: float, item_count: int):
+    with app.app_context():
+        _run_checkout_tasks(sale_id, shop_id, user_id, total, item_count)
+
+
+def _run_checkout_tasks(sale_id: int, shop_id: int, user_id: int, total: float, item_count: int):
     try:
         # Generate receipt (safe access)
         receipt = ReceiptService.generate(sale_id)
         logger.info("Receipt generated successfully")
 
+        # Feed the completed basket into the co-occurrence index
+        BasketService.record_sale(sale_id, shop_id)
+
         
         # Emit real-time update
         socketio.emit('sale_completed', {
@@ -225,6 +237,20 @@ class SalesService:
                     .values(stock=bindparam('new_stock')),
                     stock_updates
                 )
+                quantities = {item['product_id']: -item['quantity'] for item in cart_item_data}
+                stock_ledger.record_movements(db.session, [
+                    {
+                        'shop_id': shop_id,
+                        'product_id': update['p_id'],
+                        'movement_type': stock_ledger.SALE,
+                        'quantity': quantities[update['p_id']],
+                        'stock_after': update['new_stock'],
+                        'reference_type': 'sale',
+                        'reference_id': sale.id,
+                        'user_id': user_id,
+                    }
+                    for update in stock_updates
+                ])
 
             db.session.commit()
             logger.info(f"Sale {sale.id} created successfully")
@@ -234,7 +260,7 @@ class SalesService:
                 logger.info("Starting background tasks...")
                 threading.Thread(
                     target=run_checkout_tasks,
-                    args=(sale.id, shop_id, user_id, float(total), len(cart_items)),
+                    args=(current_app._get_current_object(), sale.id, shop_id, user_id, float(total), len(cart_items)),
                     daemon=True
                 ).start()
 
@@ -273,6 +299,10 @@ class SalesService:
             raise ValueError("This sale is not a pay_later sale")
 
         try:
+            stock_ledger.set_movement_context(
+                db.session, stock_ledger.SETTLEMENT,
+                reference_type='sale', reference_id=sale.id, user_id=sale.user_id)
+
             # Update stock for the sale items
             for cart_item in sale.cart_items:
                 product = cart_item.product
@@ -290,7 +320,7 @@ class SalesService:
             # Trigger background tasks
             threading.Thread(
                 target=run_checkout_tasks,
-                args=(sale.id, shop_id, sale.user_id, float(sale.total), len(sale.cart_items)),
+                args=(current_app._get_current_object(), sale.id, shop_id, sale.user_id, float(sale.total), len(sale.cart_items)),
                 daemon=True
             ).start()
 
@@ -350,20 +380,20 @@ class SalesService:
     @staticmethod
     def get_daily_sales_summary(shop_id: int, days: int = 7) -> dict:
         """Get sales summary for dashboard with payment mode breakdown"""
-        date_threshold = datetime.utcnow() - timedelta(days=days)
+        date_threshold = shop_today(shop_id) - timedelta(days=days)
         
         # Total sales summary
         result = db.session.query(
             func.count(Sale.id).label('count'),
             func.sum(Sale.total).label('total'),
-            func.date(Sale.date).label('day')
+            Sale.business_date.label('day')
         )\
         .filter(and_(
             Sale.shop_id == shop_id,
-            Sale.date >= date_threshold
+            Sale.business_date >= date_threshold
         ))\
-        .group_by(func.date(Sale.date))\
-        .order_by(func.date(Sale.date).desc())\
+        .group_by(Sale.business_date)\
+        .order_by(Sale.business_date.desc())\
         .all()
 
         # Payment mode breakdown
@@ -374,7 +404,7 @@ class SalesService:
         )\
         .filter(and_(
             Sale.shop_id == shop_id,
-            Sale.date >= date_threshold
+            Sale.business_date >= date_threshold
         ))\
         .group_by(Sale.is_paid)\
         .all()
@@ -429,6 +459,123 @@ class SalesService:
 
     
 
+class BasketService:
+    """
+    Maintains each shop's market-basket co-occurrence index: pair counts plus
+    support, confidence and lift over rolling windows. Completed sales are
+    added incrementally; rebuild_shop() recounts the windows (run nightly via
+    `flask rebuild-basket-index`) so old baskets age out.
+    """
+    WINDOWS = (30, 90, 365)
+    MIN_PAIR_COUNT = 2  # singleton pairs are pruned on rebuild
+
+    @staticmethod
+    def window_for_period(time_period: str) -> int:
+        return {'today': 30, 'week': 30, 'month': 30, 'year': 365, 'all': 365}.get(time_period, 30)
+
+    @staticmethod
+    def _metrics(pair_count: int, count_a: int, count_b: int, baskets: int) -> Dict:
+        if not baskets or not count_a or not count_b:
+            return {'support': 0.0, 'confidence': 0.0, 'lift': 0.0}
+        return {
+            'support': pair_count / baskets,
+            'confidence': pair_count / count_a,
+            'lift': (pair_count * baskets) / (count_a * count_b)
+        }
+
+    @staticmethod
+    def record_sale(sale_id: int, shop_id: int) -> None:
+        """Add one basket to every window and refresh the metrics of the touched cells."""
+        try:
+            product_ids = BasketRepository.get_basket_product_ids(sale_id)
+            if not product_ids:
+                return
+
+            cells = {(a, b): 1 for a, b in cartesian(product_ids, repeat=2)}
+            for window in BasketService.WINDOWS:
+                BasketRepository.increment_pairs(shop_id, window, cells)
+                BasketRepository.increment_baskets(shop_id, window)
+            db.session.flush()
+
+            for window in BasketService.WINDOWS:
+                baskets = BasketRepository.get_basket_total(shop_id, window)
+                rows = BasketRepository.get_cells(shop_id, window, product_ids)
+                diagonal = {r.product_id: r.pair_count for r in rows if r.product_id == r.related_product_id}
+                for row in rows:
+                    metrics = BasketService._metrics(
+                        row.pair_count,
+                        diagonal.get(row.product_id, 0),
+                        diagonal.get(row.related_product_id, 0),
+                        baskets
+                    )
+                    row.support = metrics['support']
+                    row.confidence = metrics['confidence']
+                    row.lift = metrics['lift']
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to index basket for sale {sale_id}: {str(e)}", exc_info=True)
+
+    @staticmethod
+    def rebuild_shop(shop_id: int) -> None:
+        """Recount every window for a shop from its sales."""
+        try:
+            for window in BasketService.WINDOWS:
+                since = datetime.utcnow() - timedelta(days=window)
+                baskets, pairs = BasketRepository.count_window_pairs(shop_id, since)
+                diagonal = {a: count for a, b, count in pairs if a == b}
+                now = datetime.utcnow()
+
+                mappings = []
+                for a, b, count in pairs:
+                    if a != b and count < BasketService.MIN_PAIR_COUNT:
+                        continue
+                    mappings.append({
+                        'shop_id': shop_id,
+                        'window_days': window,
+                        'product_id': a,
+                        'related_product_id': b,
+                        'pair_count': count,
+                        'is_deleted': False,
+                        'created_at': now,
+                        'updated_at': now,
+                        **BasketService._metrics(count, diagonal.get(a, 0), diagonal.get(b, 0), baskets)
+                    })
+                BasketRepository.replace_window(shop_id, window, baskets, mappings)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to rebuild basket index for shop {shop_id}: {str(e)}", exc_info=True)
+            raise
+
+    @staticmethod
+    def bought_with(shop_id: int, product_id: int, time_period: str = 'month', limit: int = 3) -> List[Dict]:
+        window = BasketService.window_for_period(time_period)
+        return [
+            {
+                'id': row.related_product_id,
+                'name': row.related_product.name if row.related_product else None,
+                'pair_count': row.pair_count,
+                'support': row.support,
+                'confidence': row.confidence,
+                'lift': row.lift
+            }
+            for row in BasketRepository.get_related(shop_id, product_id, window, limit)
+        ]
+
+    @staticmethod
+    def suggest_for_basket(shop_id: int, product_ids: List[int], limit: int = 5) -> List[Dict]:
+        """Upsell suggestions for the products currently in a POS cart."""
+        if not product_ids:
+            return []
+        rows = BasketRepository.get_suggestions(shop_id, product_ids, BasketService.WINDOWS[0], limit)
+        return [
+            {**product.serialize(for_pos=True), 'score': float(score or 0)}
+            for product, score in rows
+        ]
+
+
 class ReceiptService:
     @staticmethod
     def generate(sale_id: int, format: str = 'json') -> Dict:
@@ -484,7 +631,8 @@ class ProductService:
                 'id': p.id,
                 'name': p.name,
                 'price': float(p.selling_price),
-                'image': p.image_url or '/static/images/product-placeholder.png',
+                'image': rendition_url(p.image_url, 'tile') or '/static/images/product-placeholder.png',
+                'image_webp': webp_url(p.image_url, 'tile'),
                 'category': p.category.name,
                 'category_id': p.category.id,
                 'stock': p.stock,
@@ -510,11 +658,12 @@ class ProductService:
                 'id': p.id,
                 'name': p.name,
                 'price': float(p.selling_price),
-                'image': p.image_url or '/static/images/product-placeholder.png',
+                'image': rendition_url(p.image_url, 'tile') or '/static/images/product-placeholder.png',
+                'image_webp': webp_url(p.image_url, 'tile'),
                 'category': p.category.name,
                 'category_id': p.category.id,
                 'stock': p.stock,
-                'is_low_stock': p.stock < 10,
+                'is_low_stock': p.is_low_stock,
                 'unit': p.unit.value if p.unit else None,
                 'minimum_unit': p.minimum_unit or 1,
                 'is_combo': bool(p.combination_size and p.combination_size > 1),
@@ -546,7 +695,8 @@ class CategoryService:
                         'id': p.id,
                         'name': p.name,
                         'price': float(p.selling_price),
-                        'image_url': p.image_url or '/static/images/product-placeholder.png',
+                        'image_url': rendition_url(p.image_url, 'tile') or '/static/images/product-placeholder.png',
+                        'image_webp': webp_url(p.image_url, 'tile'),
                         'stock': p.stock,
                         'unit': p.unit.value if p.unit else None,
                         'minimum_unit': float(p.minimum_unit) if p.minimum_unit else 1.0,
@@ -572,7 +722,7 @@ class CategoryService:
         return [{
             'id': c.id,
             'name': c.name,
-            'sales_count': len(c.products)
+            'sales_count': c.total_product_count
         } for c in categories]
 
 
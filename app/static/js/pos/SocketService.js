@@ -20,6 +20,13 @@ class SocketService {
             }
         });
 
+        // Goods received: many products in one event
+        this.socket.on('stock_batch_updated', (data) => {
+            if (data.shop_id === this.shopId) {
+                data.products.forEach(product => this.handleStockUpdate({ ...product, shop_id: data.shop_id }));
+            }
+        });
+
         // Low stock alerts
         this.socket.on('low_stock_alert', (data) => {
             if (data.shop_id === this.shopId) {
@@ -34,10 +41,17 @@ class SocketService {
             }
         });
 
+        // Background report builds (sent to the submitting user's room)
+        this.socket.on('report_job_completed', (data) => {
+            this.showReportJobNotification(data);
+        });
+
         // Connection events
         this.socket.on('connect', () => {
             console.log('Connected to Socket.IO server');
             this.socket.emit('pos_connected', { shop_id: this.shopId });
+            // Low stock alerts are sent to the shop's inventory room only
+            this.socket.emit('subscribe_inventory', { shop_id: this.shopId });
         });
 
         this.socket.on('disconnect', () => {
@@ -85,6 +99,23 @@ class SocketService {
         });
     }
 
+    showReportJobNotification(data) {
+        if (data.status !== 'done') {
+            this.showNotification({
+                type: 'error',
+                message: `Report ${data.report} failed`,
+                duration: 8000
+            });
+            return;
+        }
+        const url = `/reports/shops/${data.shop_id}/reports/jobs/${data.job_id}/download`;
+        this.showNotification({
+            type: 'success',
+            message: `Report ready: <a href="${url}" class="underline">download ${data.report}</a>`,
+            duration: 0
+        });
+    }
+
     showNotification({ type, message, duration }) {
         const notification = document.createElement('div');
         notification.className = `notification ${type}`;
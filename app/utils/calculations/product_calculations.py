@@ -9,7 +9,7 @@ from sqlalchemy import func, extract, and_, or_, case, distinct,  desc, text
 from sqlalchemy.exc import SQLAlchemyError
 from app import db, cache, csrf
 from app.models import (Product, Sale, CartItem, PriceChange, StockLog, 
-                       User,  Category)
+                       User,  Category, StockMovement)
 from decimal import Decimal
 from datetime import datetime, date, timedelta
 from sqlalchemy import select
@@ -151,19 +151,21 @@ def get_avg_days_between_sales(product_id, time_period):
 def get_max_stock_observed(product_id):
     """Get highest recorded stock level"""
     max_stock = db.session.query(
-        func.max(StockLog.new_stock)
+        func.max(StockMovement.stock_after)
     ).filter_by(product_id=product_id).scalar()
     return max_stock or Product.query.get(product_id).stock
 
 def get_stockout_count(product_id, time_period='month'):
     """Count how many times product went out of stock"""
-    time_filter = get_time_filter(time_period, StockLog.date)
+    time_filter = get_time_filter(time_period, StockMovement.occurred_at)
     return db.session.query(
-        func.count(StockLog.id)
-    ).filter_by(
-        product_id=product_id,
-        new_stock=0
-    ).filter(time_filter).scalar() or 0
+        func.count(StockMovement.id)
+    ).filter(
+        StockMovement.product_id == product_id,
+        StockMovement.quantity < 0,
+        StockMovement.stock_after <= 0,
+        time_filter
+    ).scalar() or 0
 
 def get_avg_monthly_usage(product_id):
     """Calculate average monthly units sold"""
@@ -177,10 +179,14 @@ def get_avg_monthly_usage(product_id):
     return round(statistics.mean([m[1] for m in monthly_data]), 1) if monthly_data else 0.0
 
 def get_stock_cover_days(product_id):
-    """Calculate how long current stock will last"""
-    avg_monthly = get_avg_monthly_usage(product_id)
-    current_stock = Product.query.get(product_id).stock
-    return ceil(Decimal(current_stock) / (avg_monthly / Decimal(30))) if avg_monthly else 0
+    """Calculate how long current stock will last (from the shop's daily reorder plan)"""
+    from app.inventory.services import ReorderPlanService
+    shop_id = db.session.query(Product.shop_id).filter(Product.id == product_id).scalar()
+    if shop_id is None:
+        return 0
+    plan = ReorderPlanService.get_plan([shop_id], 'shop', shop_id)
+    days = plan['cover'].get(product_id)
+    return ceil(days) if days else 0
 
 # Growth Metrics
 def get_best_selling_month(product_id):
@@ -390,29 +396,15 @@ def get_sales_by_day_of_week(product_id, time_period='month'):
 
 
 
-def get_frequently_bought_with(product_id, time_period='month', limit=3):
-    """Find products commonly purchased together"""
-    try:
-        time_filter = get_time_filter(time_period)
+def get_frequently_bought_with(product_id, time_period='month', limit=3, shop_id=None):
+    """Find products commonly purchased together (read from the shop's co-occurrence index)"""
+    from app.sale.services import BasketService
 
-        # Get sales that included our product
-        sales_with_product = db.session.query(
-            Sale.id
-        ).join(CartItem).filter(
-            CartItem.product_id == product_id,
-            time_filter
-        ).subquery()
-
-        # Find other products in those sales
-        frequent_products = db.session.query(
-            Product.name,
-            func.count(CartItem.product_id).label('count')
-        ).join(CartItem).filter(
-            CartItem.sale_id.in_(select(sales_with_product.c.id)),
-            CartItem.product_id != product_id
-        ).group_by(Product.name).order_by(func.count(CartItem.product_id).desc()).limit(limit).all()
-
-        return [p[0] for p in frequent_products]
+    try:
+        if shop_id is None:
+            shop_id = db.session.query(Product.shop_id).filter(Product.id == product_id).scalar()
+        related = BasketService.bought_with(shop_id, product_id, time_period, limit)
+        return [p['name'] for p in related if p['name']]
 
     except Exception as e:
         logger.error(f"Error finding frequently bought items: {str(e)}", exc_info=True)
@@ -19,6 +19,8 @@ from werkzeug.exceptions import BadRequest
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 from app.utils.calculations.product_calculations import *
+from app.utils.report_cache import get_day_partial, get_day_partials, merge_day_partials
+from app.utils.valuation import valuation_on
 
 
 
@@ -29,99 +31,41 @@ logger.setLevel(logging.INFO)
 
 
 
-def generate_daily_report_data(shop_id, report_date):
-    try:
-        # Initialize all data structures
-        product_sales = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0.0')})
-        payment_methods = defaultdict(Decimal)
-        hourly_sales = defaultdict(Decimal)
-        staff_performance = defaultdict(lambda: {'sales': 0, 'amount': Decimal('0.0')})
-        complete_product_sales = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0.0')})
-
-        # Base sales query - now shop-scoped
-        sales = Sale.query.filter(
-            func.date(Sale.date) == report_date,
-            Sale.shop_id == shop_id
-        ).options(
-            joinedload(Sale.cart_items).joinedload(CartItem.product),
-            joinedload(Sale.user)
-        ).all()
-
-        if not sales:
-            return {
-                'sales': [],
-                'report_date': report_date,
-                'summary': {
-                    'total_sales': 0.0,
-                    'total_transactions': 0,
-                    'total_profit': 0.0,
-                    'avg_sale': 0.0
-                },
-                'payment_methods': {},
-                'product_performance': [],
-                'hourly_trends': [],
-                'staff_performance': [],
-                'complete_products': []
-            }
-
-        # Process sales data
-        for sale in sales:
-            method = sale.payment_method.lower()
-            payment_methods[method] += Decimal(str(sale.total))
+def _as_float_stats(stats):
+    return {'quantity': stats['quantity'], 'revenue': float(stats['revenue'])}
 
-            hour = sale.date.hour
-            hourly_sales[f"{hour}:00-{hour+1}:00"] += Decimal(str(sale.total))
 
-            if sale.user:
-                staff_performance[sale.user.username]['sales'] += 1
-                staff_performance[sale.user.username]['amount'] += Decimal(str(sale.total))
-
-            for item in sale.cart_items:
-                product_name = item.product.name
-                quantity = item.quantity
-                revenue = Decimal(str(item.total_price))
-
-                complete_product_sales[product_name]['quantity'] += quantity
-                complete_product_sales[product_name]['revenue'] += revenue
-                product_sales[product_name]['quantity'] += quantity
-                product_sales[product_name]['revenue'] += revenue
+def generate_daily_report_data(shop_id, report_date):
+    try:
+        day = get_day_partial(shop_id, report_date)
 
-        # Summarize
-        total_sales = sum(Decimal(str(sale.total)) for sale in sales)
-        total_transactions = len(sales)
-        total_profit = sum(Decimal(str(sale.profit)) if sale.profit is not None else Decimal('0') for sale in sales)
+        total_sales = day['total_sales']
+        total_transactions = day['transactions']
         avg_sale = total_sales / Decimal(str(total_transactions)) if total_transactions else Decimal('0')
 
-        sorted_products = sorted(
-            [(name, {'quantity': data['quantity'], 'revenue': float(data['revenue'])})
-             for name, data in product_sales.items()],
-            key=lambda x: x[1]['revenue'],
-            reverse=True
-        )[:10]
-
         complete_products_list = sorted(
-            [(name, {'quantity': data['quantity'], 'revenue': float(data['revenue'])})
-             for name, data in complete_product_sales.items()],
+            [(name, _as_float_stats(data)) for name, data in day['products'].items()],
             key=lambda x: x[1]['revenue'],
             reverse=True
         )
 
         return {
-            'sales': sales,
+            'sales': day['sales'],
             'report_date': report_date,
             'summary': {
                 'total_sales': float(total_sales),
                 'total_transactions': total_transactions,
-                'total_profit': float(total_profit),
+                'total_profit': float(day['total_profit']),
                 'avg_sale': float(avg_sale)
             },
-            'payment_methods': {k: float(v) for k, v in payment_methods.items()},
-            'product_performance': sorted_products,
-            'hourly_trends': [(k, float(v)) for k, v in sorted(hourly_sales.items())],
+            'payment_methods': {k.lower(): float(v['total']) for k, v in day['payment_methods'].items()},
+            'product_performance': complete_products_list[:10],
+            'hourly_trends': [(f"{hour}:00-{hour+1}:00", float(data['sales']))
+                              for hour, data in sorted(day['hourly'].items())],
             'complete_products': complete_products_list,
             'staff_performance': sorted(
-                [(k, {'sales': v['sales'], 'amount': float(v['amount'])})
-                 for k, v in staff_performance.items()],
+                [(k, {'sales': v['sales_count'], 'amount': float(v['sales_value'])})
+                 for k, v in day['staff'].items()],
                 key=lambda x: x[1]['amount'],
                 reverse=True
             )
@@ -148,31 +92,19 @@ def generate_daily_report_data(shop_id, report_date):
 
 #weekly report analysis
 def generate_weekly_report_context(shop_id, week, start_date, end_date):
-    sales = Sale.query.filter(
-        Sale.shop_id == shop_id,
-        Sale.date >= start_date,
-        Sale.date <= end_date
-    ).options(
-        joinedload(Sale.cart_items).joinedload(CartItem.product),
-        joinedload(Sale.user)
-    ).order_by(Sale.date.desc()).all()
-
-    total_sales = float(sum(Decimal(str(sale.total)) for sale in sales)) if sales else 0.0
-    total_profit = float(sum(Decimal(str(sale.profit or 0)) for sale in sales)) if sales else 0.0
-    total_transactions = len(sales)
+    days = get_day_partials(shop_id, start_date, end_date)
+    week_data = merge_day_partials(days.values())
+
+    total_sales = float(week_data['total_sales'])
+    total_profit = float(week_data['total_profit'])
+    total_transactions = week_data['transactions']
     avg_sale = float(total_sales / total_transactions) if total_transactions else 0.0
 
     prev_week_start = start_date - timedelta(weeks=1)
     prev_week_end = end_date - timedelta(weeks=1)
-    prev_week_sales = float(
-        db.session.query(func.sum(Sale.total))
-        .filter(
-            Sale.shop_id == shop_id,
-            Sale.date >= prev_week_start,
-            Sale.date <= prev_week_end
-        )
-        .scalar() or 0.0
-    )
+    prev_week_sales = float(sum(
+        day['total_sales'] for day in get_day_partials(shop_id, prev_week_start, prev_week_end).values()
+    ))
     wow_change = float(((total_sales - prev_week_sales) / prev_week_sales * 100)) if prev_week_sales else 0.0
 
     calendar = {
@@ -183,38 +115,29 @@ def generate_weekly_report_context(shop_id, week, start_date, end_date):
 
     weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
     daily_data = {day: {'sales': 0.0, 'transactions': 0} for day in weekdays}
-    for sale in sales:
-        day = sale.date.strftime('%A')
-        daily_data[day]['sales'] += float(sale.total)
-        daily_data[day]['transactions'] += 1
-
-    hourly_sales = {f"{hour:02d}:00": 0.0 for hour in range(24)}
-    for sale in sales:
-        hour_key = sale.date.strftime('%H:00')
-        hourly_sales[hour_key] += float(sale.total)
-    hourly_labels = sorted(hourly_sales.keys())
-    hourly_values = [hourly_sales[hour] for hour in hourly_labels]
+    for day, partial in days.items():
+        weekday = day.strftime('%A')
+        daily_data[weekday]['sales'] += float(partial['total_sales'])
+        daily_data[weekday]['transactions'] += partial['transactions']
 
-    payment_methods = defaultdict(float)
-    for sale in sales:
-        method = sale.payment_method.lower()
-        payment_methods[method] += float(sale.total)
+    hourly_labels = [f"{hour:02d}:00" for hour in range(24)]
+    hourly_values = [
+        float(week_data['hourly'][hour]['sales']) if hour in week_data['hourly'] else 0.0
+        for hour in range(24)
+    ]
 
-    product_sales = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0')})
-    for sale in sales:
-        for item in sale.cart_items:
-            product_sales[item.product.name]['quantity'] += item.quantity
-            product_sales[item.product.name]['revenue'] += Decimal(str(item.total_price))
+    payment_methods = defaultdict(float)
+    for method, data in week_data['payment_methods'].items():
+        payment_methods[method.lower()] += float(data['total'])
 
     sorted_products = sorted(
-        [(k, {'quantity': v['quantity'], 'revenue': float(v['revenue'])})
-         for k, v in product_sales.items()],
+        [(k, _as_float_stats(v)) for k, v in week_data['products'].items()],
         key=lambda x: x[1]['revenue'],
         reverse=True
     )[:10]
 
     return {
-        'sales': sales,
+        'sales': week_data['sales'],
         'week': week,
         'date_range': f"{start_date.strftime('%b %d, %Y')} - {end_date.strftime('%b %d, %Y')}",
         'total_sales': total_sales,
@@ -246,7 +169,8 @@ class MonthlySalesAnalyzer:
         self.prev_month = None
         self.next_month = None
         self.days_in_month = None
-        self.sales = []
+        self.days = OrderedDict()  # day -> cached day partial
+        self.month = None          # all partials of the month merged
         self.metrics = {}  # Store metrics for later access
 
         
@@ -265,22 +189,10 @@ class MonthlySalesAnalyzer:
             return False
     
     def fetch_sales_data(self):
-        """Query sales data with eager loading"""
+        """Load the month's day partials (only uncached days hit the database)"""
         try:
-            self.sales = (
-                Sale.query.filter(
-                    Sale.shop_id == self.shop_id,
-                    Sale.date >= self.first_day,
-                    Sale.date <= self.last_day
-                )
-                .options(
-                    joinedload(Sale.cart_items).joinedload(CartItem.product),
-                    joinedload(Sale.user)
-                )
-                .order_by(Sale.date)
-                .all()
-            )
-
+            self.days = get_day_partials(self.shop_id, self.first_day, self.last_day)
+            self.month = merge_day_partials(self.days.values())
             return True
         except Exception as e:
             current_app.logger.error(f"Sales query error: {str(e)}")
@@ -288,52 +200,37 @@ class MonthlySalesAnalyzer:
     
     def calculate_core_metrics(self):
         """Calculate key performance metrics with precise decimal calculations"""
+        month = self.month
+        total_transactions = month['transactions']
         metrics = {
-            'total_sales': Decimal('0.0'),
-            'total_profit': Decimal('0.0'),
-            'total_transactions': len(self.sales),
+            'total_sales': month['total_sales'],
+            'total_profit': month['total_profit'],
+            'total_transactions': total_transactions,
             'avg_sale': Decimal('0.0'),
             'avg_profit_margin': Decimal('0.0'),
-            'products_sold': 0,
+            'products_sold': month['products_sold'],
             'refund_rate': Decimal('0.0'),
-            'total_cost': Decimal('0.0')
+            'total_cost': month['total_cost']
         }
 
-        if not self.sales:
-            self.metrics = metrics
-            return {k: float(v) if isinstance(v, Decimal) else v for k, v in metrics.items()}
-
-        refund_count = 0
-        total_cost = Decimal('0.0')
-
-        for sale in self.sales:
-            sale_total = Decimal(str(sale.total))
-            metrics['total_sales'] += sale_total
-            metrics['total_profit'] += Decimal(str(sale.profit)) if sale.profit else Decimal('0.0')
-
-            if hasattr(sale, 'is_refund') and sale.is_refund:
-                refund_count += 1
-
-            for item in sale.cart_items:
-                metrics['products_sold'] += item.quantity
-                if item.product and item.product.cost_price:
-                    item_cost = Decimal(str(item.product.cost_price)) * item.quantity
-                    total_cost += item_cost
-
-        metrics['total_cost'] = total_cost
-        metrics['avg_sale'] = metrics['total_sales'] / metrics['total_transactions'] if metrics['total_transactions'] > 0 else Decimal('0.0')
-        metrics['refund_rate'] = (Decimal(refund_count) / metrics['total_transactions'] * 100) if metrics['total_transactions'] > 0 else Decimal('0.0')
+        if total_transactions > 0:
+            metrics['avg_sale'] = metrics['total_sales'] / total_transactions
+            metrics['refund_rate'] = Decimal(month['refunds']) / total_transactions * 100
 
         if metrics['total_sales'] > 0:
-            gross_profit = metrics['total_sales'] - total_cost
+            gross_profit = metrics['total_sales'] - metrics['total_cost']
             metrics['avg_profit_margin'] = (gross_profit / metrics['total_sales'] * 100)
-        else:
-            metrics['avg_profit_margin'] = Decimal('0.0')
 
         self.metrics = metrics  # ✅ Save for comparison use
         return {k: float(v) if isinstance(v, Decimal) else v for k, v in metrics.items()}
 
-    
+    def _period_totals(self, start_day, end_day):
+        days = get_day_partials(self.shop_id, start_day, end_day).values()
+        return (
+            sum((day['total_sales'] for day in days), Decimal('0.0')),
+            sum((day['total_profit'] for day in days), Decimal('0.0'))
+        )
+
     def calculate_comparisons(self):
         comparisons = {
             'mom_sales': Decimal('0.0'),
@@ -343,120 +240,48 @@ class MonthlySalesAnalyzer:
             'mom_profit': Decimal('0.0'),
             'yoy_profit': Decimal('0.0')
         }
+        current_sales = Decimal(str(self.metrics['total_sales']))
 
         # Month-over-month
         prev_last = (self.prev_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        prev_data = db.session.query(
-            func.sum(Sale.total), func.sum(Sale.profit)
-        ).filter(
-            Sale.shop_id == self.shop_id,  # ✅ Scoped
-            Sale.date >= self.prev_month,
-            Sale.date <= prev_last
-        ).first()
-
-        prev_total, prev_profit = prev_data or (0, 0)
-        prev_sales = Decimal(str(prev_total or 0))
-        prev_profit = Decimal(str(prev_profit or 0))
+        prev_sales, prev_profit = self._period_totals(self.prev_month, prev_last)
 
         comparisons['mom_sales'] = prev_sales
         comparisons['mom_profit'] = prev_profit
 
         if prev_sales > 0:
-            comparisons['mom_change'] = (Decimal(str(self.metrics['total_sales'])) - prev_sales) / prev_sales * 100
+            comparisons['mom_change'] = (current_sales - prev_sales) / prev_sales * 100
 
         # Year-over-year
-        last_year = self.first_day - timedelta(days=365)
+        last_year = (self.first_day - timedelta(days=365)).replace(day=1)
         last_year_end = (last_year + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        ly_data = db.session.query(
-            func.sum(Sale.total), func.sum(Sale.profit)
-        ).filter(
-            Sale.shop_id == self.shop_id,  # ✅ Scoped
-            Sale.date >= last_year.replace(day=1),
-            Sale.date <= last_year_end
-        ).first()
-
-        ly_sales = Decimal(str(ly_data[0] or 0))
-        ly_profit = Decimal(str(ly_data[1] or 0))
+        ly_sales, ly_profit = self._period_totals(last_year, last_year_end)
 
         comparisons['yoy_sales'] = ly_sales
         comparisons['yoy_profit'] = ly_profit
 
         if ly_sales > 0:
-            comparisons['yoy_change'] = (Decimal(str(self.metrics['total_sales'])) - ly_sales) / ly_sales * 100
+            comparisons['yoy_change'] = (current_sales - ly_sales) / ly_sales * 100
 
         return {k: float(v) if isinstance(v, Decimal) else v for k, v in comparisons.items()}
 
-    def generate_context(self, full_report=True):
-        """Main method to return analytics context (HTMX or full view)"""
-        if not self.initialize_dates():
-            raise ValueError("Invalid month format")
-
-        if not self.fetch_sales_data():
-            raise RuntimeError("Failed to fetch sales")
-
-        core = self.calculate_core_metrics()
-        comparisons = self.calculate_comparisons()
-        time = self.generate_time_analytics() if full_report else {}
-        products = self.generate_product_analytics() if full_report else {}
-
-        return {
-            'month': self.month_str,
-            'date_range': f"{self.first_day.strftime('%B %Y')}",
-            'calendar': {
-                'prev': self.prev_month.strftime('%Y-%m'),
-                'next': self.next_month.strftime('%Y-%m'),
-                'current': datetime.today().strftime('%Y-%m')
-            },
-            'core_metrics': core,
-            'comparisons': comparisons,
-            'time_analytics': time,
-            'product_analytics': products
-        }
-
-
     def generate_time_analytics(self):
         """Generate daily and weekly trends with accurate financial calculations"""
-        # Initialize daily data structure
         daily_data = OrderedDict()
-        for day in range(1, self.days_in_month + 1):
-            date = self.first_day.replace(day=day)
-            daily_data[date] = {
-                'date': date,
-                'sales': Decimal('0.0'),
-                'transactions': 0,
-                'profit': Decimal('0.0'),
-                'avg_sale': Decimal('0.0'),
-                'products': 0,
-                'cost': Decimal('0.0'),
-                'margin': Decimal('0.0')
+        for day, partial in self.days.items():
+            sales = partial['total_sales']
+            transactions = partial['transactions']
+            daily_data[day] = {
+                'date': day,
+                'sales': sales,
+                'transactions': transactions,
+                'profit': partial['total_profit'],
+                'avg_sale': sales / transactions if transactions else Decimal('0.0'),
+                'products': partial['products_sold'],
+                'cost': partial['total_cost'],
+                'margin': ((sales - partial['total_cost']) / sales * 100) if sales > 0 else Decimal('0.0')
             }
 
-        # Populate daily data
-        for sale in self.sales:
-            day_key = sale.date.replace(hour=0, minute=0, second=0, microsecond=0)
-            if day_key in daily_data:
-                daily = daily_data[day_key]
-                sale_total = Decimal(str(sale.total))
-                sale_profit = Decimal(str(sale.profit)) if sale.profit else Decimal('0.0')
-                
-                daily['sales'] += sale_total
-                daily['transactions'] += 1
-                daily['profit'] += sale_profit
-                
-                # Calculate product quantities and costs
-                for item in sale.cart_items:
-                    daily['products'] += item.quantity
-                    if item.product and item.product.cost_price:
-                        daily['cost'] += Decimal(str(item.product.cost_price)) * item.quantity
-                
-                # Calculate margin if we have sales
-                if daily['sales'] > 0:
-                    daily['margin'] = ((daily['sales'] - daily['cost']) / daily['sales'] * 100)
-                
-                # Calculate average sale
-                if daily['transactions'] > 0:
-                    daily['avg_sale'] = daily['sales'] / daily['transactions']
-
         # Weekly breakdown
         weekly_data = {
             'Week 1': {'sales': Decimal('0.0'), 'transactions': 0, 'profit': Decimal('0.0'), 'days': 0, 'products': 0},
@@ -496,34 +321,13 @@ class MonthlySalesAnalyzer:
 
     def generate_product_analytics(self):
         """Analyze product performance with precise financial calculations"""
-        product_metrics = defaultdict(lambda: {
-            'quantity': 0,
-            'revenue': Decimal('0.0'),
-            'cost': Decimal('0.0'),
-            'profit': Decimal('0.0'),
-            'margin': Decimal('0.0'),
-            'transactions': set(),
-            'categories': set()
-        })
-
-        for sale in self.sales:
-            for item in sale.cart_items:
-                product = item.product
-                if not product:
-                    continue
-                    
-                item_revenue = Decimal(str(item.total_price))
-                item_cost = Decimal(str(product.cost_price)) * item.quantity if product.cost_price else Decimal('0.0')
-                item_profit = item_revenue - item_cost
-                
-                pm = product_metrics[product.name]
-                pm['quantity'] += item.quantity
-                pm['revenue'] += item_revenue
-                pm['cost'] += item_cost
-                pm['profit'] += item_profit
-                pm['transactions'].add(sale.id)
-                if product.category:
-                    pm['categories'].add(product.category.name)
+        product_metrics = {}
+        for name, data in self.month['products'].items():
+            product_metrics[name] = {
+                **data,
+                'profit': data['revenue'] - data['cost'],
+                'transactions': data['sale_ids']
+            }
 
         # Calculate metrics for each product
         top_products = []
@@ -595,65 +399,47 @@ class MonthlySalesAnalyzer:
 
     def generate_payment_analysis(self):
         """Generate analytics summary by payment method"""
-        payment_summary = defaultdict(lambda: {
-            'total': Decimal('0.0'),
-            'count': 0
-        })
-
-        for sale in self.sales:
-            method = sale.payment_method or 'Unknown'
-            payment_summary[method]['total'] += Decimal(str(sale.total))
-            payment_summary[method]['count'] += 1
-
         # Convert to float for JSON
         return {
             method: {
                 'total': float(data['total']),
                 'count': data['count']
-            } for method, data in payment_summary.items()
+            } for method, data in self.month['payment_methods'].items()
         }
                
                
     def generate_staff_analytics(self):
         """Analyze staff performance with accurate financial metrics"""
-        staff_performance = defaultdict(lambda: {
-            'sales_count': 0,
-            'sales_value': Decimal('0.0'),
-            'profit': Decimal('0.0'),
-            'products_sold': 0,
-            'transactions': set(),
-            'avg_sale': Decimal('0.0'),
-            'profit_margin': Decimal('0.0'),
-            'products_per_sale': Decimal('0.0')
-        })
-
-        for sale in self.sales:
-            if not sale.user:
-                continue
-                
-            sale_value = Decimal(str(sale.total))
-            sale_profit = Decimal(str(sale.profit)) if sale.profit else Decimal('0.0')
-            products_sold = sum(item.quantity for item in sale.cart_items)
-            
-            staff = staff_performance[sale.user.username]
-            staff['sales_count'] += 1
-            staff['sales_value'] += sale_value
-            staff['profit'] += sale_profit
-            staff['products_sold'] += products_sold
-            staff['transactions'].add(sale.id)
-
-        # Calculate derived metrics
-        for staff in staff_performance.values():
+        staff_performance = {}
+        for username, data in self.month['staff'].items():
+            staff = {
+                **data,
+                'transactions': data['sales_count'],
+                'avg_sale': Decimal('0.0'),
+                'profit_margin': Decimal('0.0'),
+                'products_per_sale': Decimal('0.0')
+            }
             if staff['sales_count'] > 0:
                 staff['avg_sale'] = staff['sales_value'] / staff['sales_count']
                 staff['products_per_sale'] = Decimal(staff['products_sold']) / staff['sales_count']
                 if staff['sales_value'] > 0:
                     staff['profit_margin'] = (staff['profit'] / staff['sales_value'] * 100)
+            staff_performance[username] = staff
 
         # Convert all Decimal values to float for JSON serialization
         return {k: {m: float(v) if isinstance(v, Decimal) else v for m, v in data.items()} 
                for k, data in staff_performance.items()}
 
+    def generate_customer_analysis(self):
+        """Summarize sales by customer segment (walk-in, identified, credit)"""
+        return {
+            segment: {
+                'total': float(data['total']),
+                'count': data['count'],
+                'avg_amount': float(data['total'] / data['count']) if data['count'] else 0.0
+            } for segment, data in self.month['customers'].items()
+        }
+
   
 
     def prepare_chart_data(self):
@@ -733,6 +519,16 @@ class MonthlySalesAnalyzer:
 
         return chart_data
 
+    def generate_inventory_valuation(self):
+        """Opening and closing inventory at weighted average cost, read from the daily valuations"""
+        opening = valuation_on([self.shop_id], self.first_day - timedelta(days=1))
+        closing = valuation_on([self.shop_id], self.last_day)
+        return {
+            'opening': opening,
+            'closing': closing,
+            'change': (closing['stock_value'] - (opening['stock_value'] if opening else 0.0)) if closing else None,
+        }
+
     def generate_context(self, full_report=True):
         """Generate complete context dictionary with proper date handling"""
         if not self.initialize_dates():
@@ -746,6 +542,7 @@ class MonthlySalesAnalyzer:
         self.product_analytics = self.generate_product_analytics()
         self.payment_analytics = self.generate_payment_analysis()
         self.comparisons = self.calculate_comparisons()
+        self.inventory_valuation = self.generate_inventory_valuation()
         
         if full_report:
             self.staff_analytics = self.generate_staff_analytics()
@@ -773,6 +570,7 @@ class MonthlySalesAnalyzer:
             'time_analytics': self.time_analytics,
             'product_analytics': self.product_analytics,
             'payment_analytics': self.payment_analytics,
+            'inventory_valuation': self.inventory_valuation,
             'chart_data': self.chart_data
         }
 
@@ -794,12 +592,9 @@ class MonthlySalesAnalyzer:
             'avg_sale': Decimal('0.0')
         } for hour in range(24)}
 
-        for sale in self.sales:
-            hour = sale.date.hour
-            sale_amount = Decimal(str(sale.total))
-            
-            hourly_data[hour]['sales'] += sale_amount
-            hourly_data[hour]['transactions'] += 1
+        for hour, data in self.month['hourly'].items():
+            hourly_data[hour]['sales'] += data['sales']
+            hourly_data[hour]['transactions'] += data['transactions']
 
         # Calculate averages
         for hour in hourly_data.values():
@@ -812,4 +607,4 @@ class MonthlySalesAnalyzer:
             'sales': [float(h['sales']) for h in hourly_data.values()],
             'transactions': [h['transactions'] for h in hourly_data.values()],
             'avg_sale': [float(h['avg_sale']) for h in hourly_data.values()]
-        }
\ No newline at end of file
+        }
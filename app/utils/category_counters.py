@@ -0,0 +1,173 @@
+"""
+Denormalized per-category product counters.
+
+Category.total_product_count, active_product_count and
+in_stock_product_count (active with stock above zero) are kept in step with
+product writes, in the same transaction, so category listings and
+Category.serialize() never read product rows:
+
+- ORM product inserts, deletes and edits are diffed in a flush hook
+  (category, active flag, soft delete and stock);
+- set-based stock writes reach track_stock() through
+  stock_ledger.record_movements();
+- writers that insert or reassign products in bulk (catalog import) call
+  recount() for the categories they touched.
+
+recount() over every category is the repair path (flask
+repair-category-counters).
+"""
+import logging
+
+from sqlalchemy import event, select, update, func, case, and_, inspect, bindparam
+from sqlalchemy.orm import Session
+
+from app.models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+
+def _contribution(is_active, is_deleted, stock):
+    """(total, active, in stock) a product adds to its category's counters."""
+    if is_deleted:
+        return (0, 0, 0)
+    active = is_active is not False  # NULL reads as the column default
+    return (1, int(active), int(active and (stock or 0) > 0))
+
+
+def _add(deltas, category_id, contribution, sign):
+    if category_id is None:
+        return
+    current = deltas.setdefault(category_id, [0, 0, 0])
+    for i, value in enumerate(contribution):
+        current[i] += sign * value
+
+
+def apply_deltas(connection, deltas):
+    """Add {category_id: (total, active, in stock)} to the counters with one executemany UPDATE."""
+    params = [
+        {'b_id': category_id, 'b_total': total, 'b_active': active, 'b_in_stock': in_stock}
+        for category_id, (total, active, in_stock) in deltas.items()
+        if total or active or in_stock
+    ]
+    if not params:
+        return
+    table = Category.__table__
+    connection.execute(
+        update(table).where(table.c.id == bindparam('b_id')).values(
+            total_product_count=table.c.total_product_count + bindparam('b_total'),
+            active_product_count=table.c.active_product_count + bindparam('b_active'),
+            in_stock_product_count=table.c.in_stock_product_count + bindparam('b_in_stock'),
+        ),
+        params
+    )
+
+
+def track_stock(session, movements):
+    """
+    Move products between in stock and out of stock for a batch of ledger
+    movements written by set-based statements. Opening balances belong to
+    products inserted in bulk, which their writer recounts.
+    """
+    levels = {}
+    for movement in movements:
+        if movement['movement_type'] == 'opening':
+            continue
+        product_id = movement['product_id']
+        if product_id not in levels:
+            levels[product_id] = [movement['stock_after'] - movement['quantity'], None]
+        levels[product_id][1] = movement['stock_after']
+
+    flipped = {
+        product_id: after > 0
+        for product_id, (before, after) in levels.items()
+        if (before > 0) != (after > 0)
+    }
+    if not flipped:
+        return
+
+    deltas = {}
+    for product_id, category_id in session.connection().execute(
+        select(Product.id, Product.category_id).where(
+            Product.id.in_(list(flipped)),
+            Product.is_active.isnot(False),
+            Product.is_deleted.isnot(True)
+        )
+    ):
+        _add(deltas, category_id, (0, 0, 1), 1 if flipped[product_id] else -1)
+    apply_deltas(session.connection(), deltas)
+
+
+def recount(connection, category_ids=None):
+    """
+    Recompute the counters of the given categories (default: all) from
+    their products in one statement. Returns the number of categories written.
+    """
+    table = Category.__table__
+    live = Product.is_deleted.isnot(True)
+    active = and_(live, Product.is_active.isnot(False))
+    counts = select(
+        Product.category_id,
+        func.count(case((live, Product.id))).label('total'),
+        func.count(case((active, Product.id))).label('active'),
+        func.count(case((and_(active, Product.stock > 0), Product.id))).label('in_stock'),
+    ).group_by(Product.category_id)
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        if not category_ids:
+            return 0
+        counts = counts.where(Product.category_id.in_(category_ids))
+    counts = counts.subquery()
+
+    def counted(column):
+        return func.coalesce(
+            select(column).where(counts.c.category_id == table.c.id).scalar_subquery(), 0)
+
+    stmt = update(table).values(
+        total_product_count=counted(counts.c.total),
+        active_product_count=counted(counts.c.active),
+        in_stock_product_count=counted(counts.c.in_stock),
+    )
+    if category_ids is not None:
+        stmt = stmt.where(table.c.id.in_(category_ids))
+    return connection.execute(stmt).rowcount
+
+
+# ---------------------------------------------------------------------------
+# ORM product writes -> counter deltas, applied in the same flush
+# ---------------------------------------------------------------------------
+
+def _previous(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return state.attrs[key].value
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_orm_products(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Product):
+            _add(deltas, obj.category_id, _contribution(obj.is_active, obj.is_deleted, obj.stock), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            state = inspect(obj)
+            _add(deltas, _previous(state, 'category_id'), _contribution(
+                _previous(state, 'is_active'), _previous(state, 'is_deleted'), _previous(state, 'stock')), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Product) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        keys = ('category_id', 'is_active', 'is_deleted', 'stock')
+        if not any(state.attrs[key].history.added for key in keys):
+            continue
+        _add(deltas, _previous(state, 'category_id'), _contribution(
+            _previous(state, 'is_active'), _previous(state, 'is_deleted'), _previous(state, 'stock')), -1)
+        _add(deltas, obj.category_id, _contribution(obj.is_active, obj.is_deleted, obj.stock), 1)
+
+    if deltas:
+        apply_deltas(session.connection(), deltas)
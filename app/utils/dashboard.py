@@ -0,0 +1,134 @@
+"""
+Concurrent execution of independent dashboard sections.
+
+Each section runs on a bounded thread pool inside its own app context, so
+Flask-SQLAlchemy hands it a separate session (and connection). A section's
+timeout counts from when it starts running, not from when it was queued, and
+is also set as the statement_timeout of its transaction, so a query that
+overruns is cancelled by the database instead of holding a worker and a
+connection. A section that raises or overruns is replaced by its placeholder
+instead of failing the page; one still waiting for a worker after a full
+timeout is dropped the same way. Per-section timings are logged and exposed
+as a Server-Timing header value.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from flask import current_app
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_SECTION_TIMEOUT = 5.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('DASHBOARD_WORKERS', DEFAULT_WORKERS),
+                thread_name_prefix='dashboard'
+            )
+    return _executor
+
+
+def _run_section(app, func, args, kwargs, timeout, state):
+    state['started'] = started = time.perf_counter()
+    with app.app_context():
+        from app import db
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Transaction-scoped, released with the session at teardown
+            db.session.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {'timeout': str(int(timeout * 1000))}
+            )
+        result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class DashboardExecutor:
+    """Collects named sections, runs them concurrently and gathers the results."""
+
+    def __init__(self, timeout=None):
+        self.app = current_app._get_current_object()
+        self.timeout = timeout if timeout is not None else self.app.config.get(
+            'DASHBOARD_SECTION_TIMEOUT', DEFAULT_SECTION_TIMEOUT)
+        self.sections = []
+        self.timings = {}
+        self.degraded = []
+
+    def add(self, name, func, *args, placeholder=None, **kwargs):
+        """Register a section. placeholder is returned if the section fails or times out."""
+        self.sections.append((name, func, args, kwargs, placeholder))
+        return self
+
+    def run(self):
+        """Run every registered section and return {name: result}."""
+        executor = _get_executor(self.app)
+        started = time.perf_counter()
+        pending = {}
+        for name, func, args, kwargs, placeholder in self.sections:
+            state = {'started': None}
+            future = executor.submit(_run_section, self.app, func, args, kwargs, self.timeout, state)
+            pending[future] = (name, placeholder, state)
+
+        results = {}
+        while pending:
+            now = time.perf_counter()
+            # A running section gets the full timeout from its own start; a
+            # queued one gives up after waiting a full timeout for a worker.
+            for future, (name, placeholder, state) in list(pending.items()):
+                if future.done():
+                    continue
+                section_started = state['started']
+                if now < (section_started or started) + self.timeout:
+                    continue
+                del pending[future]
+                future.cancel()
+                if section_started is None:
+                    logger.warning(f"Dashboard section '{name}' waited {self.timeout}s for a worker")
+                else:
+                    logger.warning(f"Dashboard section '{name}' timed out after {self.timeout}s")
+                results[name] = placeholder
+                self.timings[name] = now - (section_started or started)
+                self.degraded.append(name)
+
+            done = [future for future in pending if future.done()]
+            if not done and pending:
+                deadlines = [
+                    (state['started'] or started) + self.timeout
+                    for _, _, state in pending.values()
+                ]
+                done, _ = wait(list(pending), timeout=max(0.0, min(deadlines) - time.perf_counter()),
+                               return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, placeholder, state = pending.pop(future)
+                try:
+                    results[name], elapsed = future.result()
+                    self.timings[name] = elapsed
+                except Exception as e:
+                    logger.error(f"Dashboard section '{name}' failed: {e}", exc_info=True)
+                    results[name] = placeholder
+                    self.timings[name] = time.perf_counter() - (state['started'] or started)
+                    self.degraded.append(name)
+
+        self.total_time = time.perf_counter() - started
+        logger.info(
+            "Dashboard sections in %.1fms: %s", self.total_time * 1000,
+            ', '.join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in self.timings.items())
+        )
+        return results
+
+    def server_timing(self):
+        """Server-Timing header value for the last run."""
+        return ', '.join(
+            f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in self.timings.items()
+        )
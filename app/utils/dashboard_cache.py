@@ -0,0 +1,104 @@
+"""
+Rendered tenant dashboard fragments, cached per business and section.
+
+Each section has its own TTL and is dropped as soon as a committed write
+touches the data it shows (sales, products, stock logs, users, shops,
+register sessions), so the TTL only bounds staleness for writes made outside
+the ORM.
+"""
+import logging
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app import cache
+from app.models import Sale, Product, StockLog, User, Shop, RegisterSession
+
+logger = logging.getLogger(__name__)
+
+# Section -> cache TTL in seconds
+SECTION_TTLS = {
+    'overview': 60,
+    'sales': 120,
+    'shops': 300,
+    'inventory': 300,
+    'staff': 600,
+    'activity': 30,
+}
+
+# Model -> sections whose data it feeds
+SECTION_DEPENDENCIES = {
+    Sale: ('overview', 'sales', 'shops', 'staff', 'activity'),
+    Product: ('overview', 'inventory'),
+    StockLog: ('inventory', 'activity'),
+    User: ('overview', 'staff', 'activity'),
+    Shop: ('overview', 'shops'),
+    RegisterSession: ('overview', 'activity'),
+}
+
+_shop_businesses = {}
+
+
+def _fragment_key(business_id, section):
+    return f"business:{business_id}:dashboard:{section}"
+
+
+def get_fragment(business_id, section):
+    try:
+        return cache.get(_fragment_key(business_id, section))
+    except Exception as e:
+        logger.error(f"Dashboard cache unavailable for business {business_id}: {e}")
+        return None
+
+
+def set_fragment(business_id, section, html):
+    try:
+        cache.set(_fragment_key(business_id, section), html, timeout=SECTION_TTLS[section])
+    except Exception as e:
+        logger.error(f"Failed to cache dashboard section {section} for business {business_id}: {e}")
+
+
+def invalidate_sections(business_id, sections=None):
+    """Drop cached fragments for a business (all sections by default)."""
+    keys = [_fragment_key(business_id, s) for s in (sections or SECTION_TTLS)]
+    try:
+        cache.delete_many(*keys)
+    except Exception as e:
+        logger.error(f"Failed to invalidate dashboard for business {business_id}: {e}")
+
+
+def _business_for(obj, connection):
+    if getattr(obj, 'business_id', None) is not None:  # Shop, User
+        return obj.business_id
+    shop_id = getattr(obj, 'shop_id', None)
+    if shop_id is None:
+        return None
+    if shop_id not in _shop_businesses:
+        _shop_businesses[shop_id] = connection.execute(
+            text("SELECT business_id FROM shops WHERE id = :shop_id"), {'shop_id': shop_id}
+        ).scalar()
+    return _shop_businesses[shop_id]
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_sections(session, flush_context):
+    touched = session.info.setdefault('dashboard_touched_sections', {})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        sections = SECTION_DEPENDENCIES.get(type(obj))
+        if not sections:
+            continue
+        business_id = _business_for(obj, session.connection())
+        if business_id is not None:
+            touched.setdefault(business_id, set()).update(sections)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_touched_sections(session):
+    touched = session.info.pop('dashboard_touched_sections', None)
+    for business_id, sections in (touched or {}).items():
+        invalidate_sections(business_id, sections)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_touched_sections(session):
+    session.info.pop('dashboard_touched_sections', None)
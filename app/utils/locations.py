@@ -0,0 +1,133 @@
+"""
+County / subcounty / ward reference data.
+
+load_locations() applies data/county_locations.json with one existing-row
+query and at most one bulk insert per level, adding only what is missing.
+get_location_directory() serves the lookups behind the address forms from an
+immutable in-process snapshot, built once per worker on first use.
+"""
+import json
+import logging
+import threading
+from collections import namedtuple
+from pathlib import Path
+from types import MappingProxyType
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app import db
+from app.models import County, SubCounty, Ward
+
+logger = logging.getLogger(__name__)
+
+Location = namedtuple('Location', 'id name code')
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def default_locations_path():
+    return Path(current_app.root_path) / 'data' / 'county_locations.json'
+
+
+def load_locations(path=None):
+    """
+    Insert the counties, subcounties and wards from the JSON file that are not
+    in the database yet. Returns {'counties': n, 'subcounties': n, 'wards': n}.
+    """
+    with open(path or default_locations_path()) as f:
+        data = json.load(f)
+    counties = data['counties']
+    inserted = {}
+
+    existing = dict(db.session.query(County.name, County.id))
+    rows = [
+        {'name': c['name'], 'code': c['code']}
+        for c in counties if c['name'] not in existing
+    ]
+    if rows:
+        db.session.execute(insert(County), rows)
+        existing = dict(db.session.query(County.name, County.id))
+    inserted['counties'] = len(rows)
+    county_ids = existing
+
+    # Subcounty names are unique across counties
+    existing = dict(db.session.query(SubCounty.name, SubCounty.id))
+    rows = [
+        {'name': sc['name'], 'code': sc['code'], 'county_id': county_ids[c['name']]}
+        for c in counties for sc in c['subcounties'] if sc['name'] not in existing
+    ]
+    if rows:
+        db.session.execute(insert(SubCounty), rows)
+        existing = dict(db.session.query(SubCounty.name, SubCounty.id))
+    inserted['subcounties'] = len(rows)
+    subcounty_ids = existing
+
+    existing = set(db.session.query(Ward.subcounty_id, Ward.name))
+    rows = []
+    for c in counties:
+        for sc in c['subcounties']:
+            for ward_name in sc['wards']:
+                key = (subcounty_ids[sc['name']], ward_name)
+                if key not in existing:
+                    existing.add(key)
+                    rows.append({'subcounty_id': key[0], 'name': ward_name})
+    if rows:
+        db.session.execute(insert(Ward), rows)
+    inserted['wards'] = len(rows)
+
+    db.session.commit()
+    logger.info(f"Location data loaded: {inserted}")
+    return inserted
+
+
+class LocationDirectory:
+    """Read-only snapshot of the location hierarchy, ordered by name."""
+
+    def __init__(self, counties, subcounties, wards):
+        self.counties = tuple(counties)
+        self._subcounties = MappingProxyType({k: tuple(v) for k, v in subcounties.items()})
+        self._wards = MappingProxyType({k: tuple(v) for k, v in wards.items()})
+
+    def subcounties(self, county_id):
+        return self._subcounties.get(_as_int(county_id), ())
+
+    def wards(self, subcounty_id):
+        return self._wards.get(_as_int(subcounty_id), ())
+
+    def __bool__(self):
+        return bool(self.counties)
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_directory():
+    counties = [
+        Location(c.id, c.name, c.code)
+        for c in County.query.order_by(County.name).all()
+    ]
+    subcounties, wards = {}, {}
+    for sc in SubCounty.query.order_by(SubCounty.name).all():
+        subcounties.setdefault(sc.county_id, []).append(Location(sc.id, sc.name, sc.code))
+    for w in Ward.query.order_by(Ward.name).all():
+        wards.setdefault(w.subcounty_id, []).append(Location(w.id, w.name, None))
+    return LocationDirectory(counties, subcounties, wards)
+
+
+def get_location_directory():
+    """The worker's location snapshot; an empty table is re-read until it has data."""
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                directory = _build_directory()
+                if not directory:
+                    return directory
+                _directory = directory
+    return _directory
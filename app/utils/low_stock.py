@@ -0,0 +1,90 @@
+"""
+Low-stock detection against each product's own threshold.
+
+A product is low on stock while stock < low_stock_threshold
+(Product.is_low_stock). The per-shop low-stock set is the partial index
+ix_product_shop_low_stock, which Postgres keeps current on every stock
+write, so dashboards read it with low_stock_query() instead of scanning
+the shop's products.
+
+Every stock change passes through the stock ledger, which hands its
+movements to track(). That compares the level before and after against the
+threshold in the same transaction and, once the transaction commits, emits
+one low_stock_alert per product that dropped below its threshold to the
+shop's inventory_<shop_id> room.
+"""
+import logging
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import socketio
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def low_stock_query(shop_ids):
+    """Active products below their threshold in the given shop(s), lowest stock first."""
+    if isinstance(shop_ids, int):
+        shop_ids = [shop_ids]
+    return Product.query.filter(
+        Product.shop_id.in_(shop_ids),
+        Product.is_low_stock,
+        Product.is_deleted == False,  # noqa: E712
+        Product.is_active == True  # noqa: E712
+    ).order_by(Product.stock.asc())
+
+
+def track(session, movements):
+    """
+    Note threshold crossings for a batch of ledger movements. Each product's
+    level before the batch is taken from its first movement (none for an
+    opening balance), its level after from the last.
+    """
+    levels = {}
+    for movement in movements:
+        product_id = movement['product_id']
+        if product_id not in levels:
+            before = None if movement['movement_type'] == 'opening' else \
+                movement['stock_after'] - movement['quantity']
+            levels[product_id] = [before, None]
+        levels[product_id][1] = movement['stock_after']
+
+    rows = session.connection().execute(
+        select(Product.id, Product.shop_id, Product.name, Product.low_stock_threshold)
+        .where(Product.id.in_(list(levels)))
+    ).all()
+
+    crossings = session.info.setdefault('low_stock_crossings', {})
+    for row in rows:
+        threshold = row.low_stock_threshold or 0
+        before, after = levels[row.id]
+        is_low = after < threshold
+        was_low = before is not None and before < threshold
+        if is_low and not was_low:
+            crossings[row.id] = {
+                'shop_id': row.shop_id,
+                'product_id': row.id,
+                'product_name': row.name,
+                'stock': float(after),
+                'threshold': threshold,
+            }
+        elif was_low and not is_low:
+            # Restocked within the same transaction
+            crossings.pop(row.id, None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _emit_low_stock_alerts(session):
+    crossings = session.info.pop('low_stock_crossings', None)
+    for alert in (crossings or {}).values():
+        try:
+            socketio.emit('low_stock_alert', alert, room=f"inventory_{alert['shop_id']}")
+        except Exception as e:
+            logger.error(f"Failed to emit low stock alert for product {alert['product_id']}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_low_stock_alerts(session):
+    session.info.pop('low_stock_crossings', None)
@@ -0,0 +1,192 @@
+"""
+Keyset (cursor) pagination and approximate listing totals.
+
+keyset_paginate() pages a query by its sort key instead of OFFSET: the
+cursor carries the key of the last (or first) row shown and the next page
+is a row-comparison range scan on a composite index, so any page costs the
+same as the first. Cursors are opaque URL-safe tokens.
+
+Totals come from per-shop counters in the cache instead of COUNT(*) per
+request: a counter is seeded with one COUNT when missing, kept current by
+committed ORM inserts and deletes, adjusted explicitly by bulk writers, and
+expires after a while so any drift corrects itself.
+"""
+import base64
+import json
+import logging
+from datetime import datetime, date
+
+from flask import current_app
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+
+from app import cache
+from app.models import Product, StockLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+DEFAULT_COUNTER_TTL = 3600
+
+# Listings with a maintained per-shop total
+COUNTED_MODELS = {Product: 'products', StockLog: 'stock_logs'}
+
+
+class KeysetPage:
+    """One page of rows plus the cursors to its neighbours."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, (datetime, date)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Key values from a cursor, typed like `columns`; None for a missing or malformed cursor."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        typed = []
+        for value, column in zip(values, columns):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            typed.append(value)
+        return typed
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def page_size(value, default=DEFAULT_PER_PAGE):
+    try:
+        return max(1, min(int(value), MAX_PER_PAGE))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_paginate(query, columns, key, after=None, before=None, per_page=DEFAULT_PER_PAGE,
+                    descending=False, total=None):
+    """
+    Page `query` ordered by `columns` (unique together, last one the primary
+    key). `key(row)` returns a row's values for those columns. Pass the
+    `after` cursor for the next page or `before` for the previous one.
+    """
+    after_values = decode_cursor(after, columns)
+    before_values = None if after_values else decode_cursor(before, columns)
+    row_key = tuple_(*columns)
+
+    backwards = before_values is not None
+    if after_values:
+        query = query.filter(row_key < tuple(after_values) if descending else row_key > tuple(after_values))
+    elif backwards:
+        query = query.filter(row_key > tuple(before_values) if descending else row_key < tuple(before_values))
+
+    ascending = descending == backwards
+    rows = query.order_by(*[c.asc() if ascending else c.desc() for c in columns]).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after_values is not None, more
+
+    return KeysetPage(
+        rows,
+        per_page,
+        next_cursor=encode_cursor(key(rows[-1])) if has_next and rows else None,
+        prev_cursor=encode_cursor(key(rows[0])) if has_prev and rows else None,
+        total=total,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Approximate totals
+# ---------------------------------------------------------------------------
+
+def _counter_key(name, shop_id):
+    return f"listing_count:{name}:{shop_id}"
+
+
+def approximate_total(name, shop_id, count_query):
+    """The shop's maintained total for a listing, seeded from count_query() when missing."""
+    key = _counter_key(name, shop_id)
+    try:
+        total = cache.get(key)
+        if total is not None:
+            return int(total)
+    except Exception as e:
+        logger.error(f"Listing counter {key} unavailable: {e}")
+        return count_query()
+
+    total = count_query()
+    try:
+        cache.add(key, total, timeout=current_app.config.get('LISTING_COUNTER_TTL', DEFAULT_COUNTER_TTL))
+    except Exception as e:
+        logger.error(f"Failed to seed listing counter {key}: {e}")
+    return total
+
+
+def adjust_total(name, shop_id, delta):
+    """Apply a committed insert/delete count to a seeded counter (bulk writers call this)."""
+    if not delta or shop_id is None:
+        return
+    key = _counter_key(name, shop_id)
+    try:
+        if cache.get(key) is None:
+            return
+        if delta > 0:
+            cache.inc(key, delta)
+        else:
+            cache.dec(key, -delta)
+    except Exception as e:
+        logger.error(f"Failed to adjust listing counter {key}: {e}")
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_count_changes(session, flush_context):
+    changes = session.info.setdefault('listing_count_changes', {})
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            name = COUNTED_MODELS.get(type(obj))
+            if name is not None and obj.shop_id is not None:
+                changes[(name, obj.shop_id)] = changes.get((name, obj.shop_id), 0) + sign
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_count_changes(session):
+    for (name, shop_id), delta in (session.info.pop('listing_count_changes', None) or {}).items():
+        adjust_total(name, shop_id, delta)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_count_changes(session):
+    session.info.pop('listing_count_changes', None)
@@ -0,0 +1,154 @@
+"""
+Product image renditions.
+
+An upload is decoded once, and every rendition (POS tile, list thumbnail,
+detail view) is written up front as WebP and JPEG under a name derived from
+the SHA-256 of the uploaded bytes: ``<digest>-<rendition>.<ext>``. Names
+never change meaning, so they are served as immutable and re-uploading the
+same picture reuses the files already on disk.
+
+Product.image_url stores the detail JPEG path. rendition_url() maps it (and
+the product_image_url filter) to any other rendition; images stored before
+the pipeline, or hosted elsewhere, are passed through unchanged. Pages and
+POS payloads offer the WebP rendition (webp_url(), the product_image_webp
+filter) with the JPEG as fallback, via <picture>.
+
+Pillow is imported on first use, like the document renderers.
+"""
+import hashlib
+import logging
+import os
+import re
+from io import BytesIO
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# name: (width, height, square crop)
+RENDITIONS = {
+    'tile': (240, 240, True),
+    'thumb': (96, 96, True),
+    'detail': (800, 800, False),
+}
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+QUALITY = 82
+DIGEST_LENGTH = 20
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+URL_PREFIX = '/products/image/'  # serve_product_image
+
+RENDITION_NAME = re.compile(
+    r'^(?P<digest>[0-9a-f]{%d})-(?P<rendition>%s)\.(?P<ext>%s)$'
+    % (DIGEST_LENGTH, '|'.join(RENDITIONS), '|'.join(FORMATS))
+)
+
+
+class ProductImageError(ValueError):
+    """The upload is not an image we can process."""
+
+
+def image_directory():
+    return os.path.join(current_app.root_path, 'static', 'products')
+
+
+def rendition_filename(digest, rendition, ext):
+    return f"{digest}-{rendition}.{ext}"
+
+
+def store_product_image(stream):
+    """
+    Decode an uploaded image and write any of its renditions not on disk yet.
+    Returns the value to store in Product.image_url.
+    """
+    data = stream.read(current_app.config.get('PRODUCT_IMAGE_MAX_BYTES', DEFAULT_MAX_BYTES) + 1)
+    if len(data) > current_app.config.get('PRODUCT_IMAGE_MAX_BYTES', DEFAULT_MAX_BYTES):
+        raise ProductImageError("Image is too large.")
+
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ProductImageError("File is not a supported image.")
+
+    digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+    directory = image_directory()
+    os.makedirs(directory, exist_ok=True)
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        # JPEG has no alpha: flatten transparent images onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+
+    for rendition, (width, height, crop) in RENDITIONS.items():
+        targets = {
+            ext: os.path.join(directory, rendition_filename(digest, rendition, ext))
+            for ext in FORMATS
+        }
+        if all(os.path.exists(path) for path in targets.values()):
+            continue
+        if crop:
+            resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, height), Image.LANCZOS)
+        for ext, path in targets.items():
+            # Write then rename, so a half-written file is never served
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp_path, FORMATS[ext], quality=QUALITY, optimize=True)
+            os.replace(tmp_path, path)
+
+    return URL_PREFIX + rendition_filename(digest, 'detail', 'jpg')
+
+
+def rendition_url(image_url, rendition='tile', ext='jpg'):
+    """URL of another rendition of a pipeline image; other URLs are returned as they are."""
+    if not image_url:
+        return image_url
+    match = RENDITION_NAME.match(image_url.rsplit('/', 1)[-1])
+    if match is None:
+        return image_url
+    return URL_PREFIX + rendition_filename(match['digest'], rendition, ext)
+
+
+def webp_url(image_url, rendition='tile'):
+    """
+    URL of the WebP rendition of a pipeline image, or None for other images,
+    which have no WebP version. Served with the JPEG URL as its fallback.
+    """
+    if not image_url:
+        return None
+    match = RENDITION_NAME.match(image_url.rsplit('/', 1)[-1])
+    if match is None:
+        return None
+    return URL_PREFIX + rendition_filename(match['digest'], rendition, 'webp')
+
+
+def is_rendition(filename):
+    return RENDITION_NAME.match(filename) is not None
+
+
+def build_missing_renditions(products):
+    """
+    Run locally stored pre-pipeline images through the pipeline and point
+    the products at the result. Returns the number of products converted.
+    """
+    converted = 0
+    for product in products:
+        filename = (product.image_url or '').rsplit('/', 1)[-1]
+        if not filename or is_rendition(filename) or product.image_url.startswith(('http://', 'https://')):
+            continue
+        path = os.path.join(image_directory(), filename)
+        if not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'rb') as f:
+                product.image_url = store_product_image(f)
+            converted += 1
+        except ProductImageError as e:
+            logger.warning(f"Skipping image of product {product.id}: {e}")
+    return converted
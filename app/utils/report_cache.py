@@ -0,0 +1,338 @@
+"""
+Day-partial cache for sales reports.
+
+Every report (daily, weekly, monthly) is assembled from per-shop, per-day
+partials. A partial is keyed by the day's watermark, a token that is replaced
+whenever a sale touching that day is committed, so a stale partial can never
+be served. Days are shop-local business days (Sale.business_date). Closed
+days are cached without expiry; the current day gets a short TTL so only
+today is ever recomputed on a warm cache.
+"""
+import logging
+import time as time_module
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+
+from app import cache
+from app.models import Sale, CartItem, Product, SaleStatus
+from app.utils.time import get_shop_timezone, to_business_time, shop_today
+
+logger = logging.getLogger(__name__)
+
+# Bump when the partial layout changes so old entries are ignored
+PARTIAL_VERSION = 2
+DEFAULT_OPEN_DAY_TIMEOUT = 60
+
+
+def _watermark_key(shop_id, day):
+    return f"shop:{shop_id}:day_watermark:{day.isoformat()}"
+
+
+def _partial_key(shop_id, day, watermark):
+    return f"shop:{shop_id}:day_partial:v{PARTIAL_VERSION}:{day.isoformat()}:{watermark}"
+
+
+def _new_token():
+    return str(time_module.time_ns())
+
+
+def sale_day(sale):
+    """Return the business day (shop local) a sale belongs to."""
+    if sale.business_date is not None:
+        return sale.business_date
+    return to_business_time(sale.date or datetime.utcnow(), get_shop_timezone(sale.shop_id)).date()
+
+
+def _sale_hour(sale):
+    if sale.business_hour is not None:
+        return sale.business_hour
+    return to_business_time(sale.date, get_shop_timezone(sale.shop_id)).hour
+
+
+def is_day_closed(shop_id, day):
+    """A day is closed once it is strictly before the shop's local today."""
+    return day < shop_today(shop_id)
+
+
+def bump_day_watermark(shop_id, day):
+    """Invalidate every cached partial for a shop's day."""
+    try:
+        cache.set(_watermark_key(shop_id, day), _new_token(), timeout=0)
+    except Exception as e:
+        logger.error(f"Failed to bump report watermark for shop {shop_id} on {day}: {e}")
+
+
+def get_day_watermarks(shop_id, days):
+    """
+    Return {day: watermark} for the given days.
+    A missing watermark (never bumped, or evicted) is initialised to a fresh
+    token so it can never resolve to a partial cached under an older one.
+    """
+    keys = [_watermark_key(shop_id, day) for day in days]
+    values = cache.get_many(*keys) if keys else []
+    watermarks = {}
+    for day, key, value in zip(days, keys, values):
+        if value is None:
+            token = _new_token()
+            cache.add(key, token, timeout=0)
+            value = cache.get(key) or token
+        watermarks[day] = value
+    return watermarks
+
+
+def _empty_partial(day):
+    return {
+        'date': day,
+        'total_sales': Decimal('0.0'),
+        'total_profit': Decimal('0.0'),
+        'total_cost': Decimal('0.0'),
+        'transactions': 0,
+        'refunds': 0,
+        'products_sold': Decimal('0'),
+        'payment_methods': {},
+        'hourly': {},
+        'products': {},
+        'staff': {},
+        'customers': {},
+        'sales': []
+    }
+
+
+def _customer_segment(sale):
+    if sale.payment_method == 'pay_on_delivery':
+        return 'credit'
+    if sale.customer_name or sale.customer_phone:
+        return 'identified'
+    return 'walk-in'
+
+
+def _add_sale_to_partial(partial, sale):
+    sale_total = Decimal(str(sale.total))
+    sale_profit = Decimal(str(sale.profit)) if sale.profit else Decimal('0.0')
+    username = sale.user.username if sale.user else None
+
+    partial['total_sales'] += sale_total
+    partial['total_profit'] += sale_profit
+    partial['transactions'] += 1
+    if sale.status == SaleStatus.CANCELLED:
+        partial['refunds'] += 1
+
+    method = partial['payment_methods'].setdefault(
+        sale.payment_method or 'Unknown', {'total': Decimal('0.0'), 'count': 0})
+    method['total'] += sale_total
+    method['count'] += 1
+
+    hour = partial['hourly'].setdefault(_sale_hour(sale), {'sales': Decimal('0.0'), 'transactions': 0})
+    hour['sales'] += sale_total
+    hour['transactions'] += 1
+
+    customer = partial['customers'].setdefault(_customer_segment(sale), {'total': Decimal('0.0'), 'count': 0})
+    customer['total'] += sale_total
+    customer['count'] += 1
+
+    items = []
+    sale_quantity = Decimal('0')
+    for item in sale.cart_items:
+        product = item.product
+        if not product:
+            continue
+        quantity = Decimal(str(item.quantity))
+        revenue = Decimal(str(item.total_price))
+        cost = Decimal(str(product.cost_price)) * quantity if product.cost_price else Decimal('0.0')
+
+        stats = partial['products'].setdefault(product.name, {
+            'quantity': Decimal('0'),
+            'revenue': Decimal('0.0'),
+            'cost': Decimal('0.0'),
+            'sale_ids': set(),
+            'categories': set()
+        })
+        stats['quantity'] += quantity
+        stats['revenue'] += revenue
+        stats['cost'] += cost
+        stats['sale_ids'].add(sale.id)
+        if product.category:
+            stats['categories'].add(product.category.name)
+
+        partial['total_cost'] += cost
+        sale_quantity += quantity
+        items.append({
+            'product': {'name': product.name},
+            'quantity': item.quantity,
+            'total_price': float(item.total_price)
+        })
+
+    partial['products_sold'] += sale_quantity
+
+    if username:
+        staff = partial['staff'].setdefault(username, {
+            'sales_count': 0,
+            'sales_value': Decimal('0.0'),
+            'profit': Decimal('0.0'),
+            'products_sold': Decimal('0')
+        })
+        staff['sales_count'] += 1
+        staff['sales_value'] += sale_total
+        staff['profit'] += sale_profit
+        staff['products_sold'] += sale_quantity
+
+    # Plain dicts so the partial can be pickled into the cache
+    partial['sales'].append({
+        'id': sale.id,
+        'date': to_business_time(sale.date, get_shop_timezone(sale.shop_id)),
+        'total': float(sale.total),
+        'profit': float(sale.profit or 0),
+        'payment_method': sale.payment_method,
+        'customer_name': sale.customer_name,
+        'user': {'username': username} if username else None,
+        'cart_items': items
+    })
+
+
+def _build_partials(shop_id, days):
+    """Build partials for the given days with a single range query."""
+    sales = Sale.query.filter(
+        Sale.shop_id == shop_id,
+        Sale.business_date >= min(days),
+        Sale.business_date <= max(days)
+    ).options(
+        joinedload(Sale.cart_items).joinedload(CartItem.product).joinedload(Product.category),
+        joinedload(Sale.user)
+    ).order_by(Sale.date.desc()).all()
+
+    partials = {day: _empty_partial(day) for day in days}
+    for sale in sales:
+        partial = partials.get(sale_day(sale))
+        if partial is not None:
+            _add_sale_to_partial(partial, sale)
+    return partials
+
+
+def get_day_partials(shop_id, start_day, end_day):
+    """
+    Return an OrderedDict of {day: partial} for start_day..end_day inclusive.
+    Cached partials are reused; the missing ones are built in one query.
+    """
+    days = [start_day + timedelta(days=n) for n in range((end_day - start_day).days + 1)]
+    if not days:
+        return OrderedDict()
+
+    try:
+        watermarks = get_day_watermarks(shop_id, days)
+        keys = {day: _partial_key(shop_id, day, watermarks[day]) for day in days}
+        cached = dict(zip(days, cache.get_many(*keys.values())))
+    except Exception as e:
+        logger.error(f"Report cache unavailable for shop {shop_id}: {e}")
+        return OrderedDict(sorted(_build_partials(shop_id, days).items()))
+
+    missing = [day for day in days if cached.get(day) is None]
+    if missing:
+        built = _build_partials(shop_id, missing)
+        open_timeout = current_app.config.get('REPORT_OPEN_DAY_TIMEOUT', DEFAULT_OPEN_DAY_TIMEOUT)
+        closed = {keys[day]: built[day] for day in missing if is_day_closed(shop_id, day)}
+        still_open = {keys[day]: built[day] for day in missing if not is_day_closed(shop_id, day)}
+        try:
+            if closed:
+                cache.set_many(closed, timeout=0)
+            if still_open:
+                cache.set_many(still_open, timeout=open_timeout)
+        except Exception as e:
+            logger.error(f"Failed to store report partials for shop {shop_id}: {e}")
+        cached.update(built)
+
+    return OrderedDict((day, cached[day]) for day in days)
+
+
+def get_day_partial(shop_id, day):
+    """Return the partial for a single day."""
+    return get_day_partials(shop_id, day, day)[day]
+
+
+def merge_day_partials(partials):
+    """Fold a sequence of day partials into one partial of the same shape."""
+    partials = list(partials)
+    merged = _empty_partial(partials[0]['date'] if partials else None)
+
+    for partial in partials:
+        for field in ('total_sales', 'total_profit', 'total_cost', 'transactions', 'refunds', 'products_sold'):
+            merged[field] += partial[field]
+
+        for name, data in partial['payment_methods'].items():
+            target = merged['payment_methods'].setdefault(name, {'total': Decimal('0.0'), 'count': 0})
+            target['total'] += data['total']
+            target['count'] += data['count']
+
+        for hour, data in partial['hourly'].items():
+            target = merged['hourly'].setdefault(hour, {'sales': Decimal('0.0'), 'transactions': 0})
+            target['sales'] += data['sales']
+            target['transactions'] += data['transactions']
+
+        for segment, data in partial['customers'].items():
+            target = merged['customers'].setdefault(segment, {'total': Decimal('0.0'), 'count': 0})
+            target['total'] += data['total']
+            target['count'] += data['count']
+
+        for name, data in partial['products'].items():
+            target = merged['products'].setdefault(name, {
+                'quantity': Decimal('0'),
+                'revenue': Decimal('0.0'),
+                'cost': Decimal('0.0'),
+                'sale_ids': set(),
+                'categories': set()
+            })
+            target['quantity'] += data['quantity']
+            target['revenue'] += data['revenue']
+            target['cost'] += data['cost']
+            target['sale_ids'] |= data['sale_ids']
+            target['categories'] |= data['categories']
+
+        for username, data in partial['staff'].items():
+            target = merged['staff'].setdefault(username, {
+                'sales_count': 0,
+                'sales_value': Decimal('0.0'),
+                'profit': Decimal('0.0'),
+                'products_sold': Decimal('0')
+            })
+            for field in target:
+                target[field] += data[field]
+
+        merged['sales'].extend(partial['sales'])
+
+    merged['sales'].sort(key=lambda s: s['date'], reverse=True)
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# Watermark maintenance: any committed sale insert/update/delete bumps the
+# watermark of every (shop, day) it touches, including the old day of a
+# backdated edit.
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_days(session, flush_context):
+    touched = session.info.setdefault('report_touched_days', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Sale) or obj.shop_id is None:
+            continue
+        touched.add((obj.shop_id, sale_day(obj)))
+        history = inspect(obj).attrs.business_date.history
+        for old_day in history.deleted or ():
+            if old_day is not None:
+                touched.add((obj.shop_id, old_day))
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_touched_days(session):
+    touched = session.info.pop('report_touched_days', None)
+    for shop_id, day in touched or ():
+        bump_day_watermark(shop_id, day)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_touched_days(session):
+    session.info.pop('report_touched_days', None)
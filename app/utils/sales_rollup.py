@@ -0,0 +1,183 @@
+"""
+Per-(business, shop, day) sales rollup maintenance.
+
+Every flush that writes a sale updates the rollup row of each
+(shop, business_date) it touches, inside the same transaction, so a rolled
+back sale rolls back its rollup change too. New sales are added to their
+row with an upsert, which concurrent checkouts in one shop can run side by
+side; edited or deleted sales recompute their row under a row lock from the
+(shop_id, business_date) index. rebuild_rollup() is the set-based backfill
+used by the migration and the ``rebuild-sales-rollup`` command.
+
+business_id is copied from the shop and is NULL for shops outside a
+business; shop-level readers still use those rows.
+"""
+import logging
+
+from sqlalchemy import event, func, inspect, insert, select, update, delete, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import Sale, Shop, ShopDailySales
+
+logger = logging.getLogger(__name__)
+
+
+def _rollup_select(*criteria):
+    return select(
+        Sale.shop_id,
+        Shop.business_id,
+        Sale.business_date,
+        func.coalesce(func.sum(Sale.total), 0),
+        func.coalesce(func.sum(Sale.profit), 0),
+        func.count(Sale.id),
+        func.max(Sale.total),
+        func.min(Sale.total),
+    ).join(
+        Shop, Shop.id == Sale.shop_id
+    ).where(
+        Sale.is_deleted == False,
+        Sale.business_date.isnot(None),
+        *criteria
+    ).group_by(
+        Sale.shop_id, Shop.business_id, Sale.business_date
+    )
+
+
+_ROLLUP_COLUMNS = [
+    'shop_id', 'business_id', 'business_date', 'total_sales', 'total_profit',
+    'transaction_count', 'largest_sale', 'smallest_sale'
+]
+
+
+def add_sales(connection, totals):
+    """
+    Fold newly inserted sales into their rollup rows with one upsert per
+    (shop_id, business_date): {key: (total, profit, count, largest, smallest)}.
+    Adding to the row (rather than recomputing it) is what keeps concurrent
+    checkouts in a shop from overwriting or colliding with each other.
+    """
+    table = ShopDailySales.__table__
+    for (shop_id, day), (total, profit, count, largest, smallest) in sorted(totals.items()):
+        stmt = pg_insert(table).values(
+            shop_id=shop_id,
+            business_id=select(Shop.business_id).where(Shop.id == shop_id).scalar_subquery(),
+            business_date=day,
+            total_sales=total,
+            total_profit=profit,
+            transaction_count=count,
+            largest_sale=largest,
+            smallest_sale=smallest,
+        )
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['shop_id', 'business_date'],
+            set_={
+                'total_sales': table.c.total_sales + stmt.excluded.total_sales,
+                'total_profit': table.c.total_profit + stmt.excluded.total_profit,
+                'transaction_count': table.c.transaction_count + stmt.excluded.transaction_count,
+                'largest_sale': func.greatest(table.c.largest_sale, stmt.excluded.largest_sale),
+                'smallest_sale': func.least(table.c.smallest_sale, stmt.excluded.smallest_sale),
+            }
+        ))
+
+
+def refresh_days(connection, shop_days):
+    """
+    Recompute the rollup rows for the given (shop_id, business_date) pairs,
+    after edits or deletions that a delta cannot express. The row is locked
+    before the sales are aggregated, so the aggregate sees every sale
+    committed by a checkout that held it.
+    """
+    table = ShopDailySales.__table__
+    for shop_id, day in shop_days:
+        row_criteria = and_(table.c.shop_id == shop_id, table.c.business_date == day)
+        # Make sure there is a row to lock (waits out a concurrent first sale of the day)
+        connection.execute(pg_insert(table).values(
+            shop_id=shop_id,
+            business_id=select(Shop.business_id).where(Shop.id == shop_id).scalar_subquery(),
+            business_date=day,
+        ).on_conflict_do_nothing(index_elements=['shop_id', 'business_date']))
+        connection.execute(select(table.c.id).where(row_criteria).with_for_update())
+
+        row = connection.execute(select(
+            func.coalesce(func.sum(Sale.total), 0).label('total'),
+            func.coalesce(func.sum(Sale.profit), 0).label('profit'),
+            func.count(Sale.id).label('count'),
+            func.max(Sale.total).label('largest'),
+            func.min(Sale.total).label('smallest'),
+        ).where(
+            Sale.shop_id == shop_id,
+            Sale.business_date == day,
+            Sale.is_deleted == False
+        )).one()
+
+        if not row.count:
+            connection.execute(delete(table).where(row_criteria))
+            continue
+        connection.execute(update(table).where(row_criteria).values(
+            total_sales=row.total,
+            total_profit=row.profit,
+            transaction_count=row.count,
+            largest_sale=row.largest,
+            smallest_sale=row.smallest,
+        ))
+
+
+def rebuild_rollup(connection, shop_ids=None, start_date=None):
+    """
+    Rebuild the rollup in bulk, optionally limited to some shops and/or to
+    days on or after start_date. Returns the number of rows written.
+    """
+    table = ShopDailySales.__table__
+    sale_criteria, row_criteria = [], []
+    if shop_ids is not None:
+        sale_criteria.append(Sale.shop_id.in_(shop_ids))
+        row_criteria.append(table.c.shop_id.in_(shop_ids))
+    if start_date is not None:
+        sale_criteria.append(Sale.business_date >= start_date)
+        row_criteria.append(table.c.business_date >= start_date)
+
+    stmt = delete(table)
+    if row_criteria:
+        stmt = stmt.where(and_(*row_criteria))
+    connection.execute(stmt)
+    result = connection.execute(insert(table).from_select(
+        _ROLLUP_COLUMNS, _rollup_select(*sale_criteria)
+    ))
+    return result.rowcount
+
+
+# Sale attributes the rollup is computed from
+_ROLLUP_ATTRIBUTES = ('shop_id', 'business_date', 'total', 'profit', 'is_deleted')
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_touched_days(session, flush_context):
+    added, touched = {}, set()
+    for obj in session.new:
+        if not isinstance(obj, Sale) or obj.shop_id is None or obj.business_date is None or obj.is_deleted:
+            continue
+        total, profit = obj.total or 0, obj.profit or 0
+        key = (obj.shop_id, obj.business_date)
+        if key in added:
+            t, p, c, largest, smallest = added[key]
+            added[key] = (t + total, p + profit, c + 1, max(largest, total), min(smallest, total))
+        else:
+            added[key] = (total, profit, 1, total, total)
+
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Sale):
+            continue
+        state = inspect(obj)
+        if obj not in session.deleted and not any(
+                state.attrs[key].history.has_changes() for key in _ROLLUP_ATTRIBUTES):
+            continue
+        shops = {obj.shop_id, *(state.attrs.shop_id.history.deleted or ())}
+        days = {obj.business_date, *(state.attrs.business_date.history.deleted or ())}
+        touched.update((shop_id, day) for shop_id in shops for day in days
+                       if shop_id is not None and day is not None)
+
+    if added:
+        add_sales(session.connection(), added)
+    if touched:
+        refresh_days(session.connection(), sorted(touched))
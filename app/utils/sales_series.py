@@ -0,0 +1,198 @@
+"""
+Sales time series with server-side bucket sizing.
+
+Each chart range maps to a bucket size (hour/day/week/month) and bucket
+count. Day/week/month buckets are summed from the per-shop daily rollup;
+completed buckets are cached without expiry under the shop's history
+version, and only the current bucket is read live. A committed sale write on
+a closed business day bumps the history version so backdated edits are
+never masked. Hourly buckets cover the current day only and are read live
+from the (shop_id, business_date, business_hour) index.
+"""
+import logging
+import time as time_module
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from app import cache, db
+from app.models import Sale, ShopDailySales
+from app.utils.time import get_shop_timezone, shop_today
+
+logger = logging.getLogger(__name__)
+
+# range -> (bucket size, bucket count, label format)
+RANGES = OrderedDict([
+    ('day', ('hour', 24, '%H:00')),
+    ('week', ('day', 7, '%a %d')),
+    ('month', ('day', 30, '%b %d')),
+    ('quarter', ('week', 13, '%d %b')),
+    ('year', ('month', 12, '%b %Y')),
+])
+DEFAULT_RANGE = 'month'
+
+
+def _history_key(shop_id):
+    return f"shop:{shop_id}:series_history"
+
+
+def _bucket_key(shop_id, size, start, version):
+    return f"shop:{shop_id}:series:{size}:{start.isoformat()}:{version}"
+
+
+def bucket_start(day, size):
+    if size == 'week':
+        return day - timedelta(days=day.weekday())
+    if size == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start, size):
+    if size == 'week':
+        return start + timedelta(days=7)
+    if size == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _previous_bucket(start, size):
+    if size == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    return start - (timedelta(days=7) if size == 'week' else timedelta(days=1))
+
+
+def get_history_version(shop_id):
+    key = _history_key(shop_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, str(time_module.time_ns()), timeout=0)
+        version = cache.get(key)
+    return version
+
+
+def bump_history_version(shop_id):
+    try:
+        cache.set(_history_key(shop_id), str(time_module.time_ns()), timeout=0)
+    except Exception as e:
+        logger.error(f"Failed to bump sales series history for shop {shop_id}: {e}")
+
+
+def _rollup_totals(shop_id, start, end):
+    """{business_date: total_sales} for [start, end] from the daily rollup."""
+    return dict(db.session.query(
+        ShopDailySales.business_date,
+        ShopDailySales.total_sales
+    ).filter(
+        ShopDailySales.shop_id == shop_id,
+        ShopDailySales.business_date >= start,
+        ShopDailySales.business_date <= end
+    ).all())
+
+
+def _fold(totals, buckets, size):
+    folded = {start: 0.0 for start in buckets}
+    for day, total in totals.items():
+        start = bucket_start(day, size)
+        if start in folded:
+            folded[start] += float(total or 0)
+    return folded
+
+
+def _hourly_series(shop_id, today):
+    rows = dict(db.session.query(
+        Sale.business_hour,
+        func.sum(Sale.total)
+    ).filter(
+        Sale.shop_id == shop_id,
+        Sale.business_date == today
+    ).group_by(Sale.business_hour).all())
+    return [float(rows.get(hour) or 0) for hour in range(24)]
+
+
+def get_sales_series(shop_id, range_name=DEFAULT_RANGE):
+    """
+    Return {'range', 'bucket', 'labels', 'values'} for a shop's chart range,
+    oldest bucket first, gaps zero-filled.
+    """
+    if range_name not in RANGES:
+        range_name = DEFAULT_RANGE
+    size, count, label_format = RANGES[range_name]
+    today = shop_today(shop_id)
+
+    if size == 'hour':
+        return {
+            'range': range_name,
+            'bucket': size,
+            'labels': [f"{hour:02d}:00" for hour in range(24)],
+            'values': _hourly_series(shop_id, today),
+        }
+
+    current = bucket_start(today, size)
+    buckets = [current]
+    while len(buckets) < count:
+        buckets.append(_previous_bucket(buckets[-1], size))
+    buckets.reverse()
+    completed = buckets[:-1]
+
+    values = {}
+    try:
+        version = get_history_version(shop_id)
+        keys = {start: _bucket_key(shop_id, size, start, version) for start in completed}
+        cached = dict(zip(completed, cache.get_many(*keys.values()))) if keys else {}
+    except Exception as e:
+        logger.error(f"Sales series cache unavailable for shop {shop_id}: {e}")
+        keys, cached = {}, {}
+
+    missing = [start for start in completed if cached.get(start) is None]
+    values.update({start: cached[start] for start in completed if cached.get(start) is not None})
+
+    if missing:
+        totals = _rollup_totals(shop_id, missing[0], _next_bucket(missing[-1], size) - timedelta(days=1))
+        built = _fold(totals, missing, size)
+        values.update(built)
+        if keys:
+            try:
+                cache.set_many({keys[start]: built[start] for start in missing}, timeout=0)
+            except Exception as e:
+                logger.error(f"Failed to cache sales series for shop {shop_id}: {e}")
+
+    # The current bucket is always read live
+    values.update(_fold(_rollup_totals(shop_id, current, today), [current], size))
+
+    return {
+        'range': range_name,
+        'bucket': size,
+        'labels': [start.strftime(label_format) for start in buckets],
+        'values': [values[start] for start in buckets],
+    }
+
+
+# ---------------------------------------------------------------------------
+# History version maintenance: writes to a closed day invalidate cached buckets
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _collect_backdated_shops(session, flush_context):
+    touched = session.info.setdefault('series_backdated_shops', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Sale) or obj.shop_id is None:
+            continue
+        days = [obj.business_date] + list(inspect(obj).attrs.business_date.history.deleted or ())
+        tz = get_shop_timezone(obj.shop_id, connection=session.connection())
+        local_today = datetime.now(tz).date()
+        if any(day is not None and day < local_today for day in days):
+            touched.add(obj.shop_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_backdated_shops(session):
+    for shop_id in session.info.pop('series_backdated_shops', None) or ():
+        bump_history_version(shop_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_backdated_shops(session):
+    session.info.pop('series_backdated_shops', None)
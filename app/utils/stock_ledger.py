@@ -0,0 +1,246 @@
+"""
+Stock movement ledger and daily stock snapshots.
+
+Every change to Product.stock made through the ORM is written to
+stock_movements by a flush hook, in bulk and in the same transaction. Code
+that changes stock with set-based statements (checkout, goods received,
+catalog import) appends its rows with record_movements(). The movement type
+and reference default to a manual adjustment; services that know better call
+set_movement_context() before flushing.
+
+take_snapshots() stores each product's stock at the close of a business day,
+so the stock of any product set at any moment is one snapshot read plus the
+movements since that snapshot (stock_at()). Each day's snapshots are also
+valued at weighted average cost (app.utils.valuation).
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from flask import has_request_context
+from sqlalchemy import event, func, insert, select, inspect, literal, Date, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Product, StockMovement, StockSnapshot
+from app.utils import low_stock, category_counters
+from app.utils.time import get_shop_timezone
+
+logger = logging.getLogger(__name__)
+
+SALE = 'sale'
+SETTLEMENT = 'settlement'
+RECEIPT = 'receipt'
+ADJUSTMENT = 'adjustment'
+TRANSFER = 'transfer'
+OPENING = 'opening'
+
+MOVEMENT_TYPES = (SALE, SETTLEMENT, RECEIPT, ADJUSTMENT, TRANSFER, OPENING)
+
+
+def set_movement_context(session, movement_type, reference_type=None, reference_id=None, user_id=None):
+    """Label the stock changes flushed by this session until its next commit or rollback."""
+    session.info['stock_movement_context'] = {
+        'movement_type': movement_type,
+        'reference_type': reference_type,
+        'reference_id': reference_id,
+        'user_id': user_id,
+    }
+
+
+def _current_user_id():
+    if not has_request_context():
+        return None
+    from flask_login import current_user
+    return current_user.id if current_user.is_authenticated else None
+
+
+def record_movements(session, movements):
+    """
+    Bulk-append movements in the session's transaction: dicts with shop_id,
+    product_id, movement_type, quantity (signed) and stock_after, plus
+    optional reference_type, reference_id, user_id and occurred_at. The
+    low-stock engine sees every batch; the category counters see the
+    batches of set-based writers (ORM changes reach them by their own hook).
+    """
+    if not movements:
+        return
+    _append_movements(session, movements)
+    category_counters.track_stock(session, movements)
+
+
+def _append_movements(session, movements):
+    now = datetime.utcnow()
+    user_id = _current_user_id()
+    rows = [
+        {
+            'reference_type': None,
+            'reference_id': None,
+            'user_id': user_id,
+            'occurred_at': now,
+            **movement,
+        }
+        for movement in movements
+    ]
+    session.connection().execute(insert(StockMovement.__table__), rows)
+    low_stock.track(session, rows)
+
+
+def take_snapshots(connection, shop_id, snapshot_date, as_of):
+    """
+    (Re)write the shop's snapshots for snapshot_date: current stock minus the
+    movements recorded after as_of. A product's unit cost is recorded the
+    first time its day is snapshotted and kept on re-runs, so valuations of
+    past days don't move to today's costs. Returns the number of rows written.
+    """
+    table = StockSnapshot.__table__
+    later = select(
+        StockMovement.product_id,
+        func.sum(StockMovement.quantity).label('quantity')
+    ).where(
+        StockMovement.shop_id == shop_id,
+        StockMovement.occurred_at > as_of
+    ).group_by(StockMovement.product_id).subquery()
+
+    stmt = pg_insert(table).from_select(
+        ['shop_id', 'product_id', 'snapshot_date', 'as_of', 'stock', 'unit_cost'],
+        select(
+            Product.shop_id,
+            Product.id,
+            literal(snapshot_date, Date),
+            literal(as_of, DateTime),
+            Product.stock - func.coalesce(later.c.quantity, 0),
+            Product.valuation_cost
+        ).outerjoin(
+            later, later.c.product_id == Product.id
+        ).where(Product.shop_id == shop_id)
+    )
+    result = connection.execute(stmt.on_conflict_do_update(
+        constraint='uq_stock_snapshot_day',
+        set_={
+            'shop_id': stmt.excluded.shop_id,
+            'as_of': stmt.excluded.as_of,
+            'stock': stmt.excluded.stock,
+            'unit_cost': func.coalesce(table.c.unit_cost, stmt.excluded.unit_cost),
+        }
+    ))
+    return result.rowcount
+
+
+def snapshot_shop(shop_id, snapshot_date=None):
+    """
+    Snapshot a shop at the close of snapshot_date in its own timezone
+    (default: its previous business day), value it and commit. Returns the
+    row count.
+    """
+    from app.utils.valuation import take_valuation
+
+    tz = get_shop_timezone(shop_id)
+    if snapshot_date is None:
+        snapshot_date = datetime.now(tz).date() - timedelta(days=1)
+    close = tz.localize(datetime.combine(snapshot_date + timedelta(days=1), time.min))
+    as_of = close.astimezone(pytz.utc).replace(tzinfo=None)
+
+    connection = db.session.connection()
+    rows = take_snapshots(connection, shop_id, snapshot_date, as_of)
+    take_valuation(connection, shop_id, snapshot_date)
+    db.session.commit()
+    return rows
+
+
+def stock_at(product_ids, at):
+    """
+    {product_id: stock} at the moment `at` (naive UTC): the latest snapshot at
+    or before `at` plus the movements between it and `at`. Products without
+    such a snapshot are rolled back from their current stock instead.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+
+    snapshots = {
+        row.product_id: row for row in db.session.query(
+            StockSnapshot.product_id, StockSnapshot.as_of, StockSnapshot.stock
+        ).filter(
+            StockSnapshot.product_id.in_(product_ids),
+            StockSnapshot.as_of <= at
+        ).distinct(StockSnapshot.product_id).order_by(
+            StockSnapshot.product_id, StockSnapshot.as_of.desc()
+        )
+    }
+
+    levels = {}
+    if snapshots:
+        since = min(row.as_of for row in snapshots.values())
+        moved = {}
+        for product_id, occurred_at, quantity in db.session.query(
+            StockMovement.product_id, StockMovement.occurred_at, StockMovement.quantity
+        ).filter(
+            StockMovement.product_id.in_(list(snapshots)),
+            StockMovement.occurred_at > since,
+            StockMovement.occurred_at <= at
+        ):
+            if occurred_at > snapshots[product_id].as_of:
+                moved[product_id] = moved.get(product_id, 0) + quantity
+        for product_id, row in snapshots.items():
+            levels[product_id] = row.stock + moved.get(product_id, 0)
+
+    rest = [product_id for product_id in product_ids if product_id not in snapshots]
+    if rest:
+        later = dict(db.session.query(
+            StockMovement.product_id, func.sum(StockMovement.quantity)
+        ).filter(
+            StockMovement.product_id.in_(rest),
+            StockMovement.occurred_at > at
+        ).group_by(StockMovement.product_id))
+        for product_id, stock in db.session.query(Product.id, Product.stock).filter(Product.id.in_(rest)):
+            levels[product_id] = stock - (later.get(product_id) or 0)
+    return levels
+
+
+# ---------------------------------------------------------------------------
+# ORM stock changes -> ledger rows, written in the same flush
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _record_orm_movements(session, flush_context):
+    context = session.info.get('stock_movement_context') or {}
+    movements = []
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Product):
+            continue
+        history = inspect(obj).attrs.stock.history
+        if not history.added:
+            continue
+        new = history.added[0] or 0
+        if obj in session.new:
+            old, movement_type = 0, OPENING
+        else:
+            old = history.deleted[0] if history.deleted else 0
+            movement_type = context.get('movement_type', ADJUSTMENT)
+        if new == old:
+            continue
+        movements.append({
+            'shop_id': obj.shop_id,
+            'product_id': obj.id,
+            'movement_type': movement_type,
+            'quantity': new - (old or 0),
+            'stock_after': new,
+            'reference_type': context.get('reference_type'),
+            'reference_id': context.get('reference_id'),
+            'user_id': context.get('user_id') or _current_user_id(),
+        })
+    if movements:
+        _append_movements(session, movements)
+
+
+@event.listens_for(Session, 'after_commit')
+def _clear_movement_context(session):
+    session.info.pop('stock_movement_context', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_movement_context(session):
+    session.info.pop('stock_movement_context', None)
@@ -0,0 +1,229 @@
+"""
+Request-scoped identity and tenant context.
+
+The logged-in user, their business, their shop and the shops they may access
+are resolved once per request and kept on ``g``. The column values behind
+them are cached in the shared cache for a short TTL; on a hit the rows are
+merged into the session without a SELECT, so relationship access such as
+``current_user.shop.business`` and ``Shop.query.get(...)`` for an allowed shop
+are served from the identity map. Each entry records the user and business
+versions it was built under; committed writes to a user, their addresses, a
+shop or a business bump those versions and the entry is rebuilt on next use.
+Users are cached by an allow-list of columns, never their credentials.
+"""
+import logging
+import time as time_module
+
+from flask import current_app, g
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db, cache
+from app.models import User, UserAddress, Shop, Business
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+
+
+def _entry_key(user_id):
+    return f"identity:user:{user_id}"
+
+
+def _version_key(kind, entity_id):
+    return f"identity:{kind}:{entity_id}:version"
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, str(time_module.time_ns()), timeout=0)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.set(key, str(time_module.time_ns()), timeout=0)
+    except Exception as e:
+        logger.error(f"Failed to bump identity version {key}: {e}")
+
+
+def invalidate_user(user_id):
+    _bump_version(_version_key('user', user_id))
+
+
+def invalidate_business(business_id):
+    _bump_version(_version_key('business', business_id))
+
+
+# User columns that request handling reads, the only ones put in the shared
+# cache. Credentials and tokens (password_hash, reset/verification tokens)
+# stay out of it; they load from the database on the rare paths that use them.
+CACHED_USER_COLUMNS = (
+    'id', 'created_at', 'updated_at', 'is_deleted', 'username', 'email',
+    'first_name', 'last_name', 'phone', 'role', 'permissions', 'business_id',
+    'shop_id', 'email_verified', 'last_login', 'login_attempts', 'locked_until',
+)
+
+
+def _columns(obj):
+    keys = CACHED_USER_COLUMNS if isinstance(obj, User) else [
+        attr.key for attr in inspect(obj).mapper.column_attrs]
+    return {key: getattr(obj, key) for key in keys}
+
+
+def _hydrate(model, values):
+    """Attach a cached row to the session as a clean persistent object, without SQL."""
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(instance, key, value)
+    make_transient_to_detached(instance)
+    merged = db.session.merge(instance, load=False)
+    # Columns left out of the cache load from the database on first access
+    missing = [attr.key for attr in model.__mapper__.column_attrs if attr.key not in values]
+    if missing:
+        db.session.expire(merged, missing)
+    return merged
+
+
+class TenantContext:
+    """Who is making the request and which shops they may act on."""
+
+    def __init__(self, user, shops, address_missing=False):
+        self.user = user
+        self.business = user.business
+        self.shop = user.shop
+        self.shops = shops
+        self.shop_ids = {shop.id for shop in shops}
+        self.address_missing = address_missing
+
+    def get_shop(self, shop_id):
+        """Return an accessible shop by id, or None if it is not in this context."""
+        for shop in self.shops:
+            if shop.id == shop_id:
+                return shop
+        return None
+
+
+def _build_context(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+
+    if user.is_tenant():
+        shops = Shop.query.filter_by(business_id=user.business_id, is_deleted=False).all()
+    else:
+        shops = [user.shop] if user.shop else []
+    address_missing = user.needs_address() and not user.has_address
+    context = TenantContext(user, shops, address_missing)
+
+    businesses = {}
+    for business in [user.business] + [shop.business for shop in shops]:
+        if business is not None:
+            businesses[business.id] = business
+
+    try:
+        keys = [_version_key('user', user.id)] + [
+            _version_key('business', business_id) for business_id in sorted(businesses)]
+        cache.set(_entry_key(user.id), {
+            'versions': [_get_version(key) for key in keys],
+            'businesses': [_columns(businesses[business_id]) for business_id in sorted(businesses)],
+            'shops': [_columns(shop) for shop in shops],
+            'user': _columns(user),
+            'address_missing': address_missing,
+        }, timeout=current_app.config.get('IDENTITY_CACHE_TTL', DEFAULT_TTL))
+    except Exception as e:
+        logger.error(f"Failed to cache identity for user {user_id}: {e}")
+
+    return context
+
+
+def _cached_context(user_id):
+    try:
+        entry = cache.get(_entry_key(user_id))
+        if entry is None:
+            return None
+        keys = [_version_key('user', user_id)] + [
+            _version_key('business', business['id']) for business in entry['businesses']]
+        if cache.get_many(*keys) != entry['versions']:
+            return None
+    except Exception as e:
+        logger.error(f"Identity cache unavailable for user {user_id}: {e}")
+        return None
+
+    try:
+        # Businesses and shops first, so the user's many-to-one relationships
+        # resolve from the identity map
+        for values in entry['businesses']:
+            _hydrate(Business, values)
+        shops = [_hydrate(Shop, values) for values in entry['shops']]
+        user = _hydrate(User, entry['user'])
+    except Exception as e:
+        logger.warning(f"Discarding unusable identity cache entry for user {user_id}: {e}")
+        return None
+    return TenantContext(user, shops, entry['address_missing'])
+
+
+def load_identity(user_id):
+    """Resolve and memoise the tenant context for a user id; returns the user or None."""
+    context = _cached_context(user_id) or _build_context(user_id)
+    g.tenant_context = context
+    return context.user if context else None
+
+
+def get_tenant_context():
+    """The current request's TenantContext, or None for anonymous requests."""
+    if 'tenant_context' not in g:
+        # Accessing current_user runs the user loader, which fills g.tenant_context
+        if current_user.is_authenticated and 'tenant_context' not in g:
+            load_identity(current_user.id)
+        g.setdefault('tenant_context', None)
+    return g.tenant_context
+
+
+def resolve_shop(shop_id):
+    """A shop by id: from the tenant context when accessible, else from the session."""
+    context = get_tenant_context()
+    shop = context.get_shop(shop_id) if context else None
+    return shop if shop is not None else db.session.get(Shop, shop_id)
+
+
+# ---------------------------------------------------------------------------
+# Version maintenance: committed identity writes retire cached contexts
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _collect_identity_changes(session, flush_context):
+    users = session.info.setdefault('identity_touched_users', set())
+    businesses = session.info.setdefault('identity_touched_businesses', set())
+    # Collection-only changes (e.g. a sale appended to shop.sales) don't count
+    dirty = [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    for obj in list(session.new) + dirty + list(session.deleted):
+        if isinstance(obj, User):
+            users.add(obj.id)
+        elif isinstance(obj, UserAddress):
+            users.add(obj.user_id)
+        elif isinstance(obj, Business):
+            businesses.add(obj.id)
+        elif isinstance(obj, Shop):
+            businesses.add(obj.business_id)
+            businesses.update(inspect(obj).attrs.business_id.history.deleted or ())
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_identity_versions(session):
+    for user_id in session.info.pop('identity_touched_users', None) or ():
+        if user_id is not None:
+            invalidate_user(user_id)
+    for business_id in session.info.pop('identity_touched_businesses', None) or ():
+        if business_id is not None:
+            invalidate_business(business_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_identity_changes(session):
+    session.info.pop('identity_touched_users', None)
+    session.info.pop('identity_touched_businesses', None)
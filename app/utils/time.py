@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, time
+from time import monotonic
 import pytz
 
 def get_kenya_today_range():
@@ -7,3 +8,85 @@ def get_kenya_today_range():
     start = tz.localize(datetime.combine(now.date(), time.min))
     end = tz.localize(datetime.combine(now.date(), time.max))
     return start, end
+
+
+DEFAULT_TIME_ZONE = "Africa/Nairobi"
+SHOP_TIMEZONE_TTL = 300  # seconds a resolved shop/business timezone is reused in-process
+
+_timezones = {}
+
+
+def _resolve_timezone(cache_key, lookup):
+    """
+    Resolve and memoise a timezone. lookup() returns the configured zone
+    name (or None); unknown or missing names fall back to the app TIME_ZONE.
+    """
+    from flask import current_app, has_app_context
+
+    cached = _timezones.get(cache_key)
+    if cached and cached[1] > monotonic():
+        return cached[0]
+
+    default = current_app.config.get('TIME_ZONE', DEFAULT_TIME_ZONE) if has_app_context() else DEFAULT_TIME_ZONE
+    name = lookup()
+    try:
+        tz = pytz.timezone(name or default)
+    except pytz.UnknownTimeZoneError:
+        tz = pytz.timezone(default)
+
+    _timezones[cache_key] = (tz, monotonic() + SHOP_TIMEZONE_TTL)
+    return tz
+
+
+def get_shop_timezone(shop_id, connection=None):
+    """
+    Timezone a shop's business day is counted in: its business's timezone,
+    falling back to the app TIME_ZONE. Resolved via `connection` when given
+    (so it is safe inside flush events) and memoised per process.
+    """
+    from sqlalchemy import text
+
+    def lookup():
+        if shop_id is None:
+            return None
+        conn = connection
+        if conn is None:
+            from app import db
+            conn = db.session
+        return conn.execute(
+            text("SELECT b.timezone FROM shops s LEFT JOIN businesses b ON b.id = s.business_id WHERE s.id = :shop_id"),
+            {'shop_id': shop_id}
+        ).scalar()
+
+    return _resolve_timezone(('shop', shop_id), lookup)
+
+
+def get_business_timezone(business_id):
+    """Timezone a business's days are counted in, memoised like get_shop_timezone()."""
+    from sqlalchemy import text
+    from app import db
+
+    def lookup():
+        if business_id is None:
+            return None
+        return db.session.execute(
+            text("SELECT timezone FROM businesses WHERE id = :business_id"),
+            {'business_id': business_id}
+        ).scalar()
+
+    return _resolve_timezone(('business', business_id), lookup)
+
+
+def to_business_time(utc_dt, tz):
+    """Convert a naive UTC datetime to naive local time in tz."""
+    return pytz.utc.localize(utc_dt).astimezone(tz).replace(tzinfo=None)
+
+
+def shop_today(shop_id):
+    """Today's business date for a shop."""
+    return datetime.now(get_shop_timezone(shop_id)).date()
+
+
+def business_today(business_id):
+    """Today's business date for a business (all of its shops share its timezone)."""
+    return datetime.now(get_business_timezone(business_id)).date()
@@ -0,0 +1,141 @@
+"""
+Inventory valuation at weighted average cost.
+
+Product.average_cost is the moving-average unit cost of the units on hand.
+Each receipt at a known cost folds into it incrementally (moving_average());
+sales, adjustments and receipts without a cost leave it alone. Until a
+product's first costed receipt, Product.valuation_cost falls back to its
+cost price.
+
+take_valuation() turns the day's stock snapshots into one
+InventoryValuation row per shop and business day, in the same transaction
+as the snapshots (stock_ledger.snapshot_shop()). Each snapshot carries the
+unit cost of its product when it was taken, so a day's value doesn't change
+when it is recomputed later. Business figures are sums over its shops'
+rows (shops outside a business have a NULL business_id), so inventory value
+widgets and month-end reports read a handful of rows instead of replaying
+stock history.
+"""
+import logging
+from decimal import Decimal
+
+from sqlalchemy import delete, insert, select, func, and_, case, literal, Date
+
+from app import db
+from app.models import Product, Shop, StockSnapshot, InventoryValuation
+
+logger = logging.getLogger(__name__)
+
+AVERAGE_COST_PLACES = Decimal('0.0001')
+
+
+def moving_average(stock_before, average_before, quantity, unit_cost):
+    """
+    Average unit cost after receiving `quantity` at `unit_cost` on top of
+    `stock_before` units valued at `average_before`. Stock at or below zero
+    carries no value, so the receipt's cost becomes the average.
+    """
+    stock_before = Decimal(stock_before or 0)
+    quantity = Decimal(quantity)
+    unit_cost = Decimal(unit_cost)
+    if stock_before <= 0 or average_before is None:
+        return unit_cost.quantize(AVERAGE_COST_PLACES)
+    total = stock_before * Decimal(average_before) + quantity * unit_cost
+    return (total / (stock_before + quantity)).quantize(AVERAGE_COST_PLACES)
+
+
+def take_valuation(connection, shop_id, valuation_date):
+    """
+    (Re)write the shop's valuation for valuation_date from that day's stock
+    snapshots, each valued at the unit cost recorded with it. Snapshots
+    taken before unit costs were recorded fall back to the current cost.
+    """
+    table = InventoryValuation.__table__
+    connection.execute(delete(table).where(and_(
+        table.c.shop_id == shop_id,
+        table.c.valuation_date == valuation_date
+    )))
+    in_stock = StockSnapshot.stock > 0
+    unit_cost = func.coalesce(StockSnapshot.unit_cost, Product.valuation_cost, 0)
+    connection.execute(insert(table).from_select(
+        ['shop_id', 'business_id', 'valuation_date', 'stock_units', 'stock_value', 'product_count'],
+        select(
+            Shop.id,
+            Shop.business_id,
+            literal(valuation_date, Date),
+            func.coalesce(func.sum(case((in_stock, StockSnapshot.stock), else_=0)), 0),
+            func.coalesce(func.sum(case((in_stock, StockSnapshot.stock * unit_cost), else_=0)), 0),
+            func.count(case((in_stock, StockSnapshot.id)))
+        ).select_from(Shop).outerjoin(
+            StockSnapshot, and_(
+                StockSnapshot.shop_id == Shop.id,
+                StockSnapshot.snapshot_date == valuation_date
+            )
+        ).outerjoin(
+            Product, Product.id == StockSnapshot.product_id
+        ).where(Shop.id == shop_id).group_by(Shop.id, Shop.business_id)
+    ))
+
+
+def _as_dict(row, valuation_date):
+    return {
+        'valuation_date': valuation_date,
+        'stock_value': float(row.stock_value or 0),
+        'stock_units': float(row.stock_units or 0),
+        'product_count': row.product_count or 0,
+    }
+
+
+def valuation_on(shop_ids, valuation_date):
+    """
+    Combined closing valuation of the shops on valuation_date, each shop at
+    its latest valuation on or before that day. None when none exists yet.
+    """
+    shop_ids = list(shop_ids)
+    if not shop_ids:
+        return None
+    latest = select(
+        InventoryValuation.shop_id,
+        InventoryValuation.valuation_date,
+        InventoryValuation.stock_value,
+        InventoryValuation.stock_units,
+        InventoryValuation.product_count
+    ).where(
+        InventoryValuation.shop_id.in_(shop_ids),
+        InventoryValuation.valuation_date <= valuation_date
+    ).distinct(InventoryValuation.shop_id).order_by(
+        InventoryValuation.shop_id, InventoryValuation.valuation_date.desc()
+    ).subquery()
+
+    row = db.session.query(
+        func.max(latest.c.valuation_date).label('valuation_date'),
+        func.sum(latest.c.stock_value).label('stock_value'),
+        func.sum(latest.c.stock_units).label('stock_units'),
+        func.sum(latest.c.product_count).label('product_count')
+    ).one()
+    if row.valuation_date is None:
+        return None
+    return _as_dict(row, row.valuation_date)
+
+
+def valuation_series(shop_ids, start_date, end_date):
+    """Daily combined valuations of the shops between two dates, oldest first."""
+    shop_ids = list(shop_ids)
+    if not shop_ids:
+        return []
+    rows = db.session.query(
+        InventoryValuation.valuation_date,
+        func.sum(InventoryValuation.stock_value).label('stock_value'),
+        func.sum(InventoryValuation.stock_units).label('stock_units'),
+        func.sum(InventoryValuation.product_count).label('product_count')
+    ).filter(
+        InventoryValuation.shop_id.in_(shop_ids),
+        InventoryValuation.valuation_date.between(start_date, end_date)
+    ).group_by(InventoryValuation.valuation_date).order_by(InventoryValuation.valuation_date)
+    return [_as_dict(row, row.valuation_date) for row in rows]
+
+
+def business_valuation(business_id, valuation_date):
+    """A business's closing valuation on valuation_date, across all of its shops."""
+    shop_ids = [shop_id for shop_id, in db.session.query(Shop.id).filter(Shop.business_id == business_id)]
+    return valuation_on(shop_ids, valuation_date)
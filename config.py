@@ -14,6 +14,51 @@ class Config:
     CACHE_TYPE = 'RedisCache'
     CACHE_REDIS_URL = os.getenv('REDIS_URL')
     CACHE_DEFAULT_TIMEOUT = 300
+    # Closed report days are cached forever; today's partial is rebuilt after this many seconds
+    REPORT_OPEN_DAY_TIMEOUT = 60
+
+    # Background report jobs
+    REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 2))
+    REPORT_ARTIFACT_DIR = os.getenv('REPORT_ARTIFACT_DIR')  # defaults to <instance>/report_artifacts
+    REPORT_ARTIFACT_RETENTION = 24 * 3600
+    REPORT_JOB_TIMEOUT = 1800  # a job still running after this is treated as failed
+
+    # Tenant dashboard sections run concurrently, each on its own DB connection
+    DASHBOARD_WORKERS = int(os.getenv('DASHBOARD_WORKERS', 4))
+    DASHBOARD_SECTION_TIMEOUT = 5.0  # seconds before a section falls back to its placeholder
+
+    # Superadmin views read a platform metrics snapshot refreshed at most this often (seconds)
+    PLATFORM_METRICS_INTERVAL = 15 * 60
+
+    # Shop admin dashboard data is cached per shop and dropped on sales/inventory writes
+    ADMIN_DASHBOARD_TTL = 300
+
+    # Per-user identity/tenant context is cached this long (seconds); writes retire it sooner
+    IDENTITY_CACHE_TTL = 60
+
+    # Public shop homepages: host/slug routing and rendered anonymous pages (seconds)
+    HOMEPAGE_ROUTE_TTL = 3600
+    HOMEPAGE_MISS_TTL = 300  # unknown hosts/slugs
+    HOMEPAGE_PAGE_TTL = 300
+    HOMEPAGE_MAX_AGE = 60  # browser/CDN Cache-Control max-age
+
+    # Listing totals are per-shop counters maintained on writes and re-counted this often (seconds)
+    LISTING_COUNTER_TTL = 3600
+
+    # Reorder planning: supplier lead time and ordering interval assumed for every product (days)
+    REORDER_LEAD_TIME_DAYS = 7
+    REORDER_REVIEW_DAYS = 7
+
+    # Product image uploads: size cap (bytes) and browser cache lifetime of the
+    # content-addressed renditions (seconds)
+    PRODUCT_IMAGE_MAX_BYTES = 8 * 1024 * 1024
+    PRODUCT_IMAGE_MAX_AGE = 365 * 24 * 3600
+
+    # Cold start: `flask profile-startup` fails above this import budget (ms). With
+    # PRELOAD_HEAVY_MODULES the app imports its document renderers up front, for
+    # servers that load the app once and fork workers (see gunicorn.conf.py).
+    STARTUP_IMPORT_BUDGET_MS = int(os.getenv('STARTUP_IMPORT_BUDGET_MS', 1500))
+    PRELOAD_HEAVY_MODULES = os.getenv('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
 
     # Session Security Configuration
     SESSION_COOKIE_SECURE = True  
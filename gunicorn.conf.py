@@ -0,0 +1,21 @@
+"""
+Gunicorn settings read automatically from the working directory.
+
+Preload-and-fork is opt-in: with GUNICORN_PRELOAD=1 the master imports the app
+(and, via PRELOAD_HEAVY_MODULES, the document renderers) once and workers
+share that memory copy-on-write. Intended for sync/gthread workers; eventlet
+and gevent workers should keep the default per-worker load.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+
+
+def post_fork(server, worker):
+    """Connections opened by the master must not be shared with forked workers."""
+    if not preload_app:
+        return
+    from app import db
+    flask_app = server.app.wsgi()
+    with flask_app.app_context():
+        db.engine.dispose()